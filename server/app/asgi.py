@@ -0,0 +1,261 @@
+"""
+ASGI serving mode.
+
+    uvicorn app.asgi:create_asgi_app --factory --host 0.0.0.0 --port 10000
+
+Under a WSGI server every open chat stream holds a worker thread for as long
+as the LLM keeps talking. Here POST /api/analysis/chat/<id> and
+GET /api/analysis/report/<id> run on the event loop instead. The flush and
+aggregate reads (sync supabase client) go to a worker thread and return.
+Tokens then stream from AsyncOpenAI, so an open SSE connection costs a
+coroutine, not a thread. GET /api/analysis/events (dashboard push) is
+served the same way: a subscriber waits on the event loop and is
+unsubscribed on http.disconnect, instead of holding one of the WSGI
+threads forever. Every other route is the unchanged Flask app
+(create_app()), run on a bounded thread pool (asgi.wsgi_workers).
+"""
+
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+from . import create_app
+from .auth import AuthError, decode_bearer
+from .config import get_setting
+from .services.llm import achat_about_student, agenerate_detailed_report
+from .services import ingest, report_cache
+from .services.events import get_broker
+
+log = logging.getLogger("asgi")
+
+_CHAT = re.compile(r"^/api/analysis/chat/([^/]+)/?$")
+_REPORT = re.compile(r"^/api/analysis/report/([^/]+)/?$")
+_EVENTS = re.compile(r"^/api/analysis/events/?$")
+
+# flask-cors answers preflight on the WSGI side; native responses need the
+# same header as CORS(app)'s defaults
+_CORS = [(b"access-control-allow-origin", b"*")]
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        with flask_app.app_context():
+            workers = get_setting("asgi", "wsgi_workers", 16)
+            self.drain_sec = get_setting("ingest", "drain_sec", 10)
+        self.wsgi = WSGIMiddleware(flask_app, workers=workers)
+        # Report generations in flight, by fingerprint (see services/report_cache.py)
+        self._generating: dict[str, asyncio.Task] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http":
+            method, path = scope["method"], scope["path"]
+            m = _CHAT.match(path)
+            if m and method == "POST":
+                return await self._guard(self.chat, scope, receive, send, m.group(1))
+            m = _REPORT.match(path)
+            if m and method == "GET":
+                return await self._guard(self.report, scope, receive, send, m.group(1))
+            if _EVENTS.match(path) and method == "GET":
+                return await self._guard(self.events, scope, receive, send)
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # Write out acknowledged flush batches before the server exits
+                await asyncio.to_thread(ingest.drain_queue, self.drain_sec)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _guard(self, handler, scope, receive, send, *args):
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        try:
+            decode_bearer(headers.get("authorization", ""))
+        except AuthError as e:
+            return await _send_json(send, 401, {"error": str(e)})
+        await handler(scope, receive, send, *args)
+
+    def _in_app(self, fn, *args):
+        """Run a sync function inside an app context (for get_supabase/get_setting)."""
+        with self.flask_app.app_context():
+            from .services.supabase_client import get_supabase
+            return fn(get_supabase(), *args)
+
+    async def _load(self, student_id, assignment_id):
+        from .routes.analysis import load_llm_inputs
+        return await asyncio.to_thread(self._in_app, load_llm_inputs, student_id, assignment_id)
+
+    async def report(self, scope, receive, send, student_id):
+        """Async variant of routes.analysis.generate_report."""
+        qs = parse_qs(scope.get("query_string", b"").decode())
+        assignment_id = (qs.get("assignment_id") or [None])[0]
+        if not assignment_id:
+            return await _send_json(send, 400, {"error": "assignment_id required"})
+
+        found = await asyncio.to_thread(self._in_app, report_cache.lookup, student_id, assignment_id)
+        if found is None:
+            return await _send_json(send, 200, {"data": {"report": "No activity recorded for this student."}})
+
+        pair, fingerprint, hit = found
+        if hit is not None:
+            report, fresh = hit
+            if not fresh:
+                self._generate_report(student_id, assignment_id, pair, fingerprint)
+        else:
+            report = await asyncio.shield(self._generate_report(student_id, assignment_id, pair, fingerprint))
+        await _send_json(send, 200, {"data": {"report": report}})
+
+    def _generate_report(self, student_id, assignment_id, pair, fingerprint) -> asyncio.Task:
+        """One generation per fingerprint; it outlives the request that started it."""
+        task = self._generating.get(fingerprint)
+        if task is None:
+            task = asyncio.create_task(self._build_report(student_id, assignment_id, pair, fingerprint))
+            self._generating[fingerprint] = task
+            task.add_done_callback(lambda _: self._generating.pop(fingerprint, None))
+        return task
+
+    async def _build_report(self, student_id, assignment_id, pair, fingerprint) -> str:
+        timeline, linger_scores = await self._load(student_id, assignment_id)
+        report = await agenerate_detailed_report(timeline, linger_scores)
+        await asyncio.to_thread(self._in_app, lambda _sb: report_cache.store(pair, fingerprint, report))
+        return report
+
+    async def chat(self, scope, receive, send, student_id):
+        """Async variant of routes.analysis.chat_with_student_data."""
+        try:
+            body = json.loads(await _read_body(receive) or b"{}")
+        except ValueError:
+            return await _send_json(send, 400, {"error": "Invalid JSON body"})
+        message = body.get("message", "")
+        assignment_id = body.get("assignment_id")
+        history = body.get("history", [])
+
+        if not assignment_id or not message:
+            return await _send_json(send, 400, {"error": "assignment_id and message required"})
+
+        from .routes.analysis import NO_ACTIVITY_SSE
+
+        timeline, linger_scores = await self._load(student_id, assignment_id)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+            ] + _CORS,
+        })
+
+        if not timeline:
+            await _send_chunk(send, NO_ACTIVITY_SSE)
+            await _send_chunk(send, "data: [DONE]\n\n")
+            return await send({"type": "http.response.body", "body": b""})
+
+        stream = achat_about_student(timeline, linger_scores, message, history)
+        if not await _pump_until_disconnect(stream, send, receive):
+            # Client went away; the LLM stream was cancelled and closed
+            log.info("chat stream for %s closed by client", student_id)
+            return
+        await send({"type": "http.response.body", "body": b""})
+
+    async def events(self, scope, receive, send):
+        """Native variant of routes.analysis.analysis_events."""
+        qs = parse_qs(scope.get("query_string", b"").decode())
+        course_id = (qs.get("course_id") or [None])[0]
+        assignment_id = (qs.get("assignment_id") or [None])[0]
+        if not course_id and not assignment_id:
+            return await _send_json(send, 400, {"error": "course_id or assignment_id required"})
+
+        with self.flask_app.app_context():
+            broker = get_broker()
+            heartbeat = get_setting("events", "heartbeat_sec", 15)
+        sub = broker.subscribe(course_id=course_id, assignment_id=assignment_id)
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ] + _CORS,
+            })
+            # Runs until the client disconnects
+            await _pump_until_disconnect(broker.astream(sub, heartbeat), send, receive)
+        finally:
+            # Also covers a disconnect before the stream started
+            broker.unsubscribe(sub)
+
+
+async def _wait_disconnect(receive) -> None:
+    """Return once the client has disconnected (the request body is already read)."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _pump_until_disconnect(chunks, send, receive) -> bool:
+    """Send every chunk of an async generator, unless the client goes away first.
+
+    Servers do not raise from send() after a disconnect (uvicorn drops the
+    write), so the only signal is http.disconnect on receive(). That is
+    watched in a concurrent task; when it wins, the pump is cancelled and the
+    generator closed. Returns whether the generator ran to completion.
+    """
+    async def pump():
+        async for chunk in chunks:
+            await _send_chunk(send, chunk)
+
+    pumping = asyncio.ensure_future(pump())
+    watching = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait((pumping, watching), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pumping, watching):
+            task.cancel()
+        await asyncio.gather(pumping, watching, return_exceptions=True)
+        await chunks.aclose()
+    if pumping.cancelled():
+        return False
+    pumping.result()
+    return True
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_chunk(send, text: str) -> None:
+    await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+
+
+async def _send_json(send, status: int, obj) -> None:
+    data = json.dumps(obj).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(data)).encode()),
+        ] + _CORS,
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+def create_asgi_app():
+    """ASGI application wrapping create_app() (uvicorn --factory entry point)."""
+    return AsgiApp(create_app())
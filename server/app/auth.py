@@ -3,22 +3,34 @@ import jwt
 from flask import request, g, jsonify
 
 
+class AuthError(Exception):
+    pass
+
+
+def decode_bearer(auth_header: str) -> dict:
+    """JWT claims from an "Authorization: Bearer ..." header. Raises AuthError."""
+    if not auth_header.startswith("Bearer "):
+        raise AuthError("Missing or invalid Authorization header")
+
+    token = auth_header.split(" ", 1)[1]
+
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        raise AuthError("Invalid token") from None
+
+
 def require_auth(f):
     """Middleware decorator that extracts the Supabase user from the JWT."""
     @functools.wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
-            return jsonify({"error": "Missing or invalid Authorization header"}), 401
-
-        token = auth_header.split(" ", 1)[1]
-
         try:
-            payload = jwt.decode(token, options={"verify_signature": False})
-            g.user_id = payload.get("sub")
-            g.user_email = payload.get("email")
-        except jwt.PyJWTError:
-            return jsonify({"error": "Invalid token"}), 401
+            payload = decode_bearer(request.headers.get("Authorization", ""))
+        except AuthError as e:
+            return jsonify({"error": str(e)}), 401
+
+        g.user_id = payload.get("sub")
+        g.user_email = payload.get("email")
 
         return f(*args, **kwargs)
     return decorated
@@ -1,6 +1,7 @@
 import os
 import yaml
 from dotenv import load_dotenv
+from flask import current_app
 
 load_dotenv()
 
@@ -23,3 +24,8 @@ def load_config():
     config["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "")
 
     return config
+
+
+def get_setting(section, key, default):
+    """Read a server tunable (config.yaml section.key), falling back to default."""
+    return (current_app.config.get(section) or {}).get(key, default)
@@ -1,18 +1,46 @@
-from flask import Blueprint, jsonify, request, Response
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from ..auth import require_auth
+from ..config import get_setting
 from ..services.supabase_client import get_supabase
-from ..services.analysis import (
-    flushes_to_edit_regions,
-    compute_linger_scores,
-    compute_current_focus,
-    compute_class_struggle,
+from ..services.paging import iter_keyset, iter_groups, DEFAULT_PAGE_SIZE
+from ..services.scoring import score_students, get_pool
+from ..services.flush_stats import fill_missing_diffs
+from ..services import queries
+from ..services.analysis import compute_class_struggle
+from ..services.aggregates import (
+    get_student_aggregates,
+    linger_from_aggregates,
+    focus_from_aggregates,
+    file_breakdown_from_aggregates,
 )
 from ..services.llm import generate_detailed_report, generate_class_narrative, chat_about_student
+from ..services.report_cache import cached_report
+from ..services.batch_reports import class_reports
+from ..services.heatmap import build_heatmap, get_heatmap
+from ..services import live_struggle
+from ..services.events import get_broker
+from ..services.timeline import get_timeline
 from dataclasses import asdict
+import json
 import os
 
 analysis_bp = Blueprint("analysis", __name__)
 
+NO_ACTIVITY_SSE = "data: No activity recorded for this student.\n\n"
+
+
+def load_llm_inputs(sb, student_id: str, assignment_id: str):
+    """(timeline, linger scores) for the report and chat prompts.
+
+    The timeline is cached and extended as flushes arrive, so chat turns and
+    reports reuse its rendered text. Shared by the Flask routes and the async
+    variants in app/asgi.py.
+    """
+    timeline = get_timeline(sb, student_id, assignment_id)
+    if not timeline:
+        return timeline, []
+    return timeline, linger_from_aggregates(get_student_aggregates(sb, student_id, assignment_id))
+
 
 @analysis_bp.route("/secret", methods=["GET"])
 def debug_secret():
@@ -30,31 +58,20 @@ def debug_secret():
 @require_auth
 def generate_report(student_id):
     """Generate detailed AI report analyzing student workflow from diffs."""
-    sb = get_supabase()
     assignment_id = request.args.get("assignment_id")
     if not assignment_id:
         return jsonify({"error": "assignment_id required"}), 400
 
-    result = (
-        sb.table("flushes")
-        .select("*")
-        .eq("profile_id", student_id)
-        .eq("assignment_id", assignment_id)
-        .order("start_timestamp", desc=False)
-        .execute()
+    sb = get_supabase()
+    # Served from the report cache while the student's flushes are unchanged;
+    # generated (once, however many callers) otherwise
+    report = cached_report(
+        sb, student_id, assignment_id,
+        generate=lambda: generate_detailed_report(*load_llm_inputs(sb, student_id, assignment_id)),
     )
-    flushes = result.data or []
-
-    if not flushes:
+    if report is None:
         return jsonify({"data": {"report": "No activity recorded for this student."}})
 
-    # Compute metrics
-    regions = flushes_to_edit_regions(flushes)
-    linger_scores = compute_linger_scores(regions)
-
-    # Generate intelligent report
-    report = generate_detailed_report(flushes, linger_scores)
-
     return jsonify({"data": {"report": report}})
 
 
@@ -67,39 +84,13 @@ def student_analysis(student_id):
     if not assignment_id:
         return jsonify({"error": "assignment_id required"}), 400
 
-    result = (
-        sb.table("flushes")
-        .select("*")
-        .eq("profile_id", student_id)
-        .eq("assignment_id", assignment_id)
-        .order("start_timestamp", desc=False)
-        .execute()
-    )
-    flushes = result.data or []
-
-    regions = flushes_to_edit_regions(flushes)
-    linger = compute_linger_scores(regions)
-    focus = compute_current_focus(regions)
-
-    # ACTIVE TIME ONLY: Filter out idle flushes
-    # Criteria: window_duration < 5 minutes (300s) AND has actual changes
-    MAX_ACTIVE_WINDOW = 300  # 5 minutes - longer windows likely include idle time
-    active_flushes = [
-        f for f in flushes
-        if f.get("window_duration", 0) < MAX_ACTIVE_WINDOW
-        and f.get("diffs", "").strip()  # Must have actual diff content
-    ]
-
-    total_time = sum(f.get("window_duration", 0) for f in active_flushes)
-
-    # File breakdown: only count active time
-    file_times: dict[str, float] = {}
-    for f in active_flushes:
-        file_times[f["file_path"]] = file_times.get(f["file_path"], 0) + f.get("window_duration", 0)
-    file_breakdown = [
-        {"file_path": fp, "time_sec": round(t, 1)}
-        for fp, t in sorted(file_times.items(), key=lambda x: -x[1])
-    ]
+    # Reads the materialized aggregates: O(symbols), not O(flushes)
+    aggs = get_student_aggregates(sb, student_id, assignment_id)
+    linger = linger_from_aggregates(aggs)
+    focus = focus_from_aggregates(aggs)
+
+    # ACTIVE TIME ONLY: window_duration < 5 minutes AND has actual changes
+    total_time, file_breakdown = file_breakdown_from_aggregates(aggs)
 
     return jsonify({
         "data": {
@@ -111,48 +102,143 @@ def student_analysis(student_id):
     })
 
 
-@analysis_bp.route("/class/<assignment_id>", methods=["GET"])
-@require_auth
-def class_analysis(assignment_id):
-    """Class-wide analysis: struggle topics across all students."""
-    sb = get_supabase()
+def _score_class(sb, assignment_id: str):
+    """Yield (student_id, linger scores) for every student in the assignment."""
+    page_size = get_setting("analysis", "page_size", DEFAULT_PAGE_SIZE)
+
+    # Stream the assignment's flushes ordered by student, keyset-paged, and
+    # score each student as soon as their rows are complete. Peak memory is
+    # one page plus one student's flushes regardless of class size.
+    rows = iter_keyset(
+        lambda: (
+            queries.query(sb, "analysis.class")
+            .eq("assignment_id", assignment_id)
+        ),
+        keys=("profile_id", "id"),
+        page_size=page_size,
+        on_page=lambda page: fill_missing_diffs(sb, page),
+    )
 
-    result = (
-        sb.table("flushes")
-        .select("*")
-        .eq("assignment_id", assignment_id)
-        .order("start_timestamp", desc=False)
-        .execute()
+    # Opt-in: score students across a process/thread pool
+    pool = None
+    if request.args.get("parallel") == "1" or get_setting("analysis", "parallel", False):
+        pool = get_pool(
+            get_setting("analysis", "pool", "process"),
+            get_setting("analysis", "workers", 0),
+        )
+    return score_students(
+        iter_groups(rows, "profile_id"), pool,
+        backend=get_setting("analysis", "backend", "python"),
     )
-    all_flushes = result.data or []
 
-    # Group by student
-    student_flushes: dict[str, list[dict]] = {}
-    for f in all_flushes:
-        student_flushes.setdefault(f["profile_id"], []).append(f)
 
-    # Compute per-student linger scores
+@analysis_bp.route("/class/<assignment_id>", methods=["GET"])
+@require_auth
+def class_analysis(assignment_id):
+    """Class-wide analysis: struggle topics across all students."""
     all_student_scores = []
     student_lingers: dict[str, list] = {}
-    for sid, flushes in student_flushes.items():
-        regions = flushes_to_edit_regions(flushes)
-        scores = compute_linger_scores(regions)
+    total_flushes = 0
+    for sid, scores in _score_class(get_supabase(), assignment_id):
+        # One flush == one visit to exactly one symbol
+        total_flushes += sum(s.visits for s in scores)
         all_student_scores.append(scores)
         student_lingers[sid] = [asdict(s) for s in scores]
 
-    # Class-wide struggle
     struggle = compute_class_struggle(all_student_scores)
 
     return jsonify({
         "data": {
             "struggle_topics": [asdict(s) for s in struggle],
-            "student_count": len(student_flushes),
-            "total_flushes": len(all_flushes),
+            "student_count": len(student_lingers),
+            "total_flushes": total_flushes,
             "student_lingers": student_lingers,
         }
     })
 
 
+@analysis_bp.route("/class/<assignment_id>/heatmap", methods=["GET"])
+@require_auth
+def class_heatmap(assignment_id):
+    """Students x top-6 struggle symbols, linger scores scaled 0-100.
+
+    cells is the row-major matrix (shape [students, symbols]). Cached per
+    assignment; after new flushes arrive the cached matrix is served for up
+    to heatmap.max_stale_sec before the class is rescored.
+    """
+    def compute():
+        student_scores = dict(_score_class(get_supabase(), assignment_id))
+        return build_heatmap(student_scores, compute_class_struggle(list(student_scores.values())))
+
+    max_stale = get_setting("heatmap", "max_stale_sec", 60)
+    return jsonify({"data": get_heatmap(assignment_id, compute, max_stale).to_json()})
+
+
+@analysis_bp.route("/class/<assignment_id>/live", methods=["GET"])
+@require_auth
+def class_live_struggle(assignment_id):
+    """Struggle topics over the last ?window= minutes, kept current by ingest."""
+    windows = live_struggle.windows()
+    minutes = request.args.get("window", type=int, default=windows[0])
+    if minutes not in windows:
+        return jsonify({"error": f"window must be one of {list(windows)}"}), 400
+
+    snap = live_struggle.get_live(get_supabase(), assignment_id).snapshot(minutes)
+    snap["struggle_topics"] = [asdict(s) for s in snap["struggle_topics"]]
+    return jsonify({"data": snap})
+
+
+@analysis_bp.route("/class/<assignment_id>/reports", methods=["GET"])
+@require_auth
+def class_report_batch(assignment_id):
+    """AI reports for every student, streamed as NDJSON as each completes.
+
+    One line per student ({"student_id", "report", "cached"} or
+    {"student_id", "error"}), then a final line with the class narrative,
+    struggle topics and a summary.
+    """
+    events = class_reports(
+        get_supabase(),
+        assignment_id,
+        page_size=get_setting("analysis", "page_size", DEFAULT_PAGE_SIZE),
+        concurrency=get_setting("batch_reports", "concurrency", 8),
+        max_retries=get_setting("batch_reports", "max_retries", 5),
+        backoff_sec=get_setting("batch_reports", "backoff_sec", 1.0),
+        max_backoff_sec=get_setting("batch_reports", "max_backoff_sec", 30.0),
+    )
+    return Response(
+        stream_with_context(json.dumps(e) + "\n" for e in events),
+        mimetype="application/x-ndjson",
+    )
+
+
+@analysis_bp.route("/events", methods=["GET"])
+@require_auth
+def analysis_events():
+    """SSE stream of ingest deltas for ?course_id= and/or ?assignment_id=.
+
+    Each event is one accepted flush batch: per-symbol dwell, visits and
+    inserted/deleted sums to add to the dashboard's totals. {"type":
+    "resync"} means events were dropped and stats should be refetched.
+
+    Like every route here it needs the Authorization header, which the
+    browser's EventSource cannot send: read it with fetch() and a streamed
+    response body instead. Under app/asgi.py this route is served natively.
+    """
+    course_id = request.args.get("course_id")
+    assignment_id = request.args.get("assignment_id")
+    if not course_id and not assignment_id:
+        return jsonify({"error": "course_id or assignment_id required"}), 400
+
+    broker = get_broker()
+    sub = broker.subscribe(course_id=course_id, assignment_id=assignment_id)
+    return Response(
+        broker.stream(sub, get_setting("events", "heartbeat_sec", 15)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @analysis_bp.route("/chat/<student_id>", methods=["POST"])
 @require_auth
 def chat_with_student_data(student_id):
@@ -165,27 +251,14 @@ def chat_with_student_data(student_id):
     if not assignment_id or not message:
         return jsonify({"error": "assignment_id and message required"}), 400
 
-    sb = get_supabase()
-    result = (
-        sb.table("flushes")
-        .select("*")
-        .eq("profile_id", student_id)
-        .eq("assignment_id", assignment_id)
-        .order("start_timestamp", desc=False)
-        .execute()
-    )
-    flushes = result.data or []
-
-    if not flushes:
+    timeline, linger_scores = load_llm_inputs(get_supabase(), student_id, assignment_id)
+    if not timeline:
         def empty():
-            yield "data: No activity recorded for this student.\n\n"
+            yield NO_ACTIVITY_SSE
             yield "data: [DONE]\n\n"
         return Response(empty(), mimetype="text/event-stream")
 
-    regions = flushes_to_edit_regions(flushes)
-    linger_scores = compute_linger_scores(regions)
-
     return Response(
-        chat_about_student(flushes, linger_scores, message, history),
+        chat_about_student(timeline, linger_scores, message, history),
         mimetype="text/event-stream",
     )
@@ -1,60 +1,28 @@
-from flask import Blueprint, jsonify, g
+from flask import Blueprint, jsonify, g, request
 from ..auth import require_auth
 from ..services.supabase_client import get_supabase
+from ..services.membership import ASSISTANT, STUDENT, get_membership
+from ..services.latency import timed
 
 courses_bp = Blueprint("courses", __name__)
 
 
 @courses_bp.route("/my", methods=["GET"])
+@timed("courses.my")
 @require_auth
 def get_my_courses():
     """Return all courses the current user is in, with their role in each."""
-    sb = get_supabase()
-
-    # Check if they're a student in any courses
-    student_rows = (
-        sb.table("enrollments")
-        .select("course_id, enrolled_at, courses(id, name, code)")
-        .eq("profile_id", g.user_id)
-        .execute()
-    )
-
-    # Check if they're an assistant in any courses
-    assistant_rows = (
-        sb.table("teaching_assistants")
-        .select("course_id, assigned_at, courses(id, name, code)")
-        .eq("profile_id", g.user_id)
-        .execute()
-    )
-
-    # Check if they're a professor in any courses
-    professor_rows = (
-        sb.table("courses")
-        .select("id, name, code, created_at")
-        .eq("professor_id", g.user_id)
-        .execute()
-    )
+    # Cached per user; ?refresh=1 re-reads after an enrollment change
+    m = get_membership(get_supabase(), g.user_id, refresh=request.args.get("refresh") == "1")
 
     results = []
-
-    for row in student_rows.data or []:
-        results.append({
-            "role": "student",
-            "enrolled_at": row.get("enrolled_at"),
-            "course": row.get("courses"),
-        })
-
-    for row in assistant_rows.data or []:
-        results.append({
-            "role": "assistant",
-            "assigned_at": row.get("assigned_at"),
-            "course": row.get("courses"),
-        })
-
-    for row in professor_rows.data or []:
-        results.append({
-            "role": "professor",
-            "course": row,
-        })
+    for r in m.roles:
+        entry = {"role": r.role}
+        if r.role == STUDENT:
+            entry["enrolled_at"] = r.since
+        elif r.role == ASSISTANT:
+            entry["assigned_at"] = r.since
+        entry["course"] = dict(r.course)
+        results.append(entry)
 
     return jsonify({"data": results})
@@ -2,20 +2,83 @@ import logging
 import secrets
 from flask import Blueprint, jsonify, request, g
 from ..auth import require_auth
+from ..config import get_setting
+from ..services import events, heatmap, live_struggle, stats
+from ..services.cache import TTLCache
+from ..services.dedup import SeenFilter
+from ..services.membership import get_membership
+from ..services.latency import timed
 from ..services.supabase_client import get_supabase
+from ..services.aggregates import apply_flushes
+from ..services.flush_stats import diff_stat_columns
+from ..services.timeline import extend_cached
+from ..services.ingest import (
+    BatchTooLarge,
+    IngestBatch,
+    InsertError,
+    QueueFull,
+    add_listener,
+    add_drop_listener,
+    get_ingest_queue,
+    keep_inserted,
+    notify_listeners,
+)
 
 log = logging.getLogger("extensions")
 log.setLevel(logging.DEBUG)
 
 extensions_bp = Blueprint("extensions", __name__)
 
+REQUIRED_FLUSH_FIELDS = (
+    "file_path", "client_flush_id", "sequence_number", "content_hash",
+    "trigger", "start_timestamp", "end_timestamp", "diffs",
+)
+
+
+_key_cache: TTLCache | None = None
+
+
+def _get_key_cache() -> TTLCache:
+    """Shared key → mapping cache, sized from config on first use.
+
+    Keys are never reissued or reassigned (generate-key returns the existing
+    key, and a new key is random), so a cached mapping only goes stale when
+    a key row is deleted out of band; keys.cache_ttl bounds that.
+    """
+    global _key_cache
+    if _key_cache is None:
+        _key_cache = TTLCache(
+            maxsize=get_setting("keys", "cache_size", 10000),
+            ttl=get_setting("keys", "cache_ttl", 300),
+        )
+        stats.register("key_cache", _key_cache.stats)
+    return _key_cache
+
+
+_seen_filter: SeenFilter | None = None
+
+
+def _get_seen_filter() -> SeenFilter:
+    """Shared recently-seen client_flush_id filter."""
+    global _seen_filter
+    if _seen_filter is None:
+        _seen_filter = SeenFilter(maxsize=get_setting("ingest", "dedup_size", 200000))
+        stats.register("dedup", _seen_filter.stats)
+    return _seen_filter
+
 
 def _resolve_key(key):
     """Lookup assignment_key → returns {profile_id, assignment_id, course_id} or None."""
+    cache = _get_key_cache()
+    resolved = cache.get(key)
+    if resolved is not None:
+        return resolved
+
+    # One round trip: embed the assignment's course via the FK
     sb = get_supabase()
     result = (
         sb.table("assignment_keys")
-        .select("profile_id, assignment_id")
+        .select("profile_id, assignment_id, assignments(course_id)")
         .eq("key", key)
         .execute()
     )
@@ -23,87 +86,32 @@ def _resolve_key(key):
         log.warning("Key lookup failed: key not found")
         return None
 
-    profile_id = result.data[0]["profile_id"]
-    assignment_id = result.data[0]["assignment_id"]
-
-    assignment = (
-        sb.table("assignments")
-        .select("course_id")
-        .eq("id", assignment_id)
-        .single()
-        .execute()
-    )
-
-    log.debug("Key resolved: profile_id=%s assignment_id=%s", profile_id, assignment_id)
-    return {
-        "profile_id": profile_id,
-        "assignment_id": assignment_id,
-        "course_id": assignment.data["course_id"],
+    row = result.data[0]
+    resolved = {
+        "profile_id": row["profile_id"],
+        "assignment_id": row["assignment_id"],
+        "course_id": row["assignments"]["course_id"],
     }
+    cache.set(key, resolved)
+
+    log.debug("Key resolved: profile_id=%s assignment_id=%s", resolved["profile_id"], resolved["assignment_id"])
+    return resolved
 
 
 @extensions_bp.route("/connect-info", methods=["GET"])
+@timed("extensions.connect_info")
 @require_auth
 def connect_info():
     """Get the logged-in user's courses and assignments for the /connect page."""
     log.info("connect-info requested by profile_id=%s", g.user_id)
-    sb = get_supabase()
+    m = get_membership(get_supabase(), g.user_id, refresh=request.args.get("refresh") == "1")
 
-    profile = sb.table("profiles").select("utln").eq("id", g.user_id).single().execute()
-    utln = profile.data["utln"]
+    courses = m.courses()
+    assignments = m.all_assignments()
 
-    prof_courses = (
-        sb.table("courses")
-        .select("id, name, code")
-        .eq("professor_id", g.user_id)
-        .execute()
-    )
-    student_rows = (
-        sb.table("enrollments")
-        .select("course_id")
-        .eq("profile_id", g.user_id)
-        .execute()
-    )
-    assistant_rows = (
-        sb.table("teaching_assistants")
-        .select("course_id")
-        .eq("profile_id", g.user_id)
-        .execute()
-    )
-
-    member_ids = list(set(
-        [r["course_id"] for r in (student_rows.data or [])] +
-        [r["course_id"] for r in (assistant_rows.data or [])]
-    ))
-    member_courses = []
-    if member_ids:
-        member_courses = (
-            sb.table("courses")
-            .select("id, name, code")
-            .in_("id", member_ids)
-            .execute()
-        ).data or []
-
-    seen = set()
-    courses = []
-    for c in (prof_courses.data or []) + member_courses:
-        if c["id"] not in seen:
-            seen.add(c["id"])
-            courses.append(c)
-
-    course_ids = [c["id"] for c in courses]
-    assignments = []
-    if course_ids:
-        assignments = (
-            sb.table("assignments")
-            .select("id, name, description, due_date, course_id")
-            .in_("course_id", course_ids)
-            .execute()
-        ).data or []
-
-    log.info("connect-info: utln=%s courses=%d assignments=%d", utln, len(courses), len(assignments))
+    log.info("connect-info: utln=%s courses=%d assignments=%d", m.utln, len(courses), len(assignments))
     return jsonify({
-        "utln": utln,
+        "utln": m.utln,
         "courses": courses,
         "assignments": assignments,
     })
@@ -205,10 +213,22 @@ def create_flushes():
 
     log.info("flushes: profile_id=%s assignment_id=%s count=%d", profile_id, assignment_id, len(flushes))
 
-    sb = get_supabase()
+    for i, f in enumerate(flushes):
+        missing = [k for k in REQUIRED_FLUSH_FIELDS if f.get(k) is None]
+        if missing:
+            return jsonify({"error": f"flush {i} missing fields: {', '.join(missing)}"}), 400
+
+    # Idempotent ingest: drop client_flush_ids we have already taken
+    new_ids = set(_get_seen_filter().claim([f["client_flush_id"] for f in flushes]))
+    duplicates = len(flushes) - len(new_ids)
+    if duplicates:
+        log.info("flushes: skipping %d duplicate flushes for profile_id=%s", duplicates, profile_id)
 
     rows = []
     for f in flushes:
+        if f["client_flush_id"] not in new_ids:
+            continue
+        new_ids.discard(f["client_flush_id"])
         rows.append({
             "profile_id": profile_id,
             "assignment_id": assignment_id,
@@ -223,30 +243,84 @@ def create_flushes():
             "snapshot": f.get("snapshot"),
             "active_symbol": f.get("active_symbol"),
             "metrics": f.get("metrics", {}),
+            # Parsed once here so analysis never re-reads the diff text
+            **diff_stat_columns(f["diffs"]),
         })
 
-    # Plain insert — use raw HTTP for better PostgREST error messages
-    import requests as req
-    from flask import current_app
-    rest_url = current_app.config["SUPABASE_URL"] + "/rest/v1/flushes"
-    service_key = current_app.config["SUPABASE_SERVICE_ROLE_KEY"]
-    headers = {
-        "apikey": service_key,
-        "Authorization": f"Bearer {service_key}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal",
-    }
+    if not rows:
+        return jsonify({"accepted": 0, "duplicates": duplicates})
+
+    batch = IngestBatch(profile_id, assignment_id, resolved["course_id"], rows)
+
+    if not get_setting("ingest", "write_behind", True):
+        # Synchronous path: insert inline, then run the same listeners
+        queue = get_ingest_queue()
+        try:
+            inserted = queue.writer.insert(rows)
+        except InsertError as e:
+            log.error("flushes insert failed: status=%d body=%s", e.status, e.detail)
+            _forget_batch(batch)
+            return jsonify({"error": "Insert failed", "status": e.status, "detail": e.detail}), 500
+        except Exception as e:
+            log.error("flushes insert request failed: %r", e)
+            _forget_batch(batch)
+            return jsonify({"error": "Insert failed", "detail": str(e)}), 500
+        duplicates += keep_inserted(batch, inserted)
+        if batch.rows:
+            notify_listeners(batch)
+        log.info("flushes: inserted %d rows for profile_id=%s", len(batch.rows), profile_id)
+        return jsonify({"inserted": len(batch.rows), "accepted": len(rows), "duplicates": duplicates})
+
+    # Write-behind: acknowledge now, the background writer does the insert
     try:
-        resp = req.post(rest_url, headers=headers, json=rows, timeout=30)
-        if resp.status_code >= 400:
-            log.error("flushes insert failed: status=%d body=%s", resp.status_code, resp.text[:500])
-            return jsonify({"error": "Insert failed", "status": resp.status_code, "detail": resp.text[:500]}), 500
-    except Exception as e:
-        log.error("flushes insert request failed: %r", e)
-        return jsonify({"error": "Insert failed", "detail": str(e)}), 500
-
-    inserted = len(rows)
-
-    inserted = len(result.data or [])
-    log.info("flushes: inserted %d rows for profile_id=%s", inserted, profile_id)
-    return jsonify({"inserted": inserted})
+        get_ingest_queue().submit(batch)
+    except BatchTooLarge as e:
+        log.warning("flushes: rejecting %d rows for profile_id=%s, over max_rows", len(rows), profile_id)
+        _forget_batch(batch)
+        return jsonify({"error": "Batch too large, split it", "max_rows": e.max_rows}), 413
+    except QueueFull as e:
+        log.warning("flushes: queue full, rejecting %d rows for profile_id=%s", len(rows), profile_id)
+        _forget_batch(batch)
+        resp = jsonify({"error": "Ingest queue full, retry later", "retry_after": e.retry_after})
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, 429
+
+    return jsonify({"queued": len(rows), "accepted": len(rows), "duplicates": duplicates}), 202
+
+
+def _update_aggregates(batch: IngestBatch):
+    """Keep the materialized linger aggregates in step with the flushes table."""
+    apply_flushes(get_supabase(), batch.profile_id, batch.assignment_id, batch.rows)
+
+
+def _extend_timeline(batch: IngestBatch):
+    """Append the batch to the cached LLM timeline instead of rebuilding it."""
+    extend_cached(batch.profile_id, batch.assignment_id, batch.rows)
+
+
+def _invalidate_heatmap(batch: IngestBatch):
+    """The assignment's cached struggle heatmap no longer reflects its flushes."""
+    heatmap.invalidate(batch.assignment_id)
+
+
+def _update_live_struggle(batch: IngestBatch):
+    """Slide the batch into the assignment's live struggle windows."""
+    live_struggle.apply(batch.profile_id, batch.assignment_id, batch.rows)
+
+
+def _publish_delta(batch: IngestBatch):
+    """Push the batch's per-symbol delta to subscribed dashboards."""
+    events.publish_batch(batch)
+
+
+def _forget_batch(batch: IngestBatch):
+    """A batch that was never written must not block its own retry."""
+    _get_seen_filter().forget(r["client_flush_id"] for r in batch.rows)
+
+
+add_listener(_update_aggregates)
+add_listener(_extend_timeline)
+add_listener(_invalidate_heatmap)
+add_listener(_update_live_struggle)
+add_listener(_publish_delta)
+add_drop_listener(_forget_batch)
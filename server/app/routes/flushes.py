@@ -1,20 +1,109 @@
-from flask import Blueprint, jsonify, request
+import json
+import logging
+from dataclasses import asdict
+from itertools import islice
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from ..auth import require_auth
+from ..config import get_setting
+from ..services import queries
+from ..services.paging import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, fetch_page, iter_keyset
+from ..services.reconstruct import PatchError, reconstruct, resolve_sequence
 from ..services.supabase_client import get_supabase
 
+log = logging.getLogger("flushes")
+
 flushes_bp = Blueprint("flushes", __name__)
 
 
+# Timeline order; ties broken by id so the keyset cursor is total
+STUDENT_KEYS = ("start_timestamp", "id")
+
+
 @flushes_bp.route("/student/<student_id>", methods=["GET"])
 @require_auth
 def get_flushes_for_student(student_id):
-    """Return all flushes for a given student, ordered oldest to newest."""
+    """Return a student's flushes, ordered oldest to newest.
+
+    ?limit=N returns one page plus a "next" cursor to pass back as ?after=.
+    Without limit every flush is returned. Either way rows are pulled from
+    PostgREST a page at a time and streamed out; with
+    Accept: application/x-ndjson (or ?format=ndjson) one JSON row per line.
+    """
+    assignment_id = request.args.get("assignment_id")
+    page_size = get_setting("flushes", "page_size", DEFAULT_PAGE_SIZE)
+
+    limit = request.args.get("limit", type=int)
+    if limit is not None and not 1 <= limit <= page_size:
+        return jsonify({"error": f"limit must be between 1 and {page_size}"}), 400
+
+    cursor = None
+    if request.args.get("after"):
+        try:
+            cursor = decode_cursor(request.args["after"], STUDENT_KEYS)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
     sb = get_supabase()
-    query = sb.table("flushes").select("*").eq("profile_id", student_id)
 
+    def build_query():
+        query = queries.query(sb, "flushes.student").eq("profile_id", student_id)
+        if assignment_id:
+            query = query.eq("assignment_id", assignment_id)
+        return query
+
+    ndjson = (
+        request.args.get("format") == "ndjson"
+        or request.accept_mimetypes.best == "application/x-ndjson"
+    )
+
+    if limit is not None and not ndjson:
+        rows = fetch_page(build_query, STUDENT_KEYS, cursor, limit)
+        next_cursor = encode_cursor(rows[-1], STUDENT_KEYS) if len(rows) == limit else None
+        return jsonify({"data": rows, "next": next_cursor})
+
+    rows = iter_keyset(build_query, STUDENT_KEYS, page_size=min(limit or page_size, page_size), cursor=cursor)
+    if limit is not None:
+        rows = islice(rows, limit)
+
+    if ndjson:
+        return Response(
+            stream_with_context(json.dumps(r) + "\n" for r in rows),
+            mimetype="application/x-ndjson",
+        )
+    return Response(stream_with_context(_json_array(rows)), mimetype="application/json")
+
+
+def _json_array(rows):
+    """{"data": [...]} written row by row, same shape as jsonify."""
+    yield '{"data":['
+    for i, r in enumerate(rows):
+        yield ("," if i else "") + json.dumps(r)
+    yield "]}\n"
+
+
+@flushes_bp.route("/student/<student_id>/file", methods=["GET"])
+@require_auth
+def reconstruct_file(student_id):
+    """File content as of a sequence number (?sequence=) or time (?at=ISO)."""
     assignment_id = request.args.get("assignment_id")
-    if assignment_id:
-        query = query.eq("assignment_id", assignment_id)
+    file_path = request.args.get("file_path")
+    sequence = request.args.get("sequence", type=int)
+    at = request.args.get("at")
+    if not assignment_id or not file_path or (sequence is None and not at):
+        return jsonify({"error": "assignment_id, file_path and sequence or at are required"}), 400
+
+    sb = get_supabase()
+    if sequence is None:
+        sequence = resolve_sequence(sb, student_id, assignment_id, file_path, at)
+        if sequence is None:
+            return jsonify({"error": "No flushes for this file at or before that time"}), 404
 
-    result = query.order("start_timestamp", desc=False).execute()
-    return jsonify({"data": result.data})
+    try:
+        result = reconstruct(sb, student_id, assignment_id, file_path, sequence)
+    except PatchError as e:
+        log.error("reconstruct failed: profile_id=%s file=%s: %s", student_id, file_path, e)
+        return jsonify({"error": "Reconstruction failed", "detail": str(e)}), 422
+    if result is None:
+        return jsonify({"error": "No flush with that sequence number"}), 404
+    return jsonify(asdict(result))
@@ -1,4 +1,5 @@
 from flask import Blueprint, jsonify
+from ..services import stats
 
 static_bp = Blueprint("static", __name__)
 
@@ -11,3 +12,9 @@ def index():
 @static_bp.route("/health")
 def health():
     return jsonify({"healthy": True})
+
+
+@static_bp.route("/stats")
+def runtime_stats():
+    """In-process counters (caches, pools, queues) for capacity tuning."""
+    return jsonify(stats.snapshot())
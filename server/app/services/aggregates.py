@@ -0,0 +1,264 @@
+"""
+Materialized per-student symbol aggregates.
+
+Linger and focus only need per-(file, symbol) sums, so instead of replaying
+every flush on each dashboard hit we fold new flushes into running totals at
+ingest time (symbol_aggregates table) and score from those.
+"""
+
+import math
+from dataclasses import dataclass
+
+from .analysis import (
+    SymbolScore,
+    FocusArea,
+    flushes_to_edit_regions,
+    _normalize_symbol,
+)
+from .epochs import window_duration
+from .flush_stats import has_changes, fill_missing_diffs
+from . import queries
+
+# Must match the 1800s decay constant in apply_symbol_aggregates()
+FOCUS_WINDOW_MINUTES = 30
+
+# Rebuild reads retried when ingest keeps landing between read and RPC
+REBUILD_ATTEMPTS = 3
+
+# Same "active time" rule the student endpoint has always used
+MAX_ACTIVE_WINDOW = 300
+
+AGGREGATE_COLUMNS = (
+    "file_path, symbol, dwell_time, visits, chars_inserted, chars_deleted, "
+    "active_time, focus_weight, focus_epoch"
+)
+
+
+@dataclass
+class SymbolAggregate:
+    file_path: str
+    symbol: str
+    dwell_time: float = 0.0
+    visits: int = 0
+    chars_inserted: int = 0
+    chars_deleted: int = 0
+    active_time: float = 0.0
+    focus_weight: float = 0.0
+    focus_epoch: float = 0.0
+
+
+def _decay(age_sec: float) -> float:
+    return math.exp(-age_sec / (FOCUS_WINDOW_MINUTES * 60.0))
+
+
+def merge_aggregate(a: SymbolAggregate, b: SymbolAggregate) -> SymbolAggregate:
+    """Fold b into a (in place). Mirrors the ON CONFLICT clause in SQL."""
+    a.dwell_time += b.dwell_time
+    a.visits += b.visits
+    a.chars_inserted += b.chars_inserted
+    a.chars_deleted += b.chars_deleted
+    a.active_time += b.active_time
+    if b.focus_epoch >= a.focus_epoch:
+        a.focus_weight = a.focus_weight * _decay(b.focus_epoch - a.focus_epoch) + b.focus_weight
+        a.focus_epoch = b.focus_epoch
+    else:
+        a.focus_weight += b.focus_weight * _decay(a.focus_epoch - b.focus_epoch)
+    return a
+
+
+def fold_flushes(flushes: list[dict]) -> dict[tuple[str, str], SymbolAggregate]:
+    """Fold raw flush dicts into per-(file_path, normalized symbol) aggregates."""
+    rows = [dict(f, window_duration=window_duration(f)) for f in flushes]
+    regions = flushes_to_edit_regions(rows)
+
+    aggs: dict[tuple[str, str], SymbolAggregate] = {}
+    for f, r in zip(rows, regions):
+        key = (r.file_path, _normalize_symbol(r.symbol))
+        active = r.duration_sec < MAX_ACTIVE_WINDOW and has_changes(f)
+        delta = SymbolAggregate(
+            file_path=key[0],
+            symbol=key[1],
+            dwell_time=r.duration_sec,
+            visits=1,
+            chars_inserted=r.chars_inserted,
+            chars_deleted=r.chars_deleted,
+            active_time=r.duration_sec if active else 0.0,
+            focus_weight=r.duration_sec,
+            focus_epoch=r.end_epoch,
+        )
+        if key in aggs:
+            merge_aggregate(aggs[key], delta)
+        else:
+            aggs[key] = delta
+    return aggs
+
+
+def linger_from_aggregates(aggs: list[SymbolAggregate]) -> list[SymbolScore]:
+    """Algorithm 1 over pre-summed groups. Same output as compute_linger_scores."""
+    max_dwell = max((a.dwell_time for a in aggs), default=1.0) or 1.0
+
+    scores: list[SymbolScore] = []
+    for a in aggs:
+        net_abs = abs(a.chars_inserted - a.chars_deleted)
+        churn = (a.chars_inserted + a.chars_deleted) / max(net_abs, 1)
+        linger_score = (a.dwell_time / max_dwell) * churn * a.visits
+        scores.append(SymbolScore(
+            file_path=a.file_path,
+            symbol=a.symbol,
+            linger_score=round(linger_score, 2),
+            dwell_time=round(a.dwell_time, 1),
+            churn=round(churn, 2),
+            visits=a.visits,
+        ))
+
+    scores.sort(key=lambda s: s.linger_score, reverse=True)
+    return scores
+
+
+def focus_from_aggregates(aggs: list[SymbolAggregate]) -> list[FocusArea]:
+    """Algorithm 2 over pre-decayed groups. Same output as compute_current_focus."""
+    if not aggs:
+        return []
+
+    latest = max(a.focus_epoch for a in aggs)
+    result = [
+        FocusArea(
+            file_path=a.file_path,
+            symbol=a.symbol,
+            weighted_time=round(a.focus_weight * _decay(latest - a.focus_epoch), 2),
+        )
+        for a in aggs
+    ]
+    result.sort(key=lambda f: f.weighted_time, reverse=True)
+    return result
+
+
+def file_breakdown_from_aggregates(aggs: list[SymbolAggregate]) -> tuple[float, list[dict]]:
+    """Active time total and per-file breakdown."""
+    file_times: dict[str, float] = {}
+    for a in aggs:
+        if a.active_time > 0:
+            file_times[a.file_path] = file_times.get(a.file_path, 0) + a.active_time
+    breakdown = [
+        {"file_path": fp, "time_sec": round(t, 1)}
+        for fp, t in sorted(file_times.items(), key=lambda x: -x[1])
+    ]
+    return sum(file_times.values()), breakdown
+
+
+# --- DB access ---
+
+def _to_row(profile_id: str, assignment_id: str, a: SymbolAggregate) -> dict:
+    return {
+        "profile_id": profile_id,
+        "assignment_id": assignment_id,
+        "file_path": a.file_path,
+        "symbol": a.symbol,
+        "dwell_time": a.dwell_time,
+        "visits": a.visits,
+        "chars_inserted": a.chars_inserted,
+        "chars_deleted": a.chars_deleted,
+        "active_time": a.active_time,
+        "focus_weight": a.focus_weight,
+        "focus_epoch": a.focus_epoch,
+    }
+
+
+def _flush_ids(flushes: list[dict]) -> list[str]:
+    return [str(f["client_flush_id"]) for f in flushes]
+
+
+def apply_flushes(sb, profile_id: str, assignment_id: str, flushes: list[dict]) -> int:
+    """Fold a newly ingested batch into symbol_aggregates. Returns keys touched.
+
+    apply_flush_aggregates skips the deltas (returns false) when a rebuild
+    already counted the batch's flushes.
+    """
+    aggs = fold_flushes(flushes)
+    if not aggs:
+        return 0
+    deltas = [_to_row(profile_id, assignment_id, a) for a in aggs.values()]
+    result = sb.rpc("apply_flush_aggregates", {
+        "p_profile_id": profile_id,
+        "p_assignment_id": assignment_id,
+        "p_flush_ids": _flush_ids(flushes),
+        "deltas": deltas,
+    }).execute()
+    return len(deltas) if result.data else 0
+
+
+def load_aggregates(sb, profile_id: str, assignment_id: str) -> list[SymbolAggregate]:
+    result = (
+        sb.table("symbol_aggregates")
+        .select(AGGREGATE_COLUMNS)
+        .eq("profile_id", profile_id)
+        .eq("assignment_id", assignment_id)
+        .execute()
+    )
+    return [SymbolAggregate(**row) for row in result.data or []]
+
+
+# (profile, assignment) pairs known to carry the backfill marker; it is
+# never removed, so a hit here needs no query
+_backfilled: set[tuple[str, str]] = set()
+
+
+def is_backfilled(sb, profile_id: str, assignment_id: str) -> bool:
+    """Whether the pair's aggregates were rebuilt from its full history.
+
+    Aggregates written by ingest before that (older flushes predating the
+    table) are partial, however many rows they have.
+    """
+    if (profile_id, assignment_id) in _backfilled:
+        return True
+    result = (
+        sb.table("symbol_aggregate_backfills")
+        .select("profile_id")
+        .eq("profile_id", profile_id)
+        .eq("assignment_id", assignment_id)
+        .limit(1)
+        .execute()
+    )
+    if result.data:
+        _backfilled.add((profile_id, assignment_id))
+        return True
+    return False
+
+
+def rebuild_aggregates(sb, profile_id: str, assignment_id: str) -> list[SymbolAggregate]:
+    """Recompute one student's aggregates from their full flush history.
+
+    Used to backfill rows that predate the aggregate table (e.g. seeded data).
+    The flushes are read outside the RPC's transaction, so
+    rebuild_symbol_aggregates gets the ids it folded: it refuses (returns
+    false) when ingest has since counted a flush the read missed, and the
+    read is retried. Flushes the read saw are marked counted, so their
+    ingest delta is skipped. If every attempt loses that race the folded
+    result is still returned and the pair stays unmarked.
+    """
+    for _ in range(REBUILD_ATTEMPTS):
+        result = (
+            queries.query(sb, "aggregates.rebuild")
+            .eq("profile_id", profile_id)
+            .eq("assignment_id", assignment_id)
+            .execute()
+        )
+        flushes = fill_missing_diffs(sb, result.data or [])
+        aggs = fold_flushes(flushes)
+        rebuilt = sb.rpc("rebuild_symbol_aggregates", {
+            "p_profile_id": profile_id,
+            "p_assignment_id": assignment_id,
+            "p_flush_ids": _flush_ids(flushes),
+            "deltas": [_to_row(profile_id, assignment_id, a) for a in aggs.values()],
+        }).execute()
+        if rebuilt.data:
+            _backfilled.add((profile_id, assignment_id))
+            break
+    return list(aggs.values())
+
+
+def get_student_aggregates(sb, profile_id: str, assignment_id: str) -> list[SymbolAggregate]:
+    """Read a student's aggregates, backfilling from flushes until the pair is marked."""
+    if not is_backfilled(sb, profile_id, assignment_id):
+        return rebuild_aggregates(sb, profile_id, assignment_id)
+    return load_aggregates(sb, profile_id, assignment_id)
@@ -6,10 +6,11 @@ Pure functions — no DB access. All insights are explainable and computed.
 import math
 import re
 from dataclasses import dataclass, field
-from datetime import datetime
 
+from .epochs import end_epoch, parse_epoch, start_epoch
 
-@dataclass
+
+@dataclass(slots=True)
 class HunkStat:
     line_start: int
     line_end: int
@@ -17,7 +18,7 @@ class HunkStat:
     deleted: int
 
 
-@dataclass
+@dataclass(slots=True)
 class EditRegion:
     file_path: str
     symbol: str | None
@@ -29,6 +30,15 @@ class EditRegion:
     start_time: str
     end_time: str
     duration_sec: float
+    # Parsed once (flushes_to_edit_regions passes the row's epoch columns)
+    start_epoch: float | None = None
+    end_epoch: float | None = None
+
+    def __post_init__(self):
+        if self.start_epoch is None:
+            self.start_epoch = parse_epoch(self.start_time)
+        if self.end_epoch is None:
+            self.end_epoch = parse_epoch(self.end_time)
 
 
 @dataclass
@@ -57,82 +67,147 @@ class ClassSymbolScore:
     avg_churn: float
 
 
-def parse_diff_stats(diff_text: str) -> list[HunkStat]:
-    """Parse diff text, return list of per-hunk stats.
+# Hunk header: "@@ -a,b +c,d @@" (captures new-file start line).
+# _HUNK_LINE finds the first header anywhere; _HUNK_AT matches one at a
+# known line start without slicing the line out.
+_HUNK_LINE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+_HUNK_AT = re.compile(r"@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
 
-    Supports two formats:
+def _scan_hunks(diff_text: str, hunks: list | None = None) -> tuple[int, int, int, int]:
+    """Single pass over a diff, folding its hunks as they close.
+
+    Returns the aggregate (line_start, line_end, inserted, deleted) exactly as
+    aggregate_hunks would; per-hunk tuples are appended to hunks only when a
+    list is passed. Walks newline offsets with str.find and inspects the first
+    character of each line, so no per-line strings or line lists are built.
+    Same results as the historical split-based parser for both formats:
     1. Unified diff with @@ headers
     2. Simple +/- line diffs (no headers) as produced by seed generators
     """
-    hunks: list[HunkStat] = []
     if not diff_text:
-        return hunks
-
-    lines = diff_text.split("\n")
-    hunk_pattern = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
-
-    has_hunk_headers = any(hunk_pattern.match(l) for l in lines)
-
-    if has_hunk_headers:
-        # Unified diff format
-        hunk_starts: list[int] = []
-        for i, line in enumerate(lines):
-            if hunk_pattern.match(line):
-                hunk_starts.append(i)
-
-        for hi, start_line_idx in enumerate(hunk_starts):
-            m = hunk_pattern.match(lines[start_line_idx])
-            if not m:
-                continue
-            new_start = int(m.group(1))
-            end_idx = hunk_starts[hi + 1] if hi + 1 < len(hunk_starts) else len(lines)
-
-            inserted = 0
-            deleted = 0
-            max_line = new_start
-            for li in range(start_line_idx + 1, end_idx):
-                line = lines[li]
-                if line.startswith("+"):
-                    inserted += len(line) - 1
-                    max_line += 1
-                elif line.startswith("-"):
-                    deleted += len(line) - 1
-                elif line.startswith(" "):
-                    max_line += 1
-
-            hunks.append(HunkStat(
-                line_start=new_start,
-                line_end=max_line,
-                inserted=inserted,
-                deleted=deleted,
-            ))
-    else:
+        return (0, 0, 0, 0)
+
+    find = diff_text.find
+    n = len(diff_text)
+    first = _HUNK_LINE.search(diff_text)
+
+    if first is None:
         # Simple +/- format: treat entire diff as one hunk
-        inserted = 0
-        deleted = 0
-        line_num = 1
-        max_line = 1
-        for line in lines:
-            if line.startswith("+"):
-                inserted += len(line) - 1
-                max_line = max(max_line, line_num)
+        inserted = deleted = 0
+        line_num = max_line = 1
+        pos = 0
+        while pos < n:
+            nl = find("\n", pos)
+            if nl < 0:
+                nl = n
+            c = diff_text[pos] if pos < nl else ""
+            if c == "+":
+                inserted += nl - pos - 1
+                if line_num > max_line:
+                    max_line = line_num
                 line_num += 1
-            elif line.startswith("-"):
-                deleted += len(line) - 1
+            elif c == "-":
+                deleted += nl - pos - 1
             else:
                 line_num += 1
-
+            pos = nl + 1
         if inserted > 0 or deleted > 0:
-            hunks.append(HunkStat(
-                line_start=1,
-                line_end=max_line,
-                inserted=inserted,
-                deleted=deleted,
-            ))
-
+            if hunks is not None:
+                hunks.append((1, max_line, inserted, deleted))
+            return (1, max_line, inserted, deleted)
+        return (0, 0, 0, 0)
+
+    # Unified diff format: everything before the first header is preamble
+    lo = hi = total_ins = total_del = count = 0
+    new_start = max_line = inserted = deleted = 0
+    in_hunk = False
+    pos = first.start()
+    match_at = _HUNK_AT.match
+    while True:
+        m = None
+        while pos < n:
+            nl = find("\n", pos)
+            if nl < 0:
+                nl = n
+            c = diff_text[pos] if pos < nl else ""
+            if c == "+":
+                inserted += nl - pos - 1
+                max_line += 1
+            elif c == "-":
+                deleted += nl - pos - 1
+            elif c == " ":
+                max_line += 1
+            elif c == "@":
+                m = match_at(diff_text, pos, nl)
+            pos = nl + 1
+            if m is not None:
+                break
+        # A hunk closes at the next header or at the end of the diff
+        if in_hunk:
+            if hunks is not None:
+                hunks.append((new_start, max_line, inserted, deleted))
+            if count == 0 or new_start < lo:
+                lo = new_start
+            if count == 0 or max_line > hi:
+                hi = max_line
+            total_ins += inserted
+            total_del += deleted
+            count += 1
+        if m is None:
+            return (lo, hi, total_ins, total_del)
+        new_start = max_line = int(m.group(1))
+        inserted = deleted = 0
+        in_hunk = True
+
+
+def iter_hunk_stats(diff_text: str) -> list[tuple[int, int, int, int]]:
+    """Per-hunk (line_start, line_end, inserted, deleted) tuples."""
+    hunks: list[tuple[int, int, int, int]] = []
+    _scan_hunks(diff_text, hunks)
     return hunks
 
 
+def fold_hunk_stats(diff_text: str) -> tuple[int, int, int, int]:
+    """aggregate_hunks(iter_hunk_stats(diff_text)) without building per-hunk records."""
+    return _scan_hunks(diff_text)
+
+
+def parse_diff_stats(diff_text: str) -> list[HunkStat]:
+    """Parse diff text, return list of per-hunk stats (see iter_hunk_stats)."""
+    return [HunkStat(*h) for h in iter_hunk_stats(diff_text)]
+
+
+def aggregate_hunks(hunks: list[tuple[int, int, int, int]]) -> tuple[int, int, int, int]:
+    """Fold per-hunk tuples into one (line_start, line_end, inserted, deleted)."""
+    if len(hunks) == 1:
+        return hunks[0]
+    if not hunks:
+        return (0, 0, 0, 0)
+    return (
+        min(h[0] for h in hunks),
+        max(h[1] for h in hunks),
+        sum(h[2] for h in hunks),
+        sum(h[3] for h in hunks),
+    )
+
+
+def flush_diff_stats(f: dict) -> tuple[int, int, int, int]:
+    """Aggregated diff stats for a flush row.
+
+    Uses the diff_* columns stored at ingest when present; only rows that
+    predate them fall back to parsing the diff text.
+    """
+    if f.get("diff_inserted") is not None:
+        return (
+            f["diff_line_start"],
+            f["diff_line_end"],
+            f["diff_inserted"],
+            f["diff_deleted"],
+        )
+    return fold_hunk_stats(f.get("diffs", ""))
+
+
 def flushes_to_edit_regions(flushes: list[dict]) -> list[EditRegion]:
     """
     Convert raw flush dicts to EditRegion list.
@@ -142,22 +217,10 @@ def flushes_to_edit_regions(flushes: list[dict]) -> list[EditRegion]:
     """
     regions: list[EditRegion] = []
     for f in flushes:
-        hunks = parse_diff_stats(f.get("diffs", ""))
+        line_start, line_end, total_inserted, total_deleted = flush_diff_stats(f)
         duration = f.get("window_duration") or 0.0
         symbol = f.get("active_symbol") or None
 
-        # Aggregate all hunks from this flush
-        if hunks:
-            total_inserted = sum(h.inserted for h in hunks)
-            total_deleted = sum(h.deleted for h in hunks)
-            line_start = min(h.line_start for h in hunks)
-            line_end = max(h.line_end for h in hunks)
-        else:
-            total_inserted = 0
-            total_deleted = 0
-            line_start = 0
-            line_end = 0
-
         # Create ONE region per flush (aggregated stats)
         regions.append(EditRegion(
             file_path=f["file_path"],
@@ -170,6 +233,8 @@ def flushes_to_edit_regions(flushes: list[dict]) -> list[EditRegion]:
             start_time=f["start_timestamp"],
             end_time=f["end_timestamp"],
             duration_sec=duration,
+            start_epoch=start_epoch(f),
+            end_epoch=end_epoch(f),
         ))
 
     return regions
@@ -233,17 +298,11 @@ def compute_current_focus(
         return []
 
     # Find the latest timestamp
-    def parse_ts(s: str) -> float:
-        try:
-            return datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp()
-        except Exception:
-            return 0.0
-
-    latest = max(parse_ts(r.end_time) for r in regions)
+    latest = max(r.end_epoch for r in regions)
 
     focus: dict[tuple[str, str], float] = {}
     for r in regions:
-        age_sec = latest - parse_ts(r.end_time)
+        age_sec = latest - r.end_epoch
         age_min = age_sec / 60.0
         decay = math.exp(-age_min / window_minutes)
         key = (r.file_path, _normalize_symbol(r.symbol))
@@ -0,0 +1,212 @@
+"""
+AI reports for every student in an assignment, in one streamed batch.
+
+All prompts are prepared locally first, in a single keyset-paged pass
+over the assignment's flushes. That pass builds each student's timeline,
+linger scores and report fingerprint. Reports already in the report
+cache are emitted straight away. The rest go to the LLM with at most
+batch_reports.concurrency calls in flight, and each is emitted as soon as
+it completes.
+
+A rate-limit (429) or transient error is retried with backoff, honouring
+Retry-After. It also pauses every worker (RateGate), so the batch slows
+down as a whole instead of hammering the API. The class narrative
+(llm.generate_class_narrative) is the last event.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+from . import queries
+from .analysis import SymbolScore, compute_class_struggle
+from .llm import generate_class_narrative, generate_detailed_report, is_placeholder
+from .paging import iter_groups, iter_keyset
+from .report_cache import fingerprint, get_report_cache, pair_key, store
+from .scoring import score_student
+from .epochs import start_epoch
+from .timeline import StudentTimeline, recording_ingest, seed
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+log = logging.getLogger("batch_reports")
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class StudentInput:
+    student_id: str
+    timeline: StudentTimeline
+    linger_scores: list[SymbolScore]
+    pair: str
+    fingerprint: str
+
+
+def prepare_inputs(sb, assignment_id: str, page_size: int) -> list[StudentInput]:
+    """Timeline, linger scores and fingerprint for every student with flushes."""
+    rows = iter_keyset(
+        lambda: queries.query(sb, "analysis.batch").eq("assignment_id", assignment_id),
+        keys=("profile_id", "id"),
+        page_size=page_size,
+    )
+    inputs = []
+    with recording_ingest(assignment_id) as recorded:
+        for sid, flushes in iter_groups(rows, "profile_id"):
+            latest = max(flushes, key=lambda f: (start_epoch(f), f["id"]))
+            timeline = StudentTimeline.build(flushes)
+            # Later chats and single reports reuse the timeline
+            seed(sid, assignment_id, timeline, flushes, recorded)
+            inputs.append(StudentInput(
+                sid,
+                timeline,
+                score_student(flushes),
+                pair_key(sid, assignment_id),
+                fingerprint(sid, assignment_id, len(flushes), latest),
+            ))
+    return inputs
+
+
+class RateGate:
+    """Shared pause: a rate-limited call holds back every worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+        self.pauses = 0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+            self.pauses += 1
+
+
+def _retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retryable(e: Exception) -> bool:
+    if getattr(e, "status_code", None) in _RETRY_STATUS:
+        return True
+    return openai is not None and isinstance(e, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def generate_with_retry(
+    inp: StudentInput,
+    gate: RateGate,
+    max_retries: int = 5,
+    backoff_sec: float = 1.0,
+    max_backoff_sec: float = 30.0,
+) -> str:
+    attempt = 0
+    while True:
+        gate.wait()
+        try:
+            return generate_detailed_report(inp.timeline, inp.linger_scores, raise_errors=True)
+        except Exception as e:
+            if not _retryable(e) or attempt >= max_retries:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = min(max_backoff_sec, backoff_sec * 2 ** attempt) * (0.5 + random.random() / 2)
+            if getattr(e, "status_code", None) == 429:
+                gate.pause(delay)
+            attempt += 1
+            log.warning("report for %s failed (%r), retry %d in %.1fs", inp.student_id, e, attempt, delay)
+            time.sleep(delay)
+
+
+def run_batch(
+    inputs: list[StudentInput],
+    concurrency: int = 8,
+    max_retries: int = 5,
+    backoff_sec: float = 1.0,
+    max_backoff_sec: float = 30.0,
+) -> Iterator[dict]:
+    """Yield one event per student, cached reports first, then as completed.
+
+    Events: {"student_id", "report", "cached"} or, when generation failed,
+    {"student_id", "error"} plus the previous "report" if one is cached.
+    """
+    cache = get_report_cache()
+    pending: list[tuple[StudentInput, tuple | None]] = []
+    for inp in inputs:
+        hit = cache.get(inp.pair, inp.fingerprint)
+        if hit is not None and hit[1]:
+            yield {"student_id": inp.student_id, "report": hit[0], "cached": True}
+        else:
+            pending.append((inp, hit))
+    if not pending:
+        return
+
+    gate = RateGate()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-report")
+    try:
+        futures = {
+            executor.submit(generate_with_retry, inp, gate, max_retries, backoff_sec, max_backoff_sec): (inp, hit)
+            for inp, hit in pending
+        }
+        for fut in as_completed(futures):
+            inp, stale = futures[fut]
+            try:
+                report = fut.result()
+            except Exception as e:
+                event = {"student_id": inp.student_id, "error": str(e)}
+                if stale is not None:
+                    event.update(report=stale[0], stale=True)
+                yield event
+                continue
+            store(inp.pair, inp.fingerprint, report)
+            yield {"student_id": inp.student_id, "report": report, "cached": False}
+    finally:
+        # A client that disconnects stops the batch: queued calls are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def class_reports(
+    sb,
+    assignment_id: str,
+    page_size: int,
+    concurrency: int = 8,
+    max_retries: int = 5,
+    backoff_sec: float = 1.0,
+    max_backoff_sec: float = 30.0,
+) -> Iterator[dict]:
+    """Every student's report event, then the class narrative as the last event."""
+    inputs = prepare_inputs(sb, assignment_id, page_size)
+    counts = {"students": len(inputs), "cached": 0, "generated": 0, "failed": 0}
+    for event in run_batch(inputs, concurrency, max_retries, backoff_sec, max_backoff_sec):
+        if "error" in event:
+            counts["failed"] += 1
+        elif event["cached"]:
+            counts["cached"] += 1
+        elif not is_placeholder(event["report"]):
+            counts["generated"] += 1
+        yield event
+
+    struggle = compute_class_struggle([inp.linger_scores for inp in inputs])
+    yield {
+        "narrative": generate_class_narrative(struggle),
+        "struggle_topics": [asdict(s) for s in struggle],
+        "summary": counts,
+    }
@@ -0,0 +1,163 @@
+"""
+Columnar (NumPy) backend for linger and focus scoring.
+
+Same inputs and outputs as the list-of-dataclass functions in analysis.py,
+but regions are held as parallel arrays (file id, symbol id, duration,
+inserted, deleted, end epoch) and group-bys, decay and normalization run as
+vectorized operations. Group sums use np.bincount, which accumulates in
+input order exactly like the Python loops, and outputs are rounded with
+Python's round(), so results match the reference implementation.
+"""
+
+from dataclasses import dataclass
+
+from .analysis import (
+    EditRegion,
+    SymbolScore,
+    FocusArea,
+    _normalize_symbol,
+)
+from .regions import RegionStore
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
+
+
+def available() -> bool:
+    return np is not None
+
+
+@dataclass
+class RegionColumns:
+    """Edit regions as parallel arrays with interned file/symbol ids."""
+    files: list[str]
+    symbols: list[str]
+    file_id: "np.ndarray"
+    symbol_id: "np.ndarray"
+    duration: "np.ndarray"
+    inserted: "np.ndarray"
+    deleted: "np.ndarray"
+    end_epoch: "np.ndarray"
+
+    def __len__(self) -> int:
+        return len(self.file_id)
+
+    @classmethod
+    def from_regions(cls, regions: list[EditRegion]) -> "RegionColumns":
+        files: dict[str, int] = {}
+        symbols: dict[str, int] = {}
+        n = len(regions)
+        file_id = np.empty(n, dtype=np.int32)
+        symbol_id = np.empty(n, dtype=np.int32)
+        duration = np.empty(n, dtype=np.float64)
+        inserted = np.empty(n, dtype=np.int64)
+        deleted = np.empty(n, dtype=np.int64)
+        end_epoch = np.empty(n, dtype=np.float64)
+        for i, r in enumerate(regions):
+            file_id[i] = files.setdefault(r.file_path, len(files))
+            symbol_id[i] = symbols.setdefault(_normalize_symbol(r.symbol), len(symbols))
+            duration[i] = r.duration_sec
+            inserted[i] = r.chars_inserted
+            deleted[i] = r.chars_deleted
+            end_epoch[i] = r.end_epoch
+        return cls(list(files), list(symbols), file_id, symbol_id, duration, inserted, deleted, end_epoch)
+
+    @classmethod
+    def from_store(cls, store: RegionStore) -> "RegionColumns":
+        """Copy a RegionStore's typed arrays straight into NumPy, no per-row loop."""
+        def col(a, dtype):
+            return np.frombuffer(a, dtype=dtype).copy() if len(a) else np.empty(0, dtype=dtype)
+
+        return cls(
+            list(store.files),
+            list(store.symbols),
+            col(store.file_id, np.intc),
+            col(store.symbol_id, np.intc),
+            col(store.duration, np.float64),
+            col(store.inserted, np.int64),
+            col(store.deleted, np.int64),
+            col(store.end_epoch, np.float64),
+        )
+
+    def group_keys(self):
+        """(first index of each group in appearance order, group id per row)."""
+        key = self.file_id.astype(np.int64) * max(len(self.symbols), 1) + self.symbol_id
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        # Renumber groups by first appearance so output ties keep input order
+        order = np.argsort(first, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return first[order], rank[inverse.ravel()]
+
+
+def _as_columns(regions) -> RegionColumns:
+    if isinstance(regions, RegionColumns):
+        return regions
+    if isinstance(regions, RegionStore):
+        return RegionColumns.from_store(regions)
+    return RegionColumns.from_regions(regions)
+
+
+def _sort_desc(values: list[float]) -> list[int]:
+    """Indices sorting values descending, stable (same as list.sort(reverse=True))."""
+    return sorted(range(len(values)), key=lambda i: values[i], reverse=True)
+
+
+def compute_linger_scores(regions) -> list[SymbolScore]:
+    """Algorithm 1 (columnar). Accepts EditRegions, a RegionStore or RegionColumns."""
+    cols = _as_columns(regions)
+    if len(cols) == 0:
+        return []
+
+    first, group = cols.group_keys()
+    g = len(first)
+    dwell = np.bincount(group, weights=cols.duration, minlength=g)
+    visits = np.bincount(group, minlength=g)
+    ins = np.bincount(group, weights=cols.inserted, minlength=g).astype(np.int64)
+    dele = np.bincount(group, weights=cols.deleted, minlength=g).astype(np.int64)
+
+    max_dwell = float(dwell.max()) or 1.0
+    churn = (ins + dele) / np.maximum(np.abs(ins - dele), 1)
+    linger = dwell / max_dwell * churn * visits
+
+    fids = cols.file_id[first]
+    sids = cols.symbol_id[first]
+    scores = [
+        SymbolScore(
+            file_path=cols.files[fids[i]],
+            symbol=cols.symbols[sids[i]],
+            linger_score=round(float(linger[i]), 2),
+            dwell_time=round(float(dwell[i]), 1),
+            churn=round(float(churn[i]), 2),
+            visits=int(visits[i]),
+        )
+        for i in range(g)
+    ]
+    return [scores[i] for i in _sort_desc([s.linger_score for s in scores])]
+
+
+def compute_current_focus(regions, window_minutes: float = 30) -> list[FocusArea]:
+    """Algorithm 2 (columnar). Accepts EditRegions, a RegionStore or RegionColumns."""
+    cols = _as_columns(regions)
+    if len(cols) == 0:
+        return []
+
+    first, group = cols.group_keys()
+    latest = cols.end_epoch.max()
+    decay = np.exp(-((latest - cols.end_epoch) / 60.0) / window_minutes)
+    weighted = np.bincount(group, weights=cols.duration * decay, minlength=len(first))
+
+    fids = cols.file_id[first]
+    sids = cols.symbol_id[first]
+    result = [
+        FocusArea(
+            file_path=cols.files[fids[i]],
+            symbol=cols.symbols[sids[i]],
+            weighted_time=round(float(weighted[i]), 2),
+        )
+        for i in range(len(first))
+    ]
+    return [result[i] for i in _sort_desc([f.weighted_time for f in result])]
+
@@ -0,0 +1,47 @@
+"""
+Idempotent ingest: recognize client_flush_ids the server has already taken.
+
+The extension re-sends flushes after a failed push, so the same
+client_flush_id can arrive more than once. Recently seen ids live in a
+bounded in-memory LRU, which catches those retries before they are queued.
+An id not in memory is treated as new without asking the database: if it
+was in fact stored already, the insert skips it through the unique index on
+client_flush_id (on_conflict + ignore-duplicates, see services/ingest.py)
+and the post-insert listeners never see it.
+"""
+
+import threading
+
+from .cache import TTLCache
+
+
+class SeenFilter:
+    def __init__(self, maxsize: int = 200_000):
+        self._seen = TTLCache(maxsize=maxsize, ttl=None)
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, ids: list[str]) -> list[str]:
+        """Return the ids not seen recently (first occurrence, input order).
+
+        New ids are marked seen immediately so a concurrent retry of the
+        same batch is caught even before the first one is written.
+        """
+        new_ids: list[str] = []
+        in_batch: set[str] = set()
+        with self._lock:
+            for cid in ids:
+                if cid not in in_batch and not self._seen.get(cid):
+                    self._seen.set(cid, True)
+                    new_ids.append(cid)
+                in_batch.add(cid)
+            self.duplicates += len(ids) - len(new_ids)
+        return new_ids
+
+    def forget(self, ids) -> None:
+        """Un-see ids whose insert was dropped so a retry is accepted."""
+        for cid in ids:
+            self._seen.invalidate(cid)
+
+    def stats(self) -> dict:
+        return dict(self._seen.stats(), duplicates=self.duplicates)
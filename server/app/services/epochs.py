@@ -0,0 +1,41 @@
+"""
+Flush timestamps as float epochs, parsed at most once per row.
+
+The flushes table carries start_epoch / end_epoch generated columns
+(migration 011), so rows loaded through the registered projections already
+hold numbers. Rows that come straight from the extension (ingest listeners)
+do not; the first lookup parses the ISO string and stores the result on the
+row, so later passes over the same rows read a float.
+"""
+
+from datetime import datetime
+
+
+def parse_epoch(ts: str | None) -> float:
+    """ISO-8601 timestamp → seconds since the epoch (0.0 if unparseable)."""
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return 0.0
+
+
+def start_epoch(row: dict) -> float:
+    value = row.get("start_epoch")
+    if value is None:
+        value = row["start_epoch"] = parse_epoch(row.get("start_timestamp"))
+    return value
+
+
+def end_epoch(row: dict) -> float:
+    value = row.get("end_epoch")
+    if value is None:
+        value = row["end_epoch"] = parse_epoch(row.get("end_timestamp"))
+    return value
+
+
+def window_duration(row: dict) -> float:
+    """window_duration is a generated column, so rows fresh from the extension lack it."""
+    duration = row.get("window_duration")
+    if duration is None:
+        duration = end_epoch(row) - start_epoch(row)
+    return duration or 0.0
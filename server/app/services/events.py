@@ -0,0 +1,327 @@
+"""
+In-process pub/sub of ingest deltas, pushed to open dashboards over SSE.
+
+Once a flush batch is durably inserted, the ingest listener publishes one
+compact delta for it. The delta carries the student, assignment and course,
+plus the per-(file, symbol) dwell, visit and inserted/deleted character
+sums for just that batch. Dashboards subscribed to the course or the
+assignment add the delta to the totals they already hold, instead of
+polling /api/analysis/student or /class. Churn is recomputed client-side
+from the summed inserted/deleted counts.
+
+Every subscriber gets a bounded queue, so publishing never blocks ingest.
+If a subscriber falls behind (a stalled client), its queue is cleared and it
+gets a single {"type": "resync"} event, meaning "refetch from the analysis
+endpoints".
+
+Subscribers are streamed either by a WSGI generator (stream(), one server
+thread per open dashboard) or, under app/asgi.py, by a coroutine
+(astream()) that is woken by deliveries and ends on http.disconnect.
+
+Each worker process has its own broker. Set events.relay to a file path and
+every worker also appends its deltas to that file and tails it for the other
+workers' deltas. This is a best-effort local stand-in for a message bus when
+several workers run on one host. The file is rotated to <path>.1 past
+relay_max_bytes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+from typing import AsyncIterator, Callable, Iterator
+
+from .aggregates import fold_flushes
+from .epochs import end_epoch
+
+log = logging.getLogger("events")
+
+
+def batch_delta(batch) -> dict:
+    """Compact delta for one ingested batch (see module docstring)."""
+    aggs = fold_flushes(batch.rows)
+    return {
+        "type": "flushes",
+        "profile_id": batch.profile_id,
+        "assignment_id": batch.assignment_id,
+        "course_id": batch.course_id,
+        "flushes": len(batch.rows),
+        "latest_epoch": max((end_epoch(r) for r in batch.rows), default=None),
+        "symbols": [
+            {
+                "file_path": a.file_path,
+                "symbol": a.symbol,
+                "dwell_time": round(a.dwell_time, 2),
+                "active_time": round(a.active_time, 2),
+                "visits": a.visits,
+                "inserted": a.chars_inserted,
+                "deleted": a.chars_deleted,
+            }
+            for a in aggs.values()
+        ],
+    }
+
+
+class Subscription:
+    __slots__ = ("course_id", "assignment_id", "queue", "wakeup")
+
+    def __init__(self, course_id: str | None, assignment_id: str | None, queue_size: int):
+        self.course_id = course_id
+        self.assignment_id = assignment_id
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # Called (from the publishing thread) after each delivery; set by astream
+        self.wakeup: Callable[[], None] | None = None
+
+    def matches(self, event: dict) -> bool:
+        return (
+            (self.assignment_id is None or event.get("assignment_id") == self.assignment_id)
+            and (self.course_id is None or event.get("course_id") == self.course_id)
+        )
+
+
+class Broker:
+    """Fan-out of events to the subscriptions whose filter matches."""
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.relay: "FileRelay | None" = None
+        self._subs: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def subscribe(self, course_id: str | None = None, assignment_id: str | None = None) -> Subscription:
+        sub = Subscription(course_id, assignment_id, self.queue_size)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, event: dict) -> None:
+        """Deliver locally and, with a relay, to the other workers."""
+        self.published += 1
+        self.deliver(event)
+        if self.relay is not None:
+            self.relay.send(event)
+
+    def deliver(self, event: dict) -> None:
+        with self._lock:
+            subs = [s for s in self._subs if s.matches(event)]
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(event)
+                self.delivered += 1
+            except queue.Full:
+                _drain(sub.queue)
+                sub.queue.put_nowait({"type": "resync"})
+                self.resyncs += 1
+            if sub.wakeup is not None:
+                try:
+                    sub.wakeup()
+                except RuntimeError:
+                    # Its event loop already closed; unsubscribe is on its way
+                    pass
+
+    def stream(self, sub: Subscription, heartbeat_sec: float = 15.0) -> Iterator[str]:
+        """SSE lines for a subscription; unsubscribes when the generator is closed.
+
+        The WSGI server closes it once a write fails, so a disconnected
+        client is noticed at the next event or keepalive at the latest.
+        Servers that swallow failed writes (a2wsgi) never close it, which
+        is why app/asgi.py serves /events with astream() instead.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = sub.queue.get(timeout=heartbeat_sec)
+                except queue.Empty:
+                    # Comment line: keeps proxies from timing out the idle
+                    # connection, and gives the server a write to fail on
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    async def astream(self, sub: Subscription, heartbeat_sec: float = 15.0) -> AsyncIterator[str]:
+        """stream() for an event loop: waits on a wakeup, not a thread.
+
+        The caller ends it (aclose) when the client disconnects, which
+        unsubscribes.
+        """
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        sub.wakeup = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = sub.queue.get_nowait()
+                except queue.Empty:
+                    # Clear, then re-check: a delivery in between sets it again
+                    ready.clear()
+                    if not sub.queue.empty():
+                        continue
+                    try:
+                        await asyncio.wait_for(ready.wait(), heartbeat_sec)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            sub.wakeup = None
+            self.unsubscribe(sub)
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "relay": self.relay.stats() if self.relay is not None else None,
+        }
+
+
+def _drain(q: queue.Queue) -> None:
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+class FileRelay:
+    """Events shared between workers through an append-only file on one host.
+
+    send() appends one JSON line tagged with this process's origin. A daemon
+    thread tails the file (following rotation by inode, like tail -F) and
+    hands every other origin's events to deliver.
+    """
+
+    def __init__(self, path: str, deliver: Callable[[dict], None], poll_sec: float = 0.2, max_bytes: int = 8 << 20):
+        self.path = path
+        self.deliver = deliver
+        self.poll_sec = poll_sec
+        self.max_bytes = max_bytes
+        self.origin = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self.sent = 0
+        self.received = 0
+        self._file = self._open(at_end=True)
+        self._partial = ""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="events-relay", daemon=True)
+        self._thread.start()
+
+    def _open(self, at_end: bool):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+")
+        f.seek(0, os.SEEK_END if at_end else os.SEEK_SET)
+        return f
+
+    def send(self, event: dict) -> None:
+        line = (json.dumps({"origin": self.origin, "event": event}) + "\n").encode()
+        try:
+            # One O_APPEND write per event, so workers never interleave lines
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            self.sent += 1
+            if size > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError as e:
+            log.warning("events relay write failed: %r", e)
+
+    def poll(self) -> int:
+        """Deliver whatever other workers appended since the last poll."""
+        n = 0
+        while True:
+            chunk = self._file.read()
+            if chunk:
+                lines = (self._partial + chunk).split("\n")
+                self._partial = lines.pop()
+                for line in lines:
+                    n += self._handle(line)
+                continue
+            # At EOF: if the file was rotated, finish with the new one
+            try:
+                rotated = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+            except OSError:
+                rotated = False
+            if not rotated:
+                return n
+            self._file.close()
+            self._file = self._open(at_end=False)
+            self._partial = ""
+
+    def _handle(self, line: str) -> int:
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            return 0
+        if msg.get("origin") == self.origin:
+            return 0
+        self.received += 1
+        self.deliver(msg["event"])
+        return 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_sec):
+            try:
+                self.poll()
+            except Exception:
+                log.exception("events relay poll failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._file.close()
+
+    def stats(self) -> dict:
+        return {"path": self.path, "origin": self.origin, "sent": self.sent, "received": self.received}
+
+
+_broker: Broker | None = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                from ..config import get_setting
+                from . import stats
+
+                broker = Broker(get_setting("events", "queue_size", 256))
+                path = get_setting("events", "relay", None)
+                if path:
+                    broker.relay = FileRelay(
+                        path,
+                        broker.deliver,
+                        poll_sec=get_setting("events", "relay_poll_sec", 0.2),
+                        max_bytes=get_setting("events", "relay_max_bytes", 8 << 20),
+                    )
+                stats.register("events", broker.stats)
+                _broker = broker
+    return _broker
+
+
+def publish_batch(batch) -> None:
+    """Ingest listener body: publish a batch's delta if anyone could be listening."""
+    broker = get_broker()
+    if len(broker) or broker.relay is not None:
+        broker.publish(batch_delta(batch))
@@ -0,0 +1,58 @@
+"""
+Run independent Supabase queries concurrently.
+
+Each query is a blocking HTTP round trip on the shared connection pool, so
+a small thread pool is enough to overlap them. Callables run outside the
+Flask request context: read g / request before building them.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from ..config import get_setting
+
+            _executor = ThreadPoolExecutor(
+                max_workers=get_setting("http", "fanout_workers", 16),
+                thread_name_prefix="fanout",
+            )
+        return _executor
+
+
+def gather(*calls: Callable[[], Any]) -> list[Any]:
+    """Run calls concurrently and return their results in order.
+
+    The last call runs on the current thread. If any call raises, the first
+    exception (in argument order) is re-raised after all have finished.
+    """
+    if len(calls) <= 1:
+        return [c() for c in calls]
+
+    executor = _get_executor()
+    futures = [executor.submit(c) for c in calls[:-1]]
+    try:
+        last, last_error = calls[-1](), None
+    except BaseException as e:
+        last, last_error = None, e
+
+    results: list[Any] = []
+    error: BaseException | None = None
+    for fut in futures:
+        try:
+            results.append(fut.result())
+        except BaseException as e:
+            results.append(None)
+            error = error or e
+    error = error or last_error
+    if error is not None:
+        raise error
+    results.append(last)
+    return results
@@ -0,0 +1,52 @@
+"""
+Ingest-time diff stats stored on each flush row (diff_* columns).
+
+Computed once when a batch arrives so analysis queries can leave `diffs` off
+the wire; rows from before the columns existed get their diffs fetched
+on demand.
+"""
+
+from .analysis import fold_hunk_stats
+
+STAT_COLUMNS = "diff_inserted, diff_deleted, diff_line_start, diff_line_end"
+
+# Ids per in.(...) filter; keeps the PostgREST URL well under proxy limits
+_ID_CHUNK = 200
+
+
+def diff_stat_columns(diff_text: str) -> dict:
+    """diff_* column values for one flush's diff text."""
+    line_start, line_end, inserted, deleted = fold_hunk_stats(diff_text)
+    return {
+        "diff_inserted": inserted,
+        "diff_deleted": deleted,
+        "diff_line_start": line_start,
+        "diff_line_end": line_end,
+    }
+
+
+def has_changes(f: dict) -> bool:
+    """Whether a flush carries actual edits (used for the active-time filter).
+
+    Always decided from the diff stats (stored, or parsed for legacy rows), so
+    a batch folded at ingest and the same rows rebuilt from the table agree.
+    """
+    if f.get("diff_inserted") is not None:
+        return bool(f["diff_inserted"] or f.get("diff_deleted"))
+    _, _, inserted, deleted = fold_hunk_stats(f.get("diffs") or "")
+    return bool(inserted or deleted)
+
+
+def fill_missing_diffs(sb, rows: list[dict]) -> list[dict]:
+    """Attach `diffs` to rows that have no stored stats."""
+    missing = [r["id"] for r in rows if r.get("diff_inserted") is None and "diffs" not in r]
+    if not missing:
+        return rows
+    diffs = {}
+    for i in range(0, len(missing), _ID_CHUNK):
+        result = sb.table("flushes").select("id, diffs").in_("id", missing[i:i + _ID_CHUNK]).execute()
+        diffs.update((r["id"], r["diffs"]) for r in result.data or [])
+    for r in rows:
+        if r["id"] in diffs:
+            r["diffs"] = diffs[r["id"]]
+    return rows
@@ -0,0 +1,137 @@
+"""
+Class struggle heatmap: students x top struggle symbols (docs/stats.txt §4).
+
+Cell (i, j) is student i's linger score for symbol j, the best over that
+student's files, which is the same per-student dedup compute_class_struggle
+uses. Cells are scaled 0-100 against the largest cell and held row-major in
+one byte array. The dashboard therefore gets a single small matrix instead
+of every student's full linger list.
+
+Matrices are cached per assignment. New flushes only mark an assignment's
+entry stale (invalidate), and a stale matrix keeps being served until it is
+max_stale seconds old. While ingest is busy the class is rescored at most
+once per max_stale per assignment, instead of on every read after every
+batch. A computation that races with an ingest is cached already stale.
+"""
+
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Callable
+
+from .analysis import ClassSymbolScore, SymbolScore, _normalize_symbol
+from .cache import TTLCache
+
+TOP_SYMBOLS = 6
+
+
+@dataclass
+class Heatmap:
+    students: list[str]
+    symbols: list[str]
+    cells: array  # 'B', row-major, len(students) * len(symbols), 0-100
+    max_linger: float
+
+    def to_json(self) -> dict:
+        return {
+            "students": self.students,
+            "symbols": self.symbols,
+            "shape": [len(self.students), len(self.symbols)],
+            "cells": self.cells.tolist(),
+            "max_linger": self.max_linger,
+        }
+
+
+def build_heatmap(
+    student_scores: dict[str, list[SymbolScore]],
+    struggle: list[ClassSymbolScore],
+    top: int = TOP_SYMBOLS,
+) -> Heatmap:
+    """Matrix over the top struggle symbols, rows in student_scores order."""
+    symbols = [s.symbol for s in struggle[:top]]
+    column = {sym: j for j, sym in enumerate(symbols)}
+    width = len(symbols)
+    raw = [0.0] * (len(student_scores) * width)
+    for i, scores in enumerate(student_scores.values()):
+        for s in scores:
+            j = column.get(_normalize_symbol(s.symbol))
+            if j is not None and s.linger_score > raw[i * width + j]:
+                raw[i * width + j] = s.linger_score
+
+    max_linger = max(raw, default=0.0)
+    scale = 100.0 / max_linger if max_linger > 0 else 0.0
+    cells = array("B", (round(v * scale) for v in raw))
+    return Heatmap(list(student_scores), symbols, cells, max_linger)
+
+
+@dataclass
+class _Entry:
+    heatmap: Heatmap
+    computed_at: float  # monotonic, when the computation started
+    stale: bool = False
+
+
+class _Flight:
+    """One computation in flight; identity, not value, tells them apart."""
+
+    __slots__ = ("invalidated",)
+
+    def __init__(self):
+        self.invalidated = False
+
+
+_cache: TTLCache | None = None
+# Assignment -> {id(flight): flight} for computations in flight; entries
+# exist only while a computation runs
+_inflight: dict[str, dict[int, _Flight]] = {}
+_lock = threading.Lock()
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = TTLCache(
+            maxsize=get_setting("heatmap", "cache_size", 200),
+            ttl=get_setting("heatmap", "cache_ttl", 900),
+        )
+        stats.register("heatmap_cache", _cache.stats)
+    return _cache
+
+
+def get_heatmap(assignment_id: str, compute: Callable[[], Heatmap], max_stale: float = 0.0) -> Heatmap:
+    """Cached heatmap for an assignment, computed with compute() when missing
+    or stale for longer than max_stale seconds since it was computed."""
+    cache = get_cache()
+    entry = cache.get(assignment_id)
+    started = time.monotonic()
+    if entry is not None and (not entry.stale or started - entry.computed_at < max_stale):
+        return entry.heatmap
+
+    flight = _Flight()
+    with _lock:
+        _inflight.setdefault(assignment_id, {})[id(flight)] = flight
+    try:
+        heatmap = compute()
+    finally:
+        with _lock:
+            flights = _inflight[assignment_id]
+            del flights[id(flight)]
+            if not flights:
+                del _inflight[assignment_id]
+    with _lock:
+        cache.set(assignment_id, _Entry(heatmap, started, stale=flight.invalidated))
+    return heatmap
+
+
+def invalidate(assignment_id: str) -> None:
+    """New flushes for the assignment: the cached matrix is out of date."""
+    with _lock:
+        entry = get_cache().peek(assignment_id)
+        if entry is not None:
+            entry.stale = True
+        for flight in _inflight.get(assignment_id, {}).values():
+            flight.invalidated = True
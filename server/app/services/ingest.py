@@ -0,0 +1,368 @@
+"""
+Write-behind ingest for extension flush batches.
+
+POST /api/extensions/flushes validates a batch, hands it to the queue and
+returns immediately. A background writer thread coalesces rows from many
+requests into large bulk inserts over the shared PostgREST pool, retries
+transient failures with exponential backoff, then runs the post-insert
+listeners (aggregate updates etc.) for each batch it wrote.
+
+Inserts are idempotent: rows whose client_flush_id already exists are
+skipped by the unique index (on_conflict + ignore-duplicates), so retrying
+an insert that timed out after the database committed it is safe. The
+insert returns the ids it wrote, and listeners only see those rows.
+Batches still queued at shutdown are written before the process exits.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+import httpx
+
+log = logging.getLogger("ingest")
+
+
+class QueueFull(Exception):
+    """Raised by submit() when accepting the batch would exceed capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("ingest queue full")
+        self.retry_after = retry_after
+
+
+class BatchTooLarge(Exception):
+    """Raised by submit() for a batch that could never fit in the queue."""
+
+    def __init__(self, max_rows: int):
+        super().__init__("batch exceeds ingest queue capacity")
+        self.max_rows = max_rows
+
+
+class InsertError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"insert failed: status={status}")
+        self.status = status
+        self.detail = detail
+
+
+@dataclass
+class IngestBatch:
+    profile_id: str
+    assignment_id: str
+    course_id: str
+    rows: list[dict]
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+# Called as fn(batch) after a batch's rows are durably inserted
+_listeners: list[Callable[[IngestBatch], None]] = []
+
+
+# Called as fn(batch) when a batch is given up on after retries
+_drop_listeners: list[Callable[[IngestBatch], None]] = []
+
+
+def add_listener(fn: Callable[[IngestBatch], None]) -> None:
+    _listeners.append(fn)
+
+
+def add_drop_listener(fn: Callable[[IngestBatch], None]) -> None:
+    _drop_listeners.append(fn)
+
+
+def _notify(listeners, batch: IngestBatch) -> None:
+    for fn in listeners:
+        try:
+            fn(batch)
+        except Exception as e:
+            log.error("ingest listener %s failed for profile_id=%s: %r", fn.__name__, batch.profile_id, e)
+
+
+def notify_listeners(batch: IngestBatch) -> None:
+    _notify(_listeners, batch)
+
+
+def notify_dropped(batch: IngestBatch) -> None:
+    _notify(_drop_listeners, batch)
+
+
+class FlushWriter:
+    """Bulk insert of flush rows into PostgREST over a pooled client."""
+
+    def __init__(self, client: httpx.Client, timeout: float = 30):
+        self.client = client
+        self.timeout = timeout
+
+    def insert(self, rows: list[dict]) -> set[str]:
+        """Insert rows in one request; return the client_flush_ids written.
+
+        Rows whose client_flush_id is already stored are skipped, not
+        rejected, so a retried insert never duplicates rows. Raises
+        InsertError or httpx.HTTPError.
+        """
+        resp = self.client.post(
+            "/flushes",
+            params={"on_conflict": "client_flush_id", "select": "client_flush_id"},
+            json=rows,
+            headers={"Prefer": "return=representation,resolution=ignore-duplicates"},
+            timeout=self.timeout,
+        )
+        if resp.status_code >= 400:
+            raise InsertError(resp.status_code, resp.text[:500])
+        return {r["client_flush_id"] for r in resp.json()}
+
+
+def keep_inserted(batch: IngestBatch, inserted: set[str]) -> int:
+    """Trim batch.rows to the rows the insert wrote; return how many it skipped.
+
+    Skipped rows were already stored by an earlier request, and the
+    listeners must not count them twice. After a failed attempt (attempts >
+    0) a skipped row may be our own write that committed before the error,
+    so those batches are kept whole.
+    """
+    if batch.attempts:
+        return 0
+    rows = [r for r in batch.rows if str(r["client_flush_id"]).lower() in inserted]
+    skipped = len(batch.rows) - len(rows)
+    batch.rows = rows
+    return skipped
+
+
+class IngestQueue:
+    """Bounded write-behind queue drained by one writer thread.
+
+    Capacity is counted in rows. When full, submit() raises QueueFull so the
+    endpoint can answer 429 and the extension retries later; a batch larger
+    than the whole capacity raises BatchTooLarge instead (413), since
+    retrying it can never succeed. drain() writes out what is queued and is
+    run at exit.
+    """
+
+    def __init__(
+        self,
+        writer: FlushWriter,
+        app=None,
+        max_rows: int = 20000,
+        batch_rows: int = 500,
+        linger_sec: float = 0.25,
+        max_retries: int = 5,
+        backoff_sec: float = 0.5,
+        retry_after: int = 5,
+    ):
+        self.writer = writer
+        self.app = app
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.linger_sec = linger_sec
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.retry_after = retry_after
+
+        self._pending: deque[IngestBatch] = deque()
+        self._pending_rows = 0
+        self._busy = 0
+        self._draining = False
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+        self.accepted_rows = 0
+        self.written_rows = 0
+        self.duplicate_rows = 0
+        self.dropped_rows = 0
+        self.rejected_batches = 0
+        self.inserts = 0
+        self.retries = 0
+
+    # --- producer side ---
+
+    def submit(self, batch: IngestBatch) -> None:
+        if len(batch.rows) > self.max_rows:
+            self.rejected_batches += 1
+            raise BatchTooLarge(self.max_rows)
+        with self._cond:
+            if self._pending_rows + len(batch.rows) > self.max_rows:
+                self.rejected_batches += 1
+                raise QueueFull(self.retry_after)
+            self._pending.append(batch)
+            self._pending_rows += len(batch.rows)
+            self.accepted_rows += len(batch.rows)
+            self._cond.notify()
+        self._ensure_thread()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+            self._thread.start()
+
+    # --- writer side ---
+
+    def _take(self) -> list[IngestBatch]:
+        """Block until work arrives, then linger briefly to coalesce more."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.linger_sec
+            while self._pending_rows < self.batch_rows and not self._draining:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            taken, rows = [], 0
+            while self._pending and (not taken or rows + len(self._pending[0].rows) <= self.batch_rows):
+                b = self._pending.popleft()
+                taken.append(b)
+                rows += len(b.rows)
+            self._pending_rows -= rows
+            self._busy += 1
+            return taken
+
+    def _requeue(self, batches: list[IngestBatch]) -> None:
+        with self._cond:
+            for b in reversed(batches):
+                self._pending.appendleft(b)
+                self._pending_rows += len(b.rows)
+
+    def _run(self) -> None:
+        while True:
+            batches = self._take()
+            try:
+                self._write(batches)
+            except Exception as e:
+                log.error("ingest writer crashed on %d batches: %r", len(batches), e)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+
+    def drain(self, timeout: float = 10) -> bool:
+        """Write out everything queued, waiting up to timeout seconds.
+
+        Returns whether the queue emptied. Used at shutdown, so acknowledged
+        (202) batches are not lost when the process exits or reloads.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._busy:
+                return True
+            self._draining = True
+            self._cond.notify_all()
+        self._ensure_thread()
+        with self._cond:
+            try:
+                while self._pending or self._busy:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        log.error("ingest: exiting with %d rows unwritten", self._pending_rows)
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._draining = False
+
+    def _write(self, batches: list[IngestBatch]) -> None:
+        rows = [r for b in batches for r in b.rows]
+        try:
+            inserted = self.writer.insert(rows)
+        except InsertError as e:
+            if e.status < 500 and len(batches) > 1:
+                # A bad row rejects the whole statement; isolate it per batch
+                for b in batches:
+                    self._write([b])
+                return
+            self._retry_or_drop(batches, e)
+            return
+        except httpx.HTTPError as e:
+            self._retry_or_drop(batches, e)
+            return
+
+        self.inserts += 1
+        skipped = sum(keep_inserted(b, inserted) for b in batches)
+        self.duplicate_rows += skipped
+        self.written_rows += len(rows) - skipped
+        log.info("ingest: wrote %d rows from %d batches", len(rows) - skipped, len(batches))
+        self._after_write([b for b in batches if b.rows])
+
+    def _retry_or_drop(self, batches: list[IngestBatch], err: Exception) -> None:
+        retryable = not isinstance(err, InsertError) or err.status >= 500
+        attempts = max(b.attempts for b in batches) + 1
+        if retryable and attempts <= self.max_retries:
+            for b in batches:
+                b.attempts = attempts
+            self.retries += 1
+            delay = self.backoff_sec * (2 ** (attempts - 1))
+            log.warning("ingest: insert failed (%r), retry %d in %.1fs", err, attempts, delay)
+            time.sleep(delay)
+            self._requeue(batches)
+            return
+        dropped = sum(len(b.rows) for b in batches)
+        self.dropped_rows += dropped
+        detail = getattr(err, "detail", str(err))
+        log.error("ingest: dropping %d rows after %d attempts: %r %s", dropped, attempts, err, detail)
+        for b in batches:
+            notify_dropped(b)
+
+    def _after_write(self, batches: list[IngestBatch]) -> None:
+        if self.app is None:
+            for b in batches:
+                notify_listeners(b)
+            return
+        with self.app.app_context():
+            for b in batches:
+                notify_listeners(b)
+
+    def stats(self) -> dict:
+        return {
+            "pending_batches": len(self._pending),
+            "pending_rows": self._pending_rows,
+            "max_rows": self.max_rows,
+            "accepted_rows": self.accepted_rows,
+            "written_rows": self.written_rows,
+            "duplicate_rows": self.duplicate_rows,
+            "dropped_rows": self.dropped_rows,
+            "rejected_batches": self.rejected_batches,
+            "inserts": self.inserts,
+            "retries": self.retries,
+        }
+
+
+_queue: IngestQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestQueue:
+    """Process-wide queue, built from the current app's config on first use."""
+    global _queue
+    from flask import current_app
+    from ..config import get_setting
+    from . import stats
+    from .transport import get_pool
+
+    with _queue_lock:
+        if _queue is None:
+            writer = FlushWriter(get_pool(), timeout=get_setting("ingest", "timeout", 30))
+            _queue = IngestQueue(
+                writer,
+                app=current_app._get_current_object(),
+                max_rows=get_setting("ingest", "max_rows", 20000),
+                batch_rows=get_setting("ingest", "batch_rows", 500),
+                linger_sec=get_setting("ingest", "linger_sec", 0.25),
+                max_retries=get_setting("ingest", "max_retries", 5),
+                backoff_sec=get_setting("ingest", "backoff_sec", 0.5),
+                retry_after=get_setting("ingest", "retry_after", 5),
+            )
+            atexit.register(_queue.drain, get_setting("ingest", "drain_sec", 10))
+            stats.register("ingest", _queue.stats)
+        return _queue
+
+
+def drain_queue(timeout: float = 10) -> None:
+    """Write out the process-wide queue, if one was started (ASGI shutdown)."""
+    if _queue is not None:
+        _queue.drain(timeout)
@@ -0,0 +1,87 @@
+"""
+Per-endpoint latency histograms, served under "latency" at GET /stats.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# Upper bucket bounds in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th percentile."""
+        n = sum(self.counts)
+        if not n:
+            return None
+        rank, seen = q * n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = sum(self.counts)
+            labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+            return {
+                "count": n,
+                "mean_ms": round(self.total_ms / n, 1) if n else None,
+                "p50_ms": self.percentile(0.5),
+                "p95_ms": self.percentile(0.95),
+                "max_ms": round(self.max_ms, 1),
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+_histograms: dict[str, Histogram] = {}
+_lock = threading.Lock()
+
+
+def histogram(name: str) -> Histogram:
+    with _lock:
+        if name not in _histograms:
+            if not _histograms:
+                from . import stats
+                stats.register("latency", snapshot)
+            _histograms[name] = Histogram()
+        return _histograms[name]
+
+
+def snapshot() -> dict:
+    return {name: h.stats() for name, h in sorted(_histograms.items())}
+
+
+def timed(name: str):
+    """Decorator recording each call's wall time into histogram(name)."""
+    def decorator(f):
+        hist = histogram(name)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                hist.observe((time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+"""
+Live class struggle over a sliding time window (e.g. the last 30 minutes).
+
+compute_class_struggle scores everyone's full history. During lab hours
+TAs want to know what the class is stuck on right now. So each assignment
+gets a LiveStruggle that keeps running per-(student, file, symbol) sums over
+only the flushes whose end time falls inside each configured window:
+
+- every ingested batch is added as it arrives (ingest listener, O(batch));
+- flushes that age out are subtracted via a min-heap on end_epoch, once each;
+- the struggle topics are scored from those sums with the same
+  linger_from_aggregates / compute_class_struggle the batch path uses, and
+  the result is cached until the window changes.
+
+A read therefore costs O(students x symbols active in the window). The
+length of the assignment's history never enters into it.
+
+The sums live in this process. An assignment's state is loaded on first
+access from the flushes table, bounded by end_epoch, so it only covers the
+window. It is reloaded after live.resync_sec, which is the backstop for
+batches ingested by another worker. The empty state is registered before
+the load starts, so batches ingested while the table is being read are
+applied to it too; a flush seen by both is counted once (client_flush_id).
+Concurrent first reads of an assignment share one load.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from . import queries
+from .aggregates import SymbolAggregate, linger_from_aggregates
+from .analysis import ClassSymbolScore, _normalize_symbol, compute_class_struggle, flush_diff_stats
+from .cache import KeyedLocks, TTLCache
+from .epochs import end_epoch, window_duration
+from .flush_stats import fill_missing_diffs
+from .paging import DEFAULT_PAGE_SIZE, iter_keyset
+
+DEFAULT_WINDOWS = (30, 60)
+
+
+class _Window:
+    """Sums over the flushes that ended within the last `minutes`."""
+
+    def __init__(self, minutes: int):
+        self.minutes = minutes
+        self.seconds = minutes * 60.0
+        self.students: dict[str, dict[tuple[str, str], SymbolAggregate]] = {}
+        # (end_epoch, seq, flush_id, profile_id, key, duration, inserted, deleted)
+        self._heap: list[tuple] = []
+        self._seq = itertools.count()
+        self._flush_ids: set = set()
+        self._snapshot: list[ClassSymbolScore] | None = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, profile_id: str, flush_id, row: dict, now: float) -> None:
+        end = end_epoch(row)
+        if end <= now - self.seconds or (flush_id is not None and flush_id in self._flush_ids):
+            return
+        key = (row["file_path"], _normalize_symbol(row.get("active_symbol")))
+        _, _, inserted, deleted = flush_diff_stats(row)
+        duration = window_duration(row)
+
+        aggs = self.students.setdefault(profile_id, {})
+        agg = aggs.get(key)
+        if agg is None:
+            agg = aggs[key] = SymbolAggregate(file_path=key[0], symbol=key[1])
+        agg.dwell_time += duration
+        agg.visits += 1
+        agg.chars_inserted += inserted
+        agg.chars_deleted += deleted
+
+        self._flush_ids.add(flush_id)
+        heapq.heappush(self._heap, (end, next(self._seq), flush_id, profile_id, key, duration, inserted, deleted))
+        self._snapshot = None
+
+    def expire(self, now: float) -> None:
+        cutoff = now - self.seconds
+        heap = self._heap
+        while heap and heap[0][0] <= cutoff:
+            _, _, flush_id, profile_id, key, duration, inserted, deleted = heapq.heappop(heap)
+            self._flush_ids.discard(flush_id)
+            aggs = self.students[profile_id]
+            agg = aggs[key]
+            agg.visits -= 1
+            if agg.visits == 0:
+                # Drop empty keys outright so float sums never drift
+                del aggs[key]
+                if not aggs:
+                    del self.students[profile_id]
+            else:
+                agg.dwell_time -= duration
+                agg.chars_inserted -= inserted
+                agg.chars_deleted -= deleted
+            self._snapshot = None
+
+    def struggle(self, now: float) -> list[ClassSymbolScore]:
+        self.expire(now)
+        if self._snapshot is None:
+            self._snapshot = compute_class_struggle(
+                [linger_from_aggregates(list(aggs.values())) for aggs in self.students.values()]
+            )
+        return self._snapshot
+
+
+class LiveStruggle:
+    """One assignment's sliding windows, updated under a lock."""
+
+    def __init__(self, minutes=DEFAULT_WINDOWS):
+        self.windows = {m: _Window(m) for m in minutes}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def add(self, profile_id: str, rows: list[dict], now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            for row in rows:
+                # The same flush can arrive from the backfill and the listener
+                flush_id = row.get("client_flush_id") or row.get("id")
+                for w in self.windows.values():
+                    w.add(profile_id, flush_id, row, now)
+
+    def snapshot(self, minutes: int, now: float | None = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            w = self.windows[minutes]
+            struggle = w.struggle(now)
+            return {
+                "window_minutes": minutes,
+                "struggle_topics": struggle,
+                "student_count": len(w.students),
+                "flush_count": len(w),
+                "as_of": now,
+            }
+
+
+def load(
+    sb,
+    assignment_id: str,
+    minutes=DEFAULT_WINDOWS,
+    now: float | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    into: LiveStruggle | None = None,
+) -> LiveStruggle:
+    """Build an assignment's windows from the flushes that ended within the widest one.
+
+    With into, the rows are added to that (already registered) state instead
+    of a new one.
+    """
+    now = time.time() if now is None else now
+    live = into if into is not None else LiveStruggle(minutes)
+    minutes = tuple(live.windows)
+    rows = iter_keyset(
+        lambda: (
+            queries.query(sb, "analysis.live")
+            .eq("assignment_id", assignment_id)
+            .gt("end_epoch", now - max(minutes) * 60.0)
+        ),
+        keys=("profile_id", "id"),
+        page_size=page_size,
+        on_page=lambda page: fill_missing_diffs(sb, page),
+    )
+    for row in rows:
+        live.add(row["profile_id"], [row], now)
+    live.loaded = True
+    return live
+
+
+_cache: TTLCache | None = None
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = TTLCache(
+            maxsize=get_setting("live", "max_assignments", 100),
+            ttl=get_setting("live", "resync_sec", 600),
+        )
+        stats.register("live_struggle", _cache.stats)
+    return _cache
+
+
+def windows() -> tuple[int, ...]:
+    """Window lengths (minutes) served by /class/<id>/live."""
+    from ..config import get_setting
+
+    return tuple(get_setting("live", "windows", list(DEFAULT_WINDOWS)))
+
+
+# Serializes an assignment's first load
+_loading = KeyedLocks()
+
+
+def get_live(sb, assignment_id: str) -> LiveStruggle:
+    cache = get_cache()
+    live = cache.get(assignment_id)
+    if live is not None and live.loaded:
+        return live
+    with _loading.hold(assignment_id):
+        live = cache.peek(assignment_id)
+        if live is not None and live.loaded:
+            return live
+        from ..config import get_setting
+
+        # Register first, so apply() feeds batches ingested during the load
+        live = LiveStruggle(windows())
+        cache.set(assignment_id, live)
+        try:
+            load(sb, assignment_id, page_size=get_setting("analysis", "page_size", DEFAULT_PAGE_SIZE), into=live)
+        except Exception:
+            cache.invalidate(assignment_id)
+            raise
+    return live
+
+
+def apply(profile_id: str, assignment_id: str, rows: list[dict]) -> None:
+    """Fold an ingested batch into the assignment's windows, if registered.
+
+    That includes a state still being loaded. An assignment nobody is
+    watching is skipped; its first read loads the window from the table,
+    these rows included.
+    """
+    live = get_cache().get(assignment_id)
+    if live is not None:
+        live.add(profile_id, rows)
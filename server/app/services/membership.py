@@ -0,0 +1,141 @@
+"""
+Per-user course membership: which courses a user is in, in which role, and
+the assignments of those courses.
+
+Built from profiles, courses, enrollments and teaching_assistants on first
+lookup and cached per user, so /api/courses/my, /api/extensions/connect-info
+and authorization checks cost no round trips on the common path. Entries
+expire after membership.cache_ttl; anything that changes enrollments, TAs,
+courses or assignments should call invalidate_user / invalidate_course.
+"""
+
+from dataclasses import dataclass, field
+
+from .cache import TTLCache
+from .fanout import gather
+
+STUDENT = "student"
+ASSISTANT = "assistant"
+PROFESSOR = "professor"
+
+_ASSIGNMENT_COLUMNS = "id, name, description, due_date, course_id"
+_COURSE_COLUMNS = f"id, name, code, assignments({_ASSIGNMENT_COLUMNS})"
+
+
+@dataclass
+class CourseRole:
+    role: str
+    course: dict          # id, name, code (+ created_at for professors)
+    since: str | None = None  # enrolled_at / assigned_at
+
+
+@dataclass
+class Membership:
+    profile_id: str
+    utln: str | None
+    roles: list[CourseRole] = field(default_factory=list)
+    # Assignments of every course the user is in, keyed by course id
+    assignments: dict[str, list[dict]] = field(default_factory=dict)
+
+    def course_ids(self, *roles: str) -> set[str]:
+        return {r.course["id"] for r in self.roles if not roles or r.role in roles}
+
+    def roles_in(self, course_id: str) -> set[str]:
+        return {r.role for r in self.roles if r.course["id"] == course_id}
+
+    def has_role(self, course_id: str, *roles: str) -> bool:
+        found = self.roles_in(course_id)
+        return bool(found & set(roles)) if roles else bool(found)
+
+    def courses(self) -> list[dict]:
+        """Distinct courses (id, name, code), professor courses first."""
+        seen, out = set(), []
+        for r in sorted(self.roles, key=lambda r: r.role != PROFESSOR):
+            cid = r.course["id"]
+            if cid not in seen:
+                seen.add(cid)
+                out.append({k: r.course[k] for k in ("id", "name", "code")})
+        return out
+
+    def all_assignments(self) -> list[dict]:
+        """Assignments in courses() order."""
+        return [a for c in self.courses() for a in self.assignments.get(c["id"], [])]
+
+
+def load_membership(sb, user_id: str) -> Membership:
+    """Read a user's memberships from the database (four concurrent queries)."""
+    profile, prof_courses, student_rows, assistant_rows = gather(
+        lambda: sb.table("profiles").select("utln").eq("id", user_id).limit(1).execute(),
+        lambda: (
+            sb.table("courses")
+            .select(f"{_COURSE_COLUMNS}, created_at")
+            .eq("professor_id", user_id)
+            .execute()
+        ),
+        lambda: (
+            sb.table("enrollments")
+            .select(f"enrolled_at, courses({_COURSE_COLUMNS})")
+            .eq("profile_id", user_id)
+            .execute()
+        ),
+        lambda: (
+            sb.table("teaching_assistants")
+            .select(f"assigned_at, courses({_COURSE_COLUMNS})")
+            .eq("profile_id", user_id)
+            .execute()
+        ),
+    )
+
+    m = Membership(user_id, profile.data[0]["utln"] if profile.data else None)
+
+    def add(role, course, since=None):
+        if not course:
+            return
+        m.assignments[course["id"]] = course.pop("assignments", None) or []
+        m.roles.append(CourseRole(role, course, since))
+
+    for row in student_rows.data or []:
+        add(STUDENT, row.get("courses"), row.get("enrolled_at"))
+    for row in assistant_rows.data or []:
+        add(ASSISTANT, row.get("courses"), row.get("assigned_at"))
+    for course in prof_courses.data or []:
+        add(PROFESSOR, course)
+    return m
+
+
+_cache: TTLCache | None = None
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = TTLCache(
+            maxsize=get_setting("membership", "cache_size", 5000),
+            ttl=get_setting("membership", "cache_ttl", 60),
+        )
+        stats.register("membership_cache", _cache.stats)
+    return _cache
+
+
+def get_membership(sb, user_id: str, refresh: bool = False) -> Membership:
+    """Cached Membership for user_id; refresh=True forces a reload."""
+    cache = get_cache()
+    m = None if refresh else cache.get(user_id)
+    if m is None:
+        m = load_membership(sb, user_id)
+        cache.set(user_id, m)
+    return m
+
+
+def invalidate_user(user_id: str) -> None:
+    get_cache().invalidate(user_id)
+
+
+def invalidate_course(course_id: str) -> int:
+    """Drop every cached user who is in course_id. Returns count dropped."""
+    cache = get_cache()
+    doomed = {uid for uid, m in cache.items() if course_id in m.course_ids()}
+    return cache.invalidate_where(doomed.__contains__)
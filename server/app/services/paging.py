@@ -0,0 +1,119 @@
+"""
+Keyset pagination over PostgREST queries.
+
+Large result sets (every flush of an assignment) are pulled page by page so a
+worker never holds more than one page plus whatever the caller keeps.
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterator
+
+DEFAULT_PAGE_SIZE = 1000  # PostgREST's default max-rows on Supabase
+
+
+def _quote(value) -> str:
+    # Double-quote so timestamps ("+00:00", ":") survive PostgREST's filter
+    # syntax; backslashes first, or an escaped quote could be unescaped
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _uuid(value) -> str:
+    if not isinstance(value, str):
+        raise TypeError(f"not a uuid: {value!r}")
+    return str(uuid.UUID(value))
+
+
+def _timestamp(value) -> str:
+    datetime.fromisoformat(value)
+    return value
+
+
+def _int(value) -> int:
+    if type(value) is not int:
+        raise TypeError(f"not an int: {value!r}")
+    return value
+
+
+# Cursors come back from clients and end up inside PostgREST filters, so
+# each key column's value is checked against its type when decoded
+CURSOR_TYPES: dict[str, Callable] = {
+    "id": _uuid,
+    "profile_id": _uuid,
+    "assignment_id": _uuid,
+    "start_timestamp": _timestamp,
+    "end_timestamp": _timestamp,
+    "created_at": _timestamp,
+    "sequence_number": _int,
+}
+
+
+def keyset_filter(keys: tuple[str, str], cursor: tuple) -> str:
+    """PostgREST or= filter for rows strictly after cursor in (k1, k2) order."""
+    k1, k2 = keys
+    v1, v2 = (_quote(v) for v in cursor)
+    return f"{k1}.gt.{v1},and({k1}.eq.{v1},{k2}.gt.{v2})"
+
+
+def encode_cursor(row: dict, keys: tuple[str, str]) -> str:
+    """Opaque, URL-safe cursor pointing just after row."""
+    raw = json.dumps([row[keys[0]], row[keys[1]]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, keys: tuple[str, str]) -> tuple:
+    """Inverse of encode_cursor for the same keys.
+
+    Raises ValueError on a malformed token or a value of the wrong type for
+    its key (see CURSOR_TYPES).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        v1, v2 = json.loads(raw)
+        return CURSOR_TYPES[keys[0]](v1), CURSOR_TYPES[keys[1]](v2)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"bad cursor: {token!r}") from e
+
+
+def fetch_page(build_query: Callable, keys: tuple[str, str], cursor: tuple | None, limit: int) -> list[dict]:
+    """Fetch one page of rows ordered by keys, starting after cursor."""
+    query = build_query()
+    if cursor is not None:
+        query = query.or_(keyset_filter(keys, cursor))
+    for k in keys:
+        query = query.order(k)
+    return query.limit(limit).execute().data or []
+
+
+def iter_keyset(
+    build_query: Callable,
+    keys: tuple[str, str],
+    page_size: int = DEFAULT_PAGE_SIZE,
+    on_page: Callable[[list[dict]], list[dict]] | None = None,
+    cursor: tuple | None = None,
+) -> Iterator[dict]:
+    """Yield every row of build_query() in (k1, k2) order, one page at a time.
+
+    build_query must return a fresh filtered select that includes both key
+    columns; ordering and limits are added here. on_page, if given, may
+    enrich each page before its rows are yielded. cursor resumes strictly
+    after a previously seen (k1, k2).
+    """
+    while True:
+        rows = fetch_page(build_query, keys, cursor, page_size)
+        if on_page is not None and rows:
+            rows = on_page(rows)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1][keys[0]], rows[-1][keys[1]])
+
+
+def iter_groups(rows: Iterator[dict], key: str) -> Iterator[tuple[str, list[dict]]]:
+    """Group a stream already ordered by key, materializing one group at a time."""
+    for value, group in groupby(rows, key=itemgetter(key)):
+        yield value, list(group)
@@ -0,0 +1,97 @@
+"""
+Per-endpoint column projections for flush queries.
+
+Each computation registers the columns it actually reads, and routes build
+their queries from the registry instead of select("*"). The big text columns
+(snapshot is a full copy of the file, diffs the unified diff) only go on the
+wire for the endpoints that use them.
+"""
+
+from dataclasses import dataclass
+
+from .flush_stats import STAT_COLUMNS
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    table: str
+    columns: tuple[str, ...]
+
+    @property
+    def select(self) -> str:
+        return ", ".join(self.columns)
+
+
+_STATS = tuple(c.strip() for c in STAT_COLUMNS.split(","))
+
+# Scoring input (flushes_to_edit_regions / has_changes): paths, symbols,
+# timing and the stored diff stats; diffs only for legacy rows, fetched
+# separately by fill_missing_diffs
+_SCORING = (
+    "id", "file_path", "active_symbol", "window_duration", "start_timestamp", "end_timestamp", "end_epoch",
+) + _STATS
+
+SPECS: dict[str, QuerySpec] = {}
+
+
+def register(name: str, table: str, *columns: str) -> QuerySpec:
+    spec = QuerySpec(table, tuple(columns))
+    SPECS[name] = spec
+    return spec
+
+
+def spec(name: str) -> QuerySpec:
+    return SPECS[name]
+
+
+def query(sb, name: str, **select_kwargs):
+    """sb.table(...).select(...) for a registered projection (kwargs e.g. count="exact")."""
+    s = SPECS[name]
+    return sb.table(s.table).select(s.select, **select_kwargs)
+
+
+# /api/analysis/class: per-student linger scoring, grouped by profile
+register("analysis.class", "flushes", "profile_id", *_SCORING)
+
+# Aggregate backfill (/api/analysis/student on first access)
+register("aggregates.rebuild", "flushes", "client_flush_id", *_SCORING)
+
+# /api/analysis/report and /chat: session timeline and diff excerpts for
+# the LLM prompt (services/timeline.py); never the snapshot. Durations come
+# from the epochs, as ingested rows have no window_duration; client_flush_id
+# dedups rows the ingest listener also appended
+register(
+    "analysis.timeline", "flushes",
+    "client_flush_id", "file_path", "active_symbol", "start_timestamp", "end_timestamp", "start_epoch", "end_epoch", "diffs",
+)
+
+# /api/analysis/class/<id>/reports: per-student scoring input plus the
+# timeline's diffs, grouped by profile; one pass builds every prompt
+register(
+    "analysis.batch", "flushes",
+    "profile_id", "client_flush_id", *_SCORING, "start_epoch", "diffs",
+)
+
+# /api/analysis/class/<id>/live: scoring input for flushes inside the
+# sliding window; client_flush_id dedups rows the ingest listener also saw
+register(
+    "analysis.live", "flushes",
+    "profile_id", "client_flush_id", *_SCORING, "start_epoch",
+)
+
+# Report cache fingerprint: count=exact plus the newest row identifies an
+# append-only flush set
+register("report.fingerprint", "flushes", "id", "start_timestamp")
+
+# /api/flushes/student: the dashboard replays files client-side
+# (web/src/lib/reconstruct.ts), so diffs and snapshots are needed here;
+# matches the web Flush type, minus metrics/trigger/created_at
+register(
+    "flushes.student", "flushes",
+    "id", "profile_id", "assignment_id", "file_path", "diffs", "snapshot", "content_hash",
+    "sequence_number", "client_flush_id", "start_timestamp", "end_timestamp", "window_duration",
+)
+
+# Server-side reconstruction (services/reconstruct.py)
+register("reconstruct.seek", "flushes", "sequence_number")
+register("reconstruct.chain", "flushes", "sequence_number", "content_hash", "diffs", "snapshot")
@@ -0,0 +1,322 @@
+"""
+File reconstruction: the content of one file at a sequence number or time.
+
+Each (profile, assignment, file) is a chain of flushes ordered by
+sequence_number (idx_flushes_diff_chain). A flush stores the unified diff
+from the previous state and, periodically, a full snapshot. Reconstruction
+starts from the nearest cached state or snapshot at or before the target,
+replays only the diffs after it, and checks every result against the
+flush's content_hash. Verified states are cached, so scrubbing through a
+history only replays the distance from the last state reached.
+
+A chain can hold more than one row per sequence_number (e.g. the extension
+re-sent a flush under a new client_flush_id); the first one stored wins.
+"""
+
+import bisect
+import hashlib
+import re
+import threading
+import weakref
+from dataclasses import dataclass
+
+from . import queries
+from .cache import TTLCache
+
+_HUNK = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """A diff does not apply to the state it claims to follow."""
+
+
+@dataclass
+class Reconstruction:
+    file_path: str
+    sequence_number: int
+    content: str
+    content_hash: str
+    verified: bool
+    anchor: str          # "cache" | "snapshot" | "empty"
+    anchor_sequence: int | None
+    replayed: int        # diffs applied to reach the target
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest, same as the extension's utils/hash.ts."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _split_lines(text: str) -> list[str]:
+    """Split on \\n only (as jsdiff does), keeping line endings."""
+    parts = text.split("\n")
+    lines = [p + "\n" for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def apply_patch(text: str, diff: str) -> str:
+    """Apply a unified diff (jsdiff createTwoFilesPatch output) to text.
+
+    Context and deleted lines are checked against text; any mismatch raises
+    PatchError. A diff with no hunks leaves text unchanged. Header-less +/-
+    diffs (seed data) carry no positions and cannot be replayed.
+    """
+    old = _split_lines(text)
+    lines = diff.split("\n")
+    out: list[str] = []
+    pos = 0  # next unconsumed index into old
+    i = 0
+    n = len(lines)
+    saw_hunk = False
+
+    while i < n:
+        m = _HUNK.match(lines[i])
+        if not m:
+            if saw_hunk and lines[i] and lines[i][0] in " +-":
+                raise PatchError(f"unexpected line outside hunk: {lines[i][:40]!r}")
+            i += 1
+            continue
+        saw_hunk = True
+        old_start, old_count = int(m.group(1)), int(m.group(2) or 1)
+        new_count = int(m.group(4) or 1)
+        # An empty old range starts *after* line old_start
+        start = old_start - 1 if old_count else old_start
+        if start < pos or start > len(old):
+            raise PatchError(f"hunk at -{old_start} out of range")
+        out.extend(old[pos:start])
+        pos = start
+        i += 1
+
+        old_left, new_left = old_count, new_count
+        tag_prev = None
+        while i < n and (old_left or new_left or lines[i].startswith("\\")):
+            line = lines[i]
+            tag, body = line[:1], line[1:]
+            if tag == "\\":
+                # "\ No newline at end of file": previous line has no EOL.
+                # Only meaningful on the last new line; older jsdiff also
+                # emits it mid-hunk, where it must be ignored.
+                if tag_prev == "+" and not new_left and out[-1].endswith("\n"):
+                    out[-1] = out[-1][:-1]
+                i += 1
+                continue
+            if tag in (" ", "-"):
+                if pos >= len(old) or old[pos].rstrip("\n") != body:
+                    raise PatchError(f"context mismatch at line {pos + 1}")
+                if tag == " ":
+                    out.append(old[pos])
+                    new_left -= 1
+                pos += 1
+                old_left -= 1
+            elif tag == "+":
+                out.append(body + "\n")
+                new_left -= 1
+            else:
+                raise PatchError(f"bad hunk line: {line[:40]!r}")
+            tag_prev = tag
+            i += 1
+        if old_left or new_left:
+            raise PatchError("truncated hunk")
+
+    if not saw_hunk and any(l[:1] in ("+", "-") and not l.startswith(("+++", "---")) for l in lines):
+        raise PatchError("diff has no hunk headers")
+    out.extend(old[pos:])
+    return "".join(out)
+
+
+_cache: TTLCache | None = None
+
+
+def get_state_cache() -> TTLCache:
+    """(profile, assignment, file, sequence) → content. States never change."""
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = TTLCache(maxsize=get_setting("reconstruct", "cache_size", 2000), ttl=None)
+        stats.register("reconstruct_cache", _cache.stats)
+    return _cache
+
+
+class _SequenceIndex:
+    """Sorted sequence numbers cached per chain, for one state cache.
+
+    Lets reconstruct() find the nearest cached state below a target with a
+    bisect instead of one cache.get per sequence number. Entries can outlive
+    their cache entry (LRU eviction): those are dropped when probed, and the
+    whole index is rebuilt from the cache once it holds twice as many
+    entries as the cache can.
+    """
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self._seqs: dict[tuple, list[int]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, chain_key: tuple, seq: int) -> None:
+        with self._lock:
+            seqs = self._seqs.setdefault(chain_key, [])
+            i = bisect.bisect_left(seqs, seq)
+            if i < len(seqs) and seqs[i] == seq:
+                return
+            seqs.insert(i, seq)
+            self._size += 1
+            if self._size > 2 * self.cache.maxsize:
+                self._rebuild()
+
+    def discard(self, chain_key: tuple, seq: int) -> None:
+        with self._lock:
+            seqs = self._seqs.get(chain_key, [])
+            i = bisect.bisect_left(seqs, seq)
+            if i < len(seqs) and seqs[i] == seq:
+                del seqs[i]
+                self._size -= 1
+                if not seqs:
+                    del self._seqs[chain_key]
+
+    def below(self, chain_key: tuple, target: int, floor: int) -> list[int]:
+        """Indexed sequences in (floor, target), nearest first."""
+        with self._lock:
+            seqs = self._seqs.get(chain_key, [])
+            lo = bisect.bisect_right(seqs, floor)
+            hi = bisect.bisect_left(seqs, target)
+            return seqs[lo:hi][::-1]
+
+    def _rebuild(self) -> None:
+        self._seqs = {}
+        self._size = 0
+        for key, _ in self.cache.items():
+            self._seqs.setdefault(key[:3], []).append(key[3])
+            self._size += 1
+        for seqs in self._seqs.values():
+            seqs.sort()
+
+
+_indexes: "weakref.WeakKeyDictionary[TTLCache, _SequenceIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def _index_for(cache: TTLCache) -> _SequenceIndex:
+    with _indexes_lock:
+        index = _indexes.get(cache)
+        if index is None:
+            index = _indexes[cache] = _SequenceIndex(cache)
+        return index
+
+
+def _first_per_sequence(rows: list[dict]) -> list[dict]:
+    """Drop repeated sequence numbers from rows ordered by sequence.
+
+    Keeps the first row carrying a snapshot, else the first row, so a
+    snapshot anchor never lands on a copy without one.
+    """
+    out: list[dict] = []
+    for row in rows:
+        if not out or row["sequence_number"] != out[-1]["sequence_number"]:
+            out.append(row)
+        elif out[-1]["snapshot"] is None and row["snapshot"] is not None:
+            out[-1] = row
+    return out
+
+
+def _chain_select(sb, projection, profile_id, assignment_id, file_path):
+    return (
+        queries.query(sb, projection)
+        .eq("profile_id", profile_id)
+        .eq("assignment_id", assignment_id)
+        .eq("file_path", file_path)
+    )
+
+
+def resolve_sequence(sb, profile_id: str, assignment_id: str, file_path: str, at: str) -> int | None:
+    """Sequence number of the last flush that ended at or before timestamp at."""
+    result = (
+        _chain_select(sb, "reconstruct.seek", profile_id, assignment_id, file_path)
+        .lte("end_timestamp", at)
+        .order("sequence_number", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return result.data[0]["sequence_number"] if result.data else None
+
+
+def _nearest_snapshot(sb, profile_id, assignment_id, file_path, target: int) -> int | None:
+    result = (
+        _chain_select(sb, "reconstruct.seek", profile_id, assignment_id, file_path)
+        .lte("sequence_number", target)
+        .not_.is_("snapshot", "null")
+        .order("sequence_number", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return result.data[0]["sequence_number"] if result.data else None
+
+
+def reconstruct(
+    sb,
+    profile_id: str,
+    assignment_id: str,
+    file_path: str,
+    sequence: int,
+    cache: TTLCache | None = None,
+) -> Reconstruction | None:
+    """Content of file_path after flush `sequence`, or None if no such flush.
+
+    Raises PatchError when a diff in the chain does not apply.
+    """
+    cache = cache if cache is not None else get_state_cache()
+    index = _index_for(cache)
+    chain_key = (profile_id, assignment_id, file_path)
+
+    hit = cache.get(chain_key + (sequence,))
+    if hit is not None:
+        return Reconstruction(file_path, sequence, hit, content_hash(hit), True, "cache", sequence, 0)
+
+    # Prefer whichever is later: the nearest snapshot or a cached state
+    snap_seq = _nearest_snapshot(sb, profile_id, assignment_id, file_path, sequence)
+    floor = snap_seq if snap_seq is not None else -1
+    anchor, anchor_seq, content = "empty", None, ""
+    for seq in index.below(chain_key, sequence, floor):
+        state = cache.get(chain_key + (seq,))
+        if state is not None:
+            anchor, anchor_seq, content = "cache", seq, state
+            break
+        index.discard(chain_key, seq)
+
+    query = _chain_select(sb, "reconstruct.chain", profile_id, assignment_id, file_path).lte("sequence_number", sequence)
+    if anchor == "cache":
+        query = query.gt("sequence_number", anchor_seq)
+    elif snap_seq is not None:
+        query = query.gte("sequence_number", snap_seq)
+    rows = query.order("sequence_number").order("created_at").order("id").execute().data or []
+    rows = _first_per_sequence(rows)
+    if not rows or rows[-1]["sequence_number"] != sequence:
+        return None
+
+    verified = True
+    replayed = 0
+    for row in rows:
+        seq = row["sequence_number"]
+        if anchor != "cache" and seq == snap_seq:
+            anchor, anchor_seq, content = "snapshot", seq, row["snapshot"]
+        else:
+            try:
+                content = apply_patch(content, row["diffs"])
+            except PatchError as e:
+                raise PatchError(f"sequence {seq}: {e}") from None
+            replayed += 1
+        if content_hash(content) != row["content_hash"]:
+            # Keep going so the caller still gets a best-effort result,
+            # but never cache a state that failed verification
+            verified = False
+        if verified:
+            cache.set(chain_key + (seq,), content)
+            index.add(chain_key, seq)
+
+    return Reconstruction(
+        file_path, sequence, content, rows[-1]["content_hash"], verified, anchor, anchor_seq, replayed,
+    )
@@ -0,0 +1,129 @@
+"""
+Compact, array-backed edit regions for scoring large classes.
+
+flushes_to_edit_regions builds one EditRegion object per flush, holding two
+timestamp strings and a symbol string each. A RegionStore keeps the same
+per-flush numbers in typed stdlib arrays instead: one 4- or 8-byte slot
+per field per region. File paths and normalized symbols are interned to
+small integer ids. An array holds raw numbers rather than objects, so the
+cyclic GC sees a dozen objects per store instead of a dozen per flush.
+
+Diff stats come from flush_diff_stats, i.e. the stored diff_* columns or
+the fused fold_hunk_stats scan. Neither builds HunkStat objects.
+
+RegionStore.aggregates() sums the arrays per (file, symbol) in order of
+first appearance, so scoring goes through the same
+aggregates.linger_from_aggregates as the materialized symbol_aggregates.
+columnar.RegionColumns.from_store hands the same arrays to NumPy.
+"""
+
+from array import array
+
+from .aggregates import SymbolAggregate
+from .analysis import _normalize_symbol, flush_diff_stats
+from .epochs import end_epoch, start_epoch
+
+
+class RegionStore:
+    """One row per flush, held column-wise in typed arrays."""
+
+    __slots__ = (
+        "files", "symbols", "file_id", "symbol_id", "line_start", "line_end",
+        "inserted", "deleted", "duration", "start_epoch", "end_epoch",
+        "_file_ids", "_symbol_ids", "_raw_symbol_ids",
+    )
+
+    def __init__(self):
+        self.files: list[str] = []
+        self.symbols: list[str] = []
+        self.file_id = array("i")
+        self.symbol_id = array("i")
+        self.line_start = array("q")
+        self.line_end = array("q")
+        self.inserted = array("q")
+        self.deleted = array("q")
+        self.duration = array("d")
+        self.start_epoch = array("d")
+        self.end_epoch = array("d")
+        self._file_ids: dict[str, int] = {}
+        self._symbol_ids: dict[str, int] = {}
+        # Raw active_symbol -> id, so each distinct spelling is normalized once
+        self._raw_symbol_ids: dict[str | None, int] = {}
+
+    @classmethod
+    def from_flushes(cls, flushes) -> "RegionStore":
+        store = cls()
+        for f in flushes:
+            store.append(f)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.file_id)
+
+    def _intern_file(self, path: str) -> int:
+        fid = self._file_ids.get(path)
+        if fid is None:
+            fid = self._file_ids[path] = len(self.files)
+            self.files.append(path)
+        return fid
+
+    def _intern_symbol(self, raw: str | None) -> int:
+        sid = self._raw_symbol_ids.get(raw)
+        if sid is None:
+            norm = _normalize_symbol(raw)
+            sid = self._symbol_ids.get(norm)
+            if sid is None:
+                sid = self._symbol_ids[norm] = len(self.symbols)
+                self.symbols.append(norm)
+            self._raw_symbol_ids[raw] = sid
+        return sid
+
+    def append(self, f: dict) -> None:
+        """Add one flush row (same fields flushes_to_edit_regions reads)."""
+        line_start, line_end, inserted, deleted = flush_diff_stats(f)
+        self.file_id.append(self._intern_file(f["file_path"]))
+        self.symbol_id.append(self._intern_symbol(f.get("active_symbol") or None))
+        self.line_start.append(line_start)
+        self.line_end.append(line_end)
+        self.inserted.append(inserted)
+        self.deleted.append(deleted)
+        self.duration.append(f.get("window_duration") or 0.0)
+        self.start_epoch.append(start_epoch(f))
+        self.end_epoch.append(end_epoch(f))
+
+    def groups(self) -> tuple[list[tuple[str, str]], array]:
+        """(keys in first-appearance order, group index per row)."""
+        index: dict[int, int] = {}
+        keys: list[tuple[str, str]] = []
+        group = array("i", bytes(4 * len(self)))
+        stride = max(len(self.symbols), 1)
+        for i, (fid, sid) in enumerate(zip(self.file_id, self.symbol_id)):
+            g = index.get(fid * stride + sid)
+            if g is None:
+                g = index[fid * stride + sid] = len(keys)
+                keys.append((self.files[fid], self.symbols[sid]))
+            group[i] = g
+        return keys, group
+
+    def aggregates(self) -> list[SymbolAggregate]:
+        """Per-(file, symbol) dwell, visit and character sums, first-seen order.
+
+        Feeds aggregates.linger_from_aggregates; the running float sum adds
+        durations in row order, exactly as sum() over each group would.
+        """
+        keys, group = self.groups()
+        aggs = [SymbolAggregate(fp, sym) for fp, sym in keys]
+        for k, d, a, b in zip(group, self.duration, self.inserted, self.deleted):
+            agg = aggs[k]
+            agg.dwell_time += d
+            agg.visits += 1
+            agg.chars_inserted += a
+            agg.chars_deleted += b
+        return aggs
+
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays (excluding the interned strings)."""
+        cols = (self.file_id, self.symbol_id, self.line_start, self.line_end, self.inserted,
+                self.deleted, self.duration, self.start_epoch, self.end_epoch)
+        return sum(a.itemsize * len(a) for a in cols)
+
@@ -0,0 +1,277 @@
+"""
+Disk cache for AI student reports, keyed by a fingerprint of their input.
+
+A report depends only on the student's flushes for the assignment, the
+prompt template and the model. Flushes are append-only, so the row count
+plus the newest row identify the input exactly. That makes one cheap
+count query enough to decide whether a cached report is still current.
+
+Entries live as <fingerprint>.json files under report_cache.dir, bounded to
+report_cache.max_entries with least-recently-used eviction (a hit bumps the
+file's mtime). A per-(student, assignment) pointer remembers the last
+fingerprint, so when new flushes arrive the previous report is served
+immediately while a fresh one is generated in the background
+(stale-while-revalidate).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from . import queries
+from .llm import MODEL, REPORT_PROMPT_VERSION, is_placeholder
+
+log = logging.getLogger("report_cache")
+
+
+def fingerprint(student_id: str, assignment_id: str, count: int, latest: dict) -> str:
+    """Hash of the report input: flush count, newest flush, prompt version and model."""
+    key = [student_id, assignment_id, count, latest["id"], latest["start_timestamp"], REPORT_PROMPT_VERSION, MODEL]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def report_fingerprint(sb, student_id: str, assignment_id: str) -> str | None:
+    """Fingerprint of the report input, or None if the student has no flushes."""
+    result = (
+        queries.query(sb, "report.fingerprint", count="exact")
+        .eq("profile_id", student_id)
+        .eq("assignment_id", assignment_id)
+        .order("start_timestamp", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return None
+    return fingerprint(student_id, assignment_id, result.count, result.data[0])
+
+
+def pair_key(student_id: str, assignment_id: str) -> str:
+    return hashlib.sha256(f"{student_id}:{assignment_id}".encode()).hexdigest()[:32]
+
+
+class ReportCache:
+    """Size-bounded LRU of reports on local disk."""
+
+    def __init__(self, directory: str, max_entries: int = 500, max_age: float | None = None):
+        self.dir = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        os.makedirs(os.path.join(self.dir, "latest"), exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry_path(self, fingerprint: str) -> str:
+        return os.path.join(self.dir, f"{fingerprint}.json")
+
+    def _pointer_path(self, pair: str) -> str:
+        return os.path.join(self.dir, "latest", pair)
+
+    def _read(self, fingerprint: str) -> dict | None:
+        try:
+            with open(self._entry_path(fingerprint)) as f:
+                entry = json.load(f)
+            os.utime(self._entry_path(fingerprint))  # LRU bump
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def get(self, pair: str, fingerprint: str) -> tuple[str, bool] | None:
+        """(report, fresh) for pair. fresh=False means serve it but regenerate."""
+        entry = self._read(fingerprint)
+        if entry is not None:
+            fresh = self.max_age is None or time.time() - entry["created_at"] < self.max_age
+            with self._lock:
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+            return entry["report"], fresh
+
+        try:
+            with open(self._pointer_path(pair)) as f:
+                previous = f.read().strip()
+        except OSError:
+            previous = None
+        entry = self._read(previous) if previous else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.stale_hits += 1
+        return entry["report"], False
+
+    def put(self, pair: str, fingerprint: str, report: str) -> None:
+        entry = {"report": report, "created_at": time.time()}
+        _atomic_write(self._entry_path(fingerprint), json.dumps(entry))
+        _atomic_write(self._pointer_path(pair), fingerprint)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            try:
+                entries = [e for e in os.scandir(self.dir) if e.is_file() and e.name.endswith(".json")]
+            except OSError:
+                return
+            excess = len(entries) - self.max_entries
+            if excess <= 0:
+                return
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for e in entries[:excess]:
+                try:
+                    os.remove(e.path)
+                    self.evictions += 1
+                except OSError:
+                    pass
+
+    def __len__(self) -> int:
+        return sum(1 for n in os.listdir(self.dir) if n.endswith(".json"))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "dir": self.dir,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 3) if lookups else None,
+            "generating": len(_inflight),
+        }
+
+
+def _atomic_write(path: str, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+_cache: ReportCache | None = None
+_executor: ThreadPoolExecutor | None = None
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = ReportCache(
+            get_setting("report_cache", "dir", os.path.join(tempfile.gettempdir(), "jumbuddy-reports")),
+            max_entries=get_setting("report_cache", "max_entries", 500),
+            max_age=get_setting("report_cache", "max_age", None),
+        )
+        stats.register("report_cache", _cache.stats)
+    return _cache
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        from ..config import get_setting
+
+        _executor = ThreadPoolExecutor(
+            max_workers=get_setting("report_cache", "refresh_workers", 2),
+            thread_name_prefix="report-refresh",
+        )
+    return _executor
+
+
+def _claim(fingerprint: str) -> tuple[Future, bool]:
+    """The fingerprint's in-flight generation, and whether the caller owns it.
+
+    One generation per fingerprint at a time; later callers share it.
+    """
+    with _inflight_lock:
+        fut = _inflight.get(fingerprint)
+        if fut is not None:
+            return fut, False
+        fut = _inflight[fingerprint] = Future()
+        return fut, True
+
+
+def _generate_and_store(fut: Future, pair: str, fingerprint: str, generate: Callable[[], str]) -> str:
+    """Run a claimed generation, resolving fut for callers sharing it."""
+    try:
+        report = generate()
+        store(pair, fingerprint, report)
+    except Exception as e:
+        log.exception("report generation failed for %s", pair)
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(report)
+        return report
+    finally:
+        with _inflight_lock:
+            _inflight.pop(fingerprint, None)
+
+
+def _refresh(app, fut: Future, pair: str, fingerprint: str, generate: Callable[[], str]) -> None:
+    try:
+        with app.app_context():
+            _generate_and_store(fut, pair, fingerprint, generate)
+    except Exception:
+        pass  # logged, and raised to any caller waiting on fut
+
+
+def lookup(sb, student_id: str, assignment_id: str):
+    """(pair, fingerprint, hit) where hit is ReportCache.get()'s result.
+
+    Returns None when the student has no flushes.
+    """
+    fingerprint = report_fingerprint(sb, student_id, assignment_id)
+    if fingerprint is None:
+        return None
+    pair = pair_key(student_id, assignment_id)
+    return pair, fingerprint, get_report_cache().get(pair, fingerprint)
+
+
+def store(pair: str, fingerprint: str, report: str) -> None:
+    """Cache a generated report; error placeholders are never cached."""
+    if not is_placeholder(report):
+        get_report_cache().put(pair, fingerprint, report)
+
+
+def cached_report(sb, student_id: str, assignment_id: str, generate: Callable[[], str]) -> str | None:
+    """Report for (student, assignment), generating it with generate() on a miss.
+
+    Returns None when the student has no flushes. A miss is generated on
+    the calling thread (concurrent misses wait for it); a stale hit is
+    returned immediately and regenerated in the background.
+    """
+    from flask import current_app
+
+    found = lookup(sb, student_id, assignment_id)
+    if found is None:
+        return None
+    pair, fingerprint, hit = found
+
+    if hit is not None:
+        report, fresh = hit
+        if not fresh:
+            fut, owner = _claim(fingerprint)
+            if owner:
+                app = current_app._get_current_object()
+                _get_executor().submit(_refresh, app, fut, pair, fingerprint, generate)
+        return report
+
+    # Cold miss: generate on this thread; the executor is only for refreshes
+    fut, owner = _claim(fingerprint)
+    if not owner:
+        return fut.result()
+    return _generate_and_store(fut, pair, fingerprint, generate)
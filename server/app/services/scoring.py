@@ -0,0 +1,71 @@
+"""
+Per-student scoring for class analysis, optionally fanned out over a pool.
+
+Scoring one student is pure CPU (diff parsing + linger math) with no shared
+state, so students can be scored on separate cores and merged afterwards.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator
+
+from . import columnar
+from .aggregates import linger_from_aggregates
+from .analysis import SymbolScore
+from .regions import RegionStore
+
+_pools: dict[tuple[str, int], Executor] = {}
+
+
+def score_student(flushes: list[dict], backend: str = "python") -> list[SymbolScore]:
+    """Linger scores for one student's flushes (top-level so it pickles).
+
+    backend="numpy" scores the region arrays with the columnar backend
+    (falls back to Python when numpy is not installed).
+    """
+    store = RegionStore.from_flushes(flushes)
+    if backend == "numpy" and columnar.available():
+        return columnar.compute_linger_scores(store)
+    return linger_from_aggregates(store.aggregates())
+
+
+def get_pool(kind: str = "process", workers: int = 0) -> Executor:
+    """Shared, lazily created executor; one per (kind, size)."""
+    workers = workers or os.cpu_count() or 1
+    key = (kind, workers)
+    if key not in _pools:
+        cls = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        _pools[key] = cls(max_workers=workers)
+    return _pools[key]
+
+
+def score_students(
+    groups: Iterable[tuple[str, list[dict]]],
+    pool: Executor | None = None,
+    max_pending: int = 0,
+    backend: str = "python",
+) -> Iterator[tuple[str, list[SymbolScore]]]:
+    """Score (student_id, flushes) groups, yielding results in input order.
+
+    Without a pool this is a plain loop. With one, at most max_pending
+    students are in flight (default 2x workers) so a streaming input stays
+    memory-bounded.
+    """
+    if pool is None:
+        for sid, flushes in groups:
+            yield sid, score_student(flushes, backend)
+        return
+
+    max_pending = max_pending or 2 * getattr(pool, "_max_workers", os.cpu_count() or 1)
+    score = partial(score_student, backend=backend)
+    pending: deque = deque()
+    for sid, flushes in groups:
+        pending.append((sid, pool.submit(score, flushes)))
+        if len(pending) >= max_pending:
+            done_sid, fut = pending.popleft()
+            yield done_sid, fut.result()
+    while pending:
+        done_sid, fut = pending.popleft()
+        yield done_sid, fut.result()
@@ -0,0 +1,18 @@
+"""
+Registry of runtime counters exposed at GET /stats.
+
+Services register a zero-argument callable returning a JSON-able dict; the
+endpoint calls each one on demand.
+"""
+
+from typing import Callable
+
+_providers: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in sorted(_providers.items())}
@@ -1,16 +1,22 @@
 from flask import current_app
-from supabase import create_client, Client
+from supabase import Client
+
+from .transport import PooledSupabase, get_pool
 
 _client: Client | None = None
 
 
 def get_supabase() -> Client:
-    """Return a shared Supabase client using the service role key."""
+    """Return a shared Supabase client using the service role key.
+
+    Table and RPC calls go through the process-wide connection pool
+    (services/transport.py), which is safe to share across threads.
+    """
     global _client
     if _client is None:
         url = current_app.config["SUPABASE_URL"]
         key = current_app.config["SUPABASE_SERVICE_ROLE_KEY"]
-        _client = create_client(url, key)
+        _client = PooledSupabase(url, key, get_pool())
     return _client
 
 
@@ -0,0 +1,647 @@
+"""
+Per-student session timeline for the LLM report and chat prompts.
+
+Flushes are grouped into sessions (a gap of more than SESSION_GAP_MIN
+minutes starts a new one) and each session is rendered to text once. A
+session is frozen as soon as a later flush opens the next one; only the
+open (last) session is re-rendered when flushes are appended. Timelines are
+cached per (student, assignment) and extended from the ingest listener, so
+a ten-turn chat and the report that follows it reuse one rendering instead
+of re-sorting, re-parsing and re-splitting the whole history every time.
+
+Prompts use budgeted(): the timeline compressed to a token budget, ranked
+by the linger scores, so prompt size stays flat as histories grow.
+"""
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from . import queries
+from .cache import KeyedLocks, TTLCache
+from .epochs import end_epoch, start_epoch
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+SESSION_GAP_MIN = 30
+
+NO_ACTIVITY = "No activity recorded."
+
+
+def _extract_meaningful_hunks(diff_text: str, max_hunks: int = 2) -> list[str]:
+    """
+    Extract complete diff hunks with context, preserving whitespace.
+    Returns list of hunk strings (not just isolated lines).
+    """
+    if not diff_text:
+        return []
+
+    hunks = []
+    lines = diff_text.split("\n")
+    current_hunk = []
+    in_hunk = False
+
+    for line in lines:
+        # Hunk header
+        if line.startswith("@@"):
+            if current_hunk and len(hunks) < max_hunks:
+                hunks.append("\n".join(current_hunk))
+            current_hunk = [line]
+            in_hunk = True
+        elif in_hunk:
+            # Skip file headers
+            if line.startswith("---") or line.startswith("+++"):
+                continue
+            # Add all hunk content (context, additions, deletions)
+            # Limit hunk size to prevent huge output
+            if len(current_hunk) < 15:
+                current_hunk.append(line)
+            else:
+                # Hunk too large, close it
+                if len(hunks) < max_hunks:
+                    hunks.append("\n".join(current_hunk))
+                current_hunk = []
+                in_hunk = False
+
+    # Add final hunk
+    if current_hunk and len(hunks) < max_hunks:
+        hunks.append("\n".join(current_hunk))
+
+    return hunks
+
+
+class _Flush:
+    """A flush with its timestamps parsed once."""
+
+    __slots__ = ("row", "start", "end")
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.start = start_epoch(row)
+        self.end = end_epoch(row)
+
+    @property
+    def duration(self) -> float:
+        # Same as the generated window_duration column, which ingest rows lack
+        return self.end - self.start
+
+
+@dataclass
+class _Group:
+    """One (file, symbol) within a session, rendered in full and in brief."""
+
+    file_path: str
+    symbol: str
+    visits: int
+    time: float
+    added: int
+    removed: int
+    flagged: bool   # high churn or many revisits
+    text: str
+
+    def brief(self) -> str:
+        flag = " ⚠" if self.flagged else ""
+        return f"  {self.file_path} → {self.symbol}: {int(self.time)}s, {self.visits} visits, +{self.added}/-{self.removed}{flag}"
+
+
+@dataclass
+class Session:
+    index: int
+    start_timestamp: str
+    end_timestamp: str
+    duration: float
+    files: int
+    header: str
+    groups: list[_Group]
+    text: str
+    # Token cost per compression level, filled in by budgeting
+    costs: dict = field(default_factory=dict)
+
+    def top_symbols(self, n: int = 3) -> str:
+        top = sorted(self.groups, key=lambda g: -g.time)[:n]
+        return ", ".join(f"{g.symbol} ({g.file_path})" for g in top)
+
+
+def _render_group(file_path: str, symbol: str, flushes: list[_Flush]) -> _Group:
+    timeline = [f"\n  {file_path} → {symbol}:"]
+
+    visits = len(flushes)
+    total_time = sum(f.duration for f in flushes)
+
+    # Analyze diffs with whitespace preservation
+    total_added = 0
+    total_removed = 0
+    code_changes = []  # (action, full_line_with_indent)
+
+    for flush in flushes:
+        diff = flush.row.get("diffs", "")
+        if diff:
+            # Count added/removed lines and capture meaningful changes
+            for line in diff.split("\n"):
+                if line.startswith("+") and not line.startswith("+++"):
+                    total_added += 1
+                    # Preserve indentation: only skip completely empty lines
+                    actual_code = line[1:]  # Remove the '+' prefix
+                    if actual_code.strip() and len(code_changes) < 5:
+                        # Keep full line with indentation, max 100 chars
+                        code_changes.append(("added", actual_code[:100]))
+                elif line.startswith("-") and not line.startswith("---"):
+                    total_removed += 1
+                    actual_code = line[1:]  # Remove the '-' prefix
+                    if actual_code.strip() and len(code_changes) < 5:
+                        code_changes.append(("removed", actual_code[:100]))
+
+    timeline.append(f"    Time: {int(total_time)}s, Visits: {visits}")
+    timeline.append(f"    Changes: +{total_added} lines, -{total_removed} lines")
+
+    flagged = False
+    if total_added > 0 and total_removed > 0:
+        churn_ratio = (total_added + total_removed) / max(abs(total_added - total_removed), 1)
+        if churn_ratio > 3:
+            timeline.append(f"    ⚠ High churn (rewrote multiple times)")
+            flagged = True
+
+    if visits > 3:
+        timeline.append(f"    ⚠ Revisited {visits} times (possible struggle)")
+        flagged = True
+
+    # Show code changes with preserved indentation
+    if code_changes:
+        timeline.append(f"    Code changes:")
+        for action, code_line in code_changes[:4]:
+            # Preserve exact whitespace by not stripping
+            timeline.append(f"      {action:8s} | {code_line}")
+
+    # For significant changes, show full diff hunks with context
+    if total_added + total_removed > 10 and len(flushes) <= 2:
+        for flush in flushes[:1]:  # Show first flush's hunks only
+            hunks = _extract_meaningful_hunks(flush.row.get("diffs", ""), max_hunks=1)
+            if hunks:
+                timeline.append(f"    Diff context (whitespace preserved):")
+                for hunk in hunks:
+                    for hunk_line in hunk.split("\n")[:10]:  # Limit lines
+                        timeline.append(f"      {hunk_line}")
+
+    return _Group(file_path, symbol, visits, total_time, total_added, total_removed, flagged, "\n".join(timeline))
+
+
+def render_session(index: int, session: list[_Flush]) -> Session:
+    """One session: header, then per (file, symbol) activity and diff excerpts."""
+    start_time = session[0].row["start_timestamp"]
+    end_time = session[-1].row["end_timestamp"]
+    duration_sec = sum(f.duration for f in session)
+    files = len(set(f.row["file_path"] for f in session))
+
+    header = "\n".join([
+        f"\n=== Session {index + 1} ===",
+        f"Time: {start_time[:16]} to {end_time[11:16]} ({int(duration_sec/60)}m {int(duration_sec%60)}s)",
+        f"Files worked on: {files}",
+    ])
+
+    # Group by file and symbol
+    file_symbol_groups: dict[tuple[str, str], list[_Flush]] = {}
+    for flush in session:
+        key = (flush.row["file_path"], flush.row.get("active_symbol") or "(unknown)")
+        file_symbol_groups.setdefault(key, []).append(flush)
+
+    groups = [_render_group(file_path, symbol, flushes) for (file_path, symbol), flushes in file_symbol_groups.items()]
+    text = "\n".join([header] + [g.text for g in groups])
+    return Session(index, start_time, end_time, duration_sec, files, header, groups, text)
+
+
+# ── Token budgeting ──────────────────────────────────────────────────────
+#
+# Each session can be shown at one of four levels:
+#   0  full text
+#   1  struggle groups (top linger symbols, churn/revisit flags) in full,
+#      the rest one line each
+#   2  one line per (file, symbol)
+#   3  one line for the session; consecutive level-3 sessions are merged
+#      into a single span line
+# Sessions are demoted breadth-first, lowest signal first, until the prompt
+# fits; the latest session is demoted last.
+
+FULL, FOCUSED, BRIEF, SUMMARY = range(4)
+
+
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Encoding files are fetched on first use; no network means estimate
+        return None
+
+
+_enc = None
+_enc_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens for text (tiktoken when installed, else ~4 chars/token)."""
+    global _enc, _enc_loaded
+    if not _enc_loaded:
+        _enc, _enc_loaded = _encoding(), True
+    if _enc is not None:
+        return len(_enc.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _fmt_duration(sec: float) -> str:
+    h, m = divmod(int(sec / 60), 60)
+    return f"{h}h {m}m" if h else f"{m}m {int(sec % 60)}s"
+
+
+def _render_level(s: Session, level: int, struggles: set[tuple[str, str]]) -> str:
+    if level == FULL:
+        return s.text
+    if level == SUMMARY:
+        return (
+            f"\n=== Session {s.index + 1} (summarized) ===\n"
+            f"Time: {s.start_timestamp[:16]} to {s.end_timestamp[11:16]} ({_fmt_duration(s.duration)}), "
+            f"{s.files} files, {len(s.groups)} symbols; most time: {s.top_symbols()}"
+        )
+    lines = [s.header]
+    for g in s.groups:
+        keep = level == FOCUSED and (g.flagged or (g.file_path, g.symbol) in struggles)
+        lines.append(g.text if keep else g.brief())
+    return "\n".join(lines)
+
+
+def _render_span(sessions: list[Session]) -> str:
+    first, last = sessions[0], sessions[-1]
+    groups = [g for s in sessions for g in s.groups]
+    time_by_symbol: dict[tuple[str, str], float] = {}
+    for g in groups:
+        time_by_symbol[(g.file_path, g.symbol)] = time_by_symbol.get((g.file_path, g.symbol), 0.0) + g.time
+    top = sorted(time_by_symbol.items(), key=lambda kv: -kv[1])[:5]
+    return (
+        f"\n=== Sessions {first.index + 1}-{last.index + 1} (summarized) ===\n"
+        f"Time: {first.start_timestamp[:16]} to {last.end_timestamp[:16]} "
+        f"({_fmt_duration(sum(s.duration for s in sessions))} over {len(sessions)} sessions), "
+        f"{len({g.file_path for g in groups})} files; most time: "
+        + ", ".join(f"{sym} ({path})" for (path, sym), _ in top)
+    )
+
+
+def _render_budgeted(sessions: list[Session], levels: list[int], struggles) -> list[str]:
+    parts, run = [], []
+    for s, level in zip(sessions, levels):
+        if level == SUMMARY:
+            run.append(s)
+            continue
+        if run:
+            parts.append(_render_span(run) if len(run) > 1 else _render_level(run[0], SUMMARY, struggles))
+            run = []
+        parts.append(_render_level(s, level, struggles))
+    if run:
+        parts.append(_render_span(run) if len(run) > 1 else _render_level(run[0], SUMMARY, struggles))
+    return parts
+
+
+def _fit(parts: list[str], budget: int) -> str:
+    """Last resort: drop the oldest parts, then cut characters."""
+    text = "\n".join(parts)
+    dropped = 0
+    while len(parts) > 1 and count_tokens(text) > budget:
+        parts = parts[1:]
+        dropped += 1
+        text = f"({dropped} earlier sessions omitted)\n" + "\n".join(parts)
+    while count_tokens(text) > budget:
+        text = text[: max(0, len(text) * budget // count_tokens(text) - 16)] + "\n(truncated)"
+        if len(text) <= len("\n(truncated)"):
+            return ""
+    return text
+
+
+@dataclass
+class BudgetedTimeline:
+    text: str
+    tokens: int
+    full_tokens: int
+    sessions: int
+    summarized: int     # sessions shown below full detail
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.full_tokens - self.tokens
+
+
+def budget_sessions(sessions: list[Session], budget: int, linger_scores=()) -> BudgetedTimeline:
+    """Render sessions within budget tokens, compressing low-signal ones first."""
+    if not sessions:
+        return BudgetedTimeline(NO_ACTIVITY, count_tokens(NO_ACTIVITY), count_tokens(NO_ACTIVITY), 0, 0)
+
+    linger = {(s.file_path, s.symbol): s.linger_score for s in linger_scores}
+    struggles = set(linger)
+
+    def cost(s: Session, level: int) -> int:
+        if level not in s.costs:
+            s.costs[level] = count_tokens(_render_level(s, level, struggles)) + 1
+        return s.costs[level]
+
+    # Struggle-dependent renderings must not leak across linger sets
+    for s in sessions:
+        s.costs.pop(FOCUSED, None)
+
+    levels = [FULL] * len(sessions)
+    total = sum(cost(s, FULL) for s in sessions)
+    full_tokens = count_tokens("\n".join(s.text for s in sessions))
+
+    def signal(i: int):
+        s = sessions[i]
+        return (
+            max((linger.get((g.file_path, g.symbol), 0.0) for g in s.groups), default=0.0),
+            sum(g.flagged for g in s.groups),
+            i,  # then older first
+        )
+
+    # Sessions touching a top linger symbol, and the latest one, keep their
+    # detail until everything else is summarized
+    order = sorted(range(len(sessions)), key=signal)
+    protected = {len(sessions) - 1} | {i for i in order if signal(i)[0] > 0}
+    parts = None
+    for tier in ([i for i in order if i not in protected], [i for i in order if i in protected]):
+        for level in (FOCUSED, BRIEF):
+            for i in tier:
+                if total <= budget:
+                    break
+                saving = cost(sessions[i], levels[i]) - cost(sessions[i], level)
+                if saving > 0:
+                    total -= saving
+                    levels[i] = level
+
+        # Summaries merge into spans, so their cost is only known once
+        # rendered: count a summarized session as free, then check the real size
+        for i in tier:
+            if total <= budget:
+                parts = _render_budgeted(sessions, levels, struggles)
+                if count_tokens("\n".join(parts)) <= budget:
+                    break
+            total -= cost(sessions[i], levels[i])
+            levels[i] = SUMMARY
+        else:
+            parts = None
+            continue
+        break
+
+    if parts is None:
+        parts = _render_budgeted(sessions, levels, struggles)
+    text = _fit(parts, budget)
+    return BudgetedTimeline(
+        text,
+        count_tokens(text),
+        full_tokens,
+        len(sessions),
+        sum(level != FULL for level in levels),
+    )
+
+
+_budget_lock = threading.Lock()
+_budget_stats = {"prompts": 0, "full_tokens": 0, "sent_tokens": 0, "saved_tokens": 0, "compressed_prompts": 0}
+
+
+def budget_stats() -> dict:
+    with _budget_lock:
+        return dict(_budget_stats)
+
+
+def _record(result: BudgetedTimeline) -> None:
+    from . import stats
+
+    stats.register("timeline_budget", budget_stats)
+    with _budget_lock:
+        _budget_stats["prompts"] += 1
+        _budget_stats["full_tokens"] += result.full_tokens
+        _budget_stats["sent_tokens"] += result.tokens
+        _budget_stats["saved_tokens"] += result.saved_tokens
+        _budget_stats["compressed_prompts"] += bool(result.summarized)
+
+
+class StudentTimeline:
+    """Rendered sessions for one student's flushes, extendable in time order.
+
+    len() is the number of flushes, so an empty timeline is falsy. Rows are
+    kept once per client_flush_id. A timeline created with loaded=False is
+    registered before its rows are read: extend() buffers batches until
+    fill() merges them with the rows read.
+    """
+
+    def __init__(self, loaded: bool = True):
+        self._lock = threading.Lock()
+        self.frozen: list[Session] = []   # closed sessions
+        self.open: list[_Flush] = []      # the last session, still growing
+        self._open_session: Session | None = None
+        self._text: str | None = None
+        self._budgeted: tuple | None = None  # (key, BudgetedTimeline)
+        self._ids: set[str] = set()          # client_flush_ids appended
+        self._pending: list[dict] = []       # extended in before fill()
+        self.loaded = loaded
+        self.flush_count = 0
+        self.total_time = 0.0
+
+    @classmethod
+    def build(cls, flushes: list[dict]) -> "StudentTimeline":
+        t = cls()
+        t._append(t._sorted_unseen(flushes))
+        return t
+
+    def fill(self, flushes: list[dict]) -> None:
+        """Load the rows read for a registered timeline, plus any buffered."""
+        with self._lock:
+            self._append(self._sorted_unseen(list(flushes) + self._pending))
+            self._pending = []
+            self.loaded = True
+
+    def extend(self, flushes: list[dict]) -> bool:
+        """Append newly ingested flushes. False if any predates the open
+        session's latest flush (the caller should rebuild instead)."""
+        with self._lock:
+            if not self.loaded:
+                self._pending.extend(flushes)
+                return True
+            new = self._sorted_unseen(flushes)
+            if new and self.open and new[0].start < self.open[-1].start:
+                return False
+            self._append(new)
+            return True
+
+    def _sorted_unseen(self, flushes: list[dict]) -> list[_Flush]:
+        """Rows not appended yet, in time order; claims their ids."""
+        unseen = []
+        for f in flushes:
+            flush_id = f.get("client_flush_id")
+            if flush_id is not None:
+                flush_id = str(flush_id).lower()
+                if flush_id in self._ids:
+                    continue
+                self._ids.add(flush_id)
+            unseen.append(_Flush(f))
+        return sorted(unseen, key=lambda f: f.start)
+
+    def _append(self, new: list[_Flush]) -> None:
+        if not new:
+            return
+        for flush in new:
+            if self.open and (flush.start - self.open[-1].end) / 60 > SESSION_GAP_MIN:
+                self.frozen.append(self._open_session or render_session(len(self.frozen), self.open))
+                self.open = []
+            self.open.append(flush)
+            self._open_session = None
+            self.total_time += flush.duration
+        self.flush_count += len(new)
+        self._text = None
+        self._budgeted = None
+
+    def _sessions(self) -> list[Session]:
+        # Caller holds the lock
+        if not self.open:
+            return []
+        if self._open_session is None:
+            self._open_session = render_session(len(self.frozen), self.open)
+        return self.frozen + [self._open_session]
+
+    @property
+    def text(self) -> str:
+        """The full timeline, every session in detail."""
+        with self._lock:
+            if self._text is None:
+                sessions = self._sessions()
+                self._text = "\n".join(s.text for s in sessions) if sessions else NO_ACTIVITY
+            return self._text
+
+    def budgeted(self, budget: int, linger_scores=()) -> BudgetedTimeline:
+        """The timeline compressed to at most budget tokens (see budget_sessions)."""
+        key = (budget, tuple((s.file_path, s.symbol, s.linger_score) for s in linger_scores))
+        with self._lock:
+            if self._budgeted is None or self._budgeted[0] != key:
+                self._budgeted = (key, budget_sessions(self._sessions(), budget, linger_scores))
+            result = self._budgeted[1]
+        _record(result)
+        return result
+
+    @property
+    def session_count(self) -> int:
+        return len(self.frozen) + bool(self.open)
+
+    def __len__(self) -> int:
+        return self.flush_count
+
+
+def _read_timeline(sb, student_id: str, assignment_id: str) -> list[dict]:
+    result = (
+        queries.query(sb, "analysis.timeline")
+        .eq("profile_id", student_id)
+        .eq("assignment_id", assignment_id)
+        .order("start_timestamp", desc=False)
+        .execute()
+    )
+    return result.data or []
+
+
+def load_timeline(sb, student_id: str, assignment_id: str) -> StudentTimeline:
+    return StudentTimeline.build(_read_timeline(sb, student_id, assignment_id))
+
+
+_cache: TTLCache | None = None
+
+# Serializes a (student, assignment) timeline's first load
+_loading = KeyedLocks()
+
+# Assignment -> {id(recorded): recorded} for bulk reads in progress; each
+# collects the (student, rows) batches ingested meanwhile (recording_ingest)
+_recordings: dict[str, dict[int, list]] = {}
+_recordings_lock = threading.Lock()
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        from ..config import get_setting
+        from . import stats
+
+        _cache = TTLCache(
+            maxsize=get_setting("timeline", "cache_size", 2000),
+            ttl=get_setting("timeline", "cache_ttl", 600),
+        )
+        stats.register("timeline_cache", _cache.stats)
+    return _cache
+
+
+def get_timeline(sb, student_id: str, assignment_id: str) -> StudentTimeline:
+    """Cached timeline for (student, assignment), loaded on a miss.
+
+    The timeline is registered before the read, so a batch ingested during
+    the load is buffered into it by extend_cached instead of being missed;
+    one that the read also returned is kept once.
+    """
+    cache = get_cache()
+    key = (student_id, assignment_id)
+    t = cache.get(key)
+    if t is not None and t.loaded:
+        return t
+    with _loading.hold(key):
+        t = cache.peek(key)
+        if t is not None and t.loaded:
+            return t
+        t = StudentTimeline(loaded=False)
+        cache.set(key, t)
+        try:
+            t.fill(_read_timeline(sb, student_id, assignment_id))
+        except Exception:
+            cache.invalidate(key)
+            raise
+    return t
+
+
+@contextmanager
+def recording_ingest(assignment_id: str):
+    """Collect the batches ingested for an assignment during a bulk read.
+
+    Yields a list of (student_id, rows); pass it to seed() so a timeline
+    built from the read does not miss them.
+    """
+    recorded: list[tuple[str, list[dict]]] = []
+    with _recordings_lock:
+        _recordings.setdefault(assignment_id, {})[id(recorded)] = recorded
+    try:
+        yield recorded
+    finally:
+        with _recordings_lock:
+            recordings = _recordings[assignment_id]
+            del recordings[id(recorded)]
+            if not recordings:
+                del _recordings[assignment_id]
+
+
+def seed(student_id: str, assignment_id: str, timeline: StudentTimeline, flushes: list[dict], recorded: list) -> None:
+    """Cache a timeline built from a bulk read of flushes, unless one is cached.
+
+    Batches recorded for the student during the read are merged into a
+    separate copy first; timeline itself keeps matching the rows read.
+    """
+    cache = get_cache()
+    key = (student_id, assignment_id)
+    with _loading.hold(key):
+        if cache.peek(key) is not None:
+            return  # extend_cached keeps that one current
+        # Held so that a batch is either in recorded here or finds the entry
+        with _recordings_lock:
+            extra = [row for sid, rows in recorded if sid == student_id for row in rows]
+            cache.set(key, StudentTimeline.build(flushes + extra) if extra else timeline)
+
+
+def extend_cached(student_id: str, assignment_id: str, flushes: list[dict]) -> None:
+    """Fold newly ingested flushes into a cached timeline, if there is one."""
+    with _recordings_lock:
+        for recorded in _recordings.get(assignment_id, {}).values():
+            recorded.append((student_id, flushes))
+    cache = get_cache()
+    key = (student_id, assignment_id)
+    t = cache.get(key)
+    if t is not None and not t.extend(flushes):
+        cache.invalidate(key)
@@ -0,0 +1,183 @@
+"""
+Pooled keep-alive HTTP transport for all PostgREST traffic.
+
+One httpx.Client (thread-safe, connection-pooled, HTTP/2 when the h2
+package is installed) is shared by the supabase client's table/rpc calls
+and the ingest writer's bulk inserts, so every request reuses warm
+connections instead of each path keeping its own. Pool size, keep-alive and
+timeouts come from the `http` section of config.yaml; usage counters are
+served under "http_pool" at GET /stats.
+"""
+
+import threading
+import time
+
+import httpx
+from postgrest import SyncPostgrestClient
+from supabase import Client, ClientOptions
+
+try:
+    import h2  # noqa: F401  (presence enables HTTP/2 in httpx)
+except ImportError:
+    h2 = None
+
+_CONNECT_EVENTS = ("connect_tcp.started", "connect_unix_socket.started")
+
+
+class PooledClient(httpx.Client):
+    """httpx.Client that counts in-flight requests and connection reuse.
+
+    A request that did not open a TCP connection was served from the pool
+    (or multiplexed on an HTTP/2 connection). A request sent while every
+    pooled connection is busy has to wait for one; those are counted as
+    waits (HTTP/1.1 only, since HTTP/2 streams share a connection).
+    """
+
+    def __init__(self, *args, max_connections: int = 20, http2: bool = False, **kwargs):
+        super().__init__(*args, http2=http2, **kwargs)
+        self.max_connections = max_connections
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.requests = 0
+        self.connects = 0
+        self.waits = 0
+        self.errors = 0
+        self.busy_sec = 0.0
+
+    def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        connected = []
+
+        def trace(name, info):
+            if name.endswith(_CONNECT_EVENTS):
+                connected.append(True)
+
+        request.extensions = dict(request.extensions, trace=trace)
+        with self._lock:
+            if not self.http2 and self.in_use >= self.max_connections:
+                self.waits += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        start = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        except httpx.HTTPError:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_use -= 1
+                self.requests += 1
+                self.connects += bool(connected)
+                self.busy_sec += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            reused = self.requests - self.connects
+            return {
+                "http2": self.http2,
+                "max_connections": self.max_connections,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "requests": self.requests,
+                "connects": self.connects,
+                "waits": self.waits,
+                "errors": self.errors,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+                "avg_ms": round(self.busy_sec / self.requests * 1000, 1) if self.requests else None,
+            }
+
+
+def make_client(
+    base_url: str,
+    headers: dict[str, str],
+    pool_size: int = 20,
+    keepalive: int = 10,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 30.0,
+    connect_timeout: float = 5.0,
+    http2: bool = True,
+) -> PooledClient:
+    return PooledClient(
+        base_url=base_url,
+        headers=headers,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        max_connections=pool_size,
+        http2=http2 and h2 is not None,
+        follow_redirects=True,
+    )
+
+
+class _PooledPostgrest(SyncPostgrestClient):
+    """PostgREST client whose session is the shared pool."""
+
+    def __init__(self, base_url: str, pool: PooledClient, schema: str = "public"):
+        self._pool = pool
+        super().__init__(base_url, schema=schema, headers=dict(pool.headers), timeout=pool.timeout)
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return self._pool
+
+    def aclose(self) -> None:
+        # The pool outlives any one client
+        pass
+
+
+class PooledSupabase(Client):
+    """supabase Client routing table()/rpc() through the shared pool."""
+
+    def __init__(self, url: str, key: str, pool: PooledClient):
+        self._pool = pool
+        super().__init__(url, key, ClientOptions())
+
+    def _init_postgrest_client(self, rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return _PooledPostgrest(rest_url, self._pool, schema=schema)
+
+
+_pool: PooledClient | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> PooledClient:
+    """Process-wide pool for SUPABASE_URL/rest/v1, built from config on first use."""
+    global _pool
+    from flask import current_app
+    from ..config import get_setting
+    from . import stats
+
+    with _pool_lock:
+        if _pool is None:
+            key = current_app.config["SUPABASE_SERVICE_ROLE_KEY"]
+            _pool = make_client(
+                current_app.config["SUPABASE_URL"] + "/rest/v1",
+                {
+                    "apikey": key,
+                    "Authorization": f"Bearer {key}",
+                    "Accept": "application/json",
+                    "Content-Type": "application/json",
+                },
+                pool_size=get_setting("http", "pool_size", 20),
+                keepalive=get_setting("http", "keepalive", 10),
+                keepalive_expiry=get_setting("http", "keepalive_expiry", 30.0),
+                timeout=get_setting("http", "timeout", 30.0),
+                connect_timeout=get_setting("http", "connect_timeout", 5.0),
+                http2=get_setting("http", "http2", True),
+            )
+            stats.register("http_pool", _pool.stats)
+        return _pool
+
+
+def reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the analysis pipeline.
+
+Run from server/, e.g.:  python -m bench.class_parallel
+All inputs come from supabase/seed_data — no Supabase instance needed.
+"""
@@ -0,0 +1,47 @@
+"""
+Class-analysis scoring: serial vs process pool vs thread pool.
+
+The 20-student arith seed class is replicated to --students students and
+scored end to end (edit regions + linger scores + class struggle).
+
+    python -m bench.class_parallel --students 400 --workers 4
+"""
+
+import argparse
+import os
+
+from app.services.analysis import compute_class_struggle
+from app.services.scoring import score_students, get_pool
+from .seed_corpus import load_seed_students, replicate_class, best_of
+
+
+def run(groups, pool):
+    scores = [s for _, s in score_students(iter(groups), pool)]
+    return compute_class_struggle(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    groups = replicate_class(load_seed_students("arith"), args.students)
+    flushes = sum(len(f) for _, f in groups)
+    print(f"{args.students} students, {flushes} flushes, {args.workers} workers, cpus={os.cpu_count()}")
+
+    expected = run(groups, None)
+    serial = best_of(lambda: run(groups, None), args.repeat)
+    print(f"  serial          {serial * 1000:8.1f} ms")
+
+    for kind in ("process", "thread"):
+        pool = get_pool(kind, args.workers)
+        assert run(groups, pool) == expected, f"{kind} pool changed the result"
+        t = best_of(lambda: run(groups, pool), args.repeat)
+        print(f"  {kind:7s} pool    {t * 1000:8.1f} ms   x{serial / t:.2f}")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
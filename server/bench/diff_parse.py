@@ -0,0 +1,112 @@
+"""
+parse_diff_stats microbenchmark over the seed_data corpus.
+
+Compares the original three-pass, split-based parser (kept here verbatim as
+the reference) with the single-pass iter_hunk_stats fast path.
+
+    python -m bench.diff_parse
+"""
+
+import argparse
+import glob
+import os
+import re
+
+from app.services.analysis import HunkStat, iter_hunk_stats, parse_diff_stats
+from .seed_corpus import all_seed_diffs, best_of
+
+MOCK_DIFF_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "web", "src", "mock-diffs")
+
+
+def parse_diff_stats_reference(diff_text: str) -> list[HunkStat]:
+    """The pre-rewrite implementation, for equivalence checks and timing."""
+    hunks: list[HunkStat] = []
+    if not diff_text:
+        return hunks
+
+    lines = diff_text.split("\n")
+    hunk_pattern = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+    has_hunk_headers = any(hunk_pattern.match(l) for l in lines)
+
+    if has_hunk_headers:
+        hunk_starts: list[int] = []
+        for i, line in enumerate(lines):
+            if hunk_pattern.match(line):
+                hunk_starts.append(i)
+
+        for hi, start_line_idx in enumerate(hunk_starts):
+            m = hunk_pattern.match(lines[start_line_idx])
+            if not m:
+                continue
+            new_start = int(m.group(1))
+            end_idx = hunk_starts[hi + 1] if hi + 1 < len(hunk_starts) else len(lines)
+
+            inserted = 0
+            deleted = 0
+            max_line = new_start
+            for li in range(start_line_idx + 1, end_idx):
+                line = lines[li]
+                if line.startswith("+"):
+                    inserted += len(line) - 1
+                    max_line += 1
+                elif line.startswith("-"):
+                    deleted += len(line) - 1
+                elif line.startswith(" "):
+                    max_line += 1
+
+            hunks.append(HunkStat(line_start=new_start, line_end=max_line, inserted=inserted, deleted=deleted))
+    else:
+        inserted = 0
+        deleted = 0
+        line_num = 1
+        max_line = 1
+        for line in lines:
+            if line.startswith("+"):
+                inserted += len(line) - 1
+                max_line = max(max_line, line_num)
+                line_num += 1
+            elif line.startswith("-"):
+                deleted += len(line) - 1
+            else:
+                line_num += 1
+
+        if inserted > 0 or deleted > 0:
+            hunks.append(HunkStat(line_start=1, line_end=max_line, inserted=inserted, deleted=deleted))
+
+    return hunks
+
+
+def mock_unified_diffs() -> list[str]:
+    """Real createTwoFilesPatch-style diffs from the web mocks."""
+    diffs = []
+    for path in sorted(glob.glob(os.path.join(MOCK_DIFF_DIR, "*.diff"))):
+        with open(path) as f:
+            diffs.append(f.read())
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpora = {
+        "seed (bare +/-)": all_seed_diffs(),
+        "mock (unified)": mock_unified_diffs() * 100,
+    }
+    for name, diffs in corpora.items():
+        for d in diffs:
+            assert parse_diff_stats(d) == parse_diff_stats_reference(d)
+        size = sum(len(d) for d in diffs) / 1e6
+        ref = best_of(lambda: [parse_diff_stats_reference(d) for d in diffs], args.repeat)
+        new = best_of(lambda: [parse_diff_stats(d) for d in diffs], args.repeat)
+        fast = best_of(lambda: [iter_hunk_stats(d) for d in diffs], args.repeat)
+        print(f"{name}: {len(diffs)} diffs, {size:.2f} MB")
+        print(f"  reference          {ref * 1000:8.1f} ms")
+        print(f"  parse_diff_stats   {new * 1000:8.1f} ms   x{ref / new:.2f}")
+        print(f"  iter_hunk_stats    {fast * 1000:8.1f} ms   x{ref / fast:.2f}")
+
+
+if __name__ == "__main__":
+    main()
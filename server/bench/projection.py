@@ -0,0 +1,99 @@
+"""
+Flush payload size and transfer cost: select("*") vs per-endpoint projections.
+
+Seed rows are padded out to full flushes-table rows (ids, hash, metrics,
+diff stats) and, like the extension, keep a snapshot only on each file's
+first flush and every --snapshot-every sequences. For each registered
+projection the JSON body PostgREST would return is built for --students
+students; latency is encode + decode of that body, the part of a fetch
+that scales with payload size.
+
+    python -m bench.projection --students 40
+"""
+
+import argparse
+import json
+import uuid
+
+from app.services import queries
+from app.services.analysis import compute_current_focus, flushes_to_edit_regions
+from app.services.flush_stats import diff_stat_columns
+from app.services.reconstruct import content_hash
+from .seed_corpus import load_seed_students, replicate_class, best_of
+
+ASSIGNMENT_ID = str(uuid.UUID(int=0xA))
+
+# A representative FlushMetrics object as sent by the extension
+METRICS = {
+    "chars_inserted": 148, "chars_deleted": 37, "rewrite_ratio": 0.25, "edit_velocity": 2.4,
+    "lines_touched": 9, "thrash": {"lines": [12, 13], "count": 2}, "delete_rewrite": None,
+    "cursor_reads": {"main": 3, "helper": 1}, "pause_count": 4, "edit_events": 61,
+}
+
+
+def full_rows(groups, snapshot_every: int) -> list[dict]:
+    rows = []
+    for pid, flushes in groups:
+        seen_files = set()
+        for f in flushes:
+            first = f["file_path"] not in seen_files
+            seen_files.add(f["file_path"])
+            keep_snapshot = first or f["sequence_number"] % snapshot_every == 0
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "profile_id": pid,
+                "assignment_id": ASSIGNMENT_ID,
+                "file_path": f["file_path"],
+                "client_flush_id": str(uuid.uuid4()),
+                "sequence_number": f["sequence_number"],
+                "content_hash": content_hash(f["snapshot"] or ""),
+                "trigger": f["trigger"],
+                "start_timestamp": f["start_timestamp"],
+                "end_timestamp": f["end_timestamp"],
+                "diffs": f["diffs"],
+                "snapshot": f["snapshot"] if keep_snapshot else None,
+                "active_symbol": f["active_symbol"],
+                "metrics": METRICS,
+                "created_at": f["end_timestamp"],
+                "window_duration": f["window_duration"],
+                **diff_stat_columns(f["diffs"]),
+            })
+    return rows
+
+
+def project(rows: list[dict], columns) -> list[dict]:
+    return [{c: r[c] for c in columns} for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--snapshot-every", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    groups = replicate_class(load_seed_students("arith"), args.students)
+    rows = full_rows(groups, args.snapshot_every)
+    print(f"{args.students} students, {len(rows)} flushes, snapshot every {args.snapshot_every}")
+
+    # The projection must still feed the computation it was cut for
+    focus_in = project(rows, queries.spec("analysis.class").columns)
+    assert compute_current_focus(flushes_to_edit_regions(focus_in)) == \
+        compute_current_focus(flushes_to_edit_regions(rows))
+
+    star = json.dumps(rows)
+    star_t = best_of(lambda: json.loads(json.dumps(rows)), args.repeat)
+    print(f"  {'select(*)':20s} {len(star) / 1024:9.1f} KiB {star_t * 1000:8.1f} ms")
+
+    for name, spec in sorted(queries.SPECS.items()):
+        if spec.table != "flushes":
+            continue
+        body = project(rows, spec.columns)
+        size = len(json.dumps(body))
+        t = best_of(lambda: json.loads(json.dumps(body)), args.repeat)
+        print(f"  {name:20s} {size / 1024:9.1f} KiB {t * 1000:8.1f} ms   "
+              f"{size / len(star):6.1%} of bytes  x{star_t / t:.1f}")
+
+
+if __name__ == "__main__":
+    main()
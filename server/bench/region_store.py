@@ -0,0 +1,141 @@
+"""
+Memory and GC cost of holding a whole class's edit regions.
+
+Three layouts over the same synthetic class (the arith seed students cycled
+until the class has --flushes flushes, about 107 per student):
+  dataclass  EditRegion / HunkStat as plain (__dict__) dataclasses, with
+             per-hunk HunkStat objects built and then aggregated, as before
+  slots      flushes_to_edit_regions: slotted EditRegion, fused hunk fold
+  store      one RegionStore per student (typed arrays, interned ids)
+
+Each layout keeps every student's regions alive, then scores them all.
+Reported: tracemalloc peak and retained bytes per region, GC collections
+per generation during build + score, and wall time (measured separately,
+without tracemalloc).
+
+    python -m bench.region_store --flushes 1000000
+"""
+
+import argparse
+import gc
+import itertools
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from app.services import analysis
+from app.services.epochs import end_epoch, start_epoch
+from app.services.aggregates import linger_from_aggregates
+from app.services.regions import RegionStore
+from .seed_corpus import load_seed_students
+
+
+@dataclass
+class DictHunkStat:
+    line_start: int
+    line_end: int
+    inserted: int
+    deleted: int
+
+
+@dataclass
+class DictEditRegion:
+    file_path: str
+    symbol: str | None
+    line_start: int
+    line_end: int
+    chars_inserted: int
+    chars_deleted: int
+    net_change: int
+    start_time: str
+    end_time: str
+    duration_sec: float
+    start_epoch: float | None = None
+    end_epoch: float | None = None
+
+
+def dict_regions(flushes):
+    regions = []
+    for f in flushes:
+        hunks = [DictHunkStat(*h) for h in analysis.iter_hunk_stats(f.get("diffs", ""))]
+        line_start, line_end, inserted, deleted = analysis.aggregate_hunks(
+            [(h.line_start, h.line_end, h.inserted, h.deleted) for h in hunks]
+        )
+        regions.append(DictEditRegion(
+            f["file_path"], f.get("active_symbol") or None, line_start, line_end,
+            inserted, deleted, inserted - deleted, f["start_timestamp"], f["end_timestamp"],
+            f.get("window_duration") or 0.0, start_epoch(f), end_epoch(f),
+        ))
+    return regions
+
+
+LAYOUTS = {
+    "dataclass": (dict_regions, analysis.compute_linger_scores),
+    "slots": (analysis.flushes_to_edit_regions, analysis.compute_linger_scores),
+    "store": (RegionStore.from_flushes, lambda store: linger_from_aggregates(store.aggregates())),
+}
+
+
+def synthetic_class(n_flushes: int) -> list[list[dict]]:
+    """Student flush lists totalling n_flushes; rows are shared, not copied."""
+    base = list(load_seed_students("arith").values())
+    for rows in base:
+        for f in rows:
+            start_epoch(f), end_epoch(f)  # memoize before measuring
+    students, total = [], 0
+    for rows in itertools.cycle(base):
+        if total >= n_flushes:
+            return students
+        rows = rows[:n_flushes - total]
+        students.append(rows)
+        total += len(rows)
+
+
+def run(layout: str, students):
+    build, score = LAYOUTS[layout]
+    held = [build(rows) for rows in students]
+    scores = [score(r) for r in held]
+    return held, scores
+
+
+def measure(layout: str, students, n: int) -> dict:
+    gc.collect()
+    before = [s["collections"] for s in gc.get_stats()]
+    t0 = time.perf_counter()
+    held, scores = run(layout, students)
+    elapsed = time.perf_counter() - t0
+    collections = [s["collections"] - b for s, b in zip(gc.get_stats(), before)]
+    del held, scores
+    gc.collect()
+
+    tracemalloc.start()
+    held, scores = run(layout, students)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held, scores
+    gc.collect()
+    return {
+        "seconds": elapsed,
+        "peak_mb": peak / 2**20,
+        "bytes_per_region": retained / n,
+        "collections": collections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--flushes", type=int, default=1_000_000)
+    parser.add_argument("--layouts", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    args = parser.parse_args()
+
+    students = synthetic_class(args.flushes)
+    print(f"{args.flushes} flushes, {len(students)} students")
+    for layout in args.layouts:
+        m = measure(layout, students, args.flushes)
+        gen = "/".join(str(c) for c in m["collections"])
+        print(f"  {layout:10s} peak {m['peak_mb']:8.1f} MB   retained {m['bytes_per_region']:6.1f} B/region"
+              f"   gc gen0/1/2 {gen:>14s}   {m['seconds']:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Python (dataclass) vs NumPy (columnar) scoring backends.
+
+Edit regions are built from the arith seed corpus and tiled up to each size;
+both backends must return identical SymbolScore / FocusArea lists. The last
+section times score_student per backend over a replicated class, which is
+what analysis.backend switches.
+
+    python -m bench.scoring_backends --sizes 10000 100000 1000000
+"""
+
+import argparse
+import itertools
+
+from app.services import analysis, columnar
+from app.services.scoring import score_student
+from .seed_corpus import load_seed_students, replicate_class, best_of
+
+
+def tiled_regions(n: int):
+    base = [r for rows in load_seed_students("arith").values() for r in analysis.flushes_to_edit_regions(rows)]
+    return list(itertools.islice(itertools.cycle(base), n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if not columnar.available():
+        raise SystemExit("numpy is not installed")
+
+    for n in args.sizes:
+        regions = tiled_regions(n)
+        cols = columnar.RegionColumns.from_regions(regions)
+        build = best_of(lambda: columnar.RegionColumns.from_regions(regions), 1)
+        print(f"{n} regions (columns built in {build * 1000:.0f} ms)")
+
+        for name in ("compute_linger_scores", "compute_current_focus"):
+            py_fn = getattr(analysis, name)
+            np_fn = getattr(columnar, name)
+            assert py_fn(regions) == np_fn(cols), f"{name} differs"
+            py = best_of(lambda: py_fn(regions), args.repeat)
+            vec = best_of(lambda: np_fn(cols), args.repeat)
+            print(f"  {name:24s} python {py * 1000:8.1f} ms   numpy {vec * 1000:8.1f} ms   x{py / vec:.1f}")
+
+    # score_student over a class, flushes to linger scores
+    groups = replicate_class(load_seed_students("arith"), 200)
+    assert all(score_student(f, "python") == score_student(f, "numpy") for _, f in groups)
+    py = best_of(lambda: [score_student(f, "python") for _, f in groups], args.repeat)
+    vec = best_of(lambda: [score_student(f, "numpy") for _, f in groups], args.repeat)
+    print(f"score_student ({len(groups)} students, {sum(len(f) for _, f in groups)} flushes)")
+    print(f"  python {py * 1000:8.1f} ms   numpy {vec * 1000:8.1f} ms   x{py / vec:.1f}")
+
+if __name__ == "__main__":
+    main()
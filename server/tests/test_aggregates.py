@@ -0,0 +1,116 @@
+"""
+Symbol aggregate backfill: partial aggregates are rebuilt until the pair
+carries the backfill marker, in a single RPC that names the flushes it folded.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import aggregates
+from app.services.aggregates import fold_flushes, get_student_aggregates
+from bench.seed_corpus import load_seed_students
+
+
+def _agg_rows(flushes):
+    """symbol_aggregates rows as selected (AGGREGATE_COLUMNS)."""
+    rows = [aggregates._to_row("s1", "a1", a) for a in fold_flushes(flushes).values()]
+    return [{k: v for k, v in r.items() if k not in ("profile_id", "assignment_id")} for r in rows]
+
+
+class FakeQuery:
+    def __init__(self, sb, name):
+        self.sb, self.name, self.filters = sb, name, {}
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        self.sb.reads.append(self.name)
+
+        class R:
+            data = self.sb.tables.get(self.name, [])
+        return R()
+
+
+class FakeSupabase:
+    def __init__(self, flushes, aggregates=(), marked=False, rebuilt=(True,)):
+        # rebuild_symbol_aggregates results, in call order
+        self.rebuilt = list(rebuilt)
+        self.tables = {
+            "flushes": flushes,
+            "symbol_aggregates": list(aggregates),
+            "symbol_aggregate_backfills": [{"profile_id": "s1"}] if marked else [],
+        }
+        self.reads, self.rpcs = [], []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        self.rpcs.append((name, params))
+        self.tables["rpc"] = self.rebuilt.pop(0)
+        return FakeQuery(self, "rpc")
+
+
+@pytest.fixture(autouse=True)
+def _fresh_markers(monkeypatch):
+    monkeypatch.setattr(aggregates, "_backfilled", set())
+
+
+@pytest.fixture(scope="module")
+def flushes():
+    rows = next(iter(load_seed_students().values()))
+    return [dict(f, id=str(i), client_flush_id=f"c{i}") for i, f in enumerate(rows)]
+
+
+def test_partial_aggregates_are_rebuilt_until_marked(flushes):
+    # Ingest wrote a row for the newest flush only; older history predates it
+    sb = FakeSupabase(flushes, _agg_rows(flushes[-1:]))
+
+    aggs = get_student_aggregates(sb, "s1", "a1")
+    assert [a.visits for a in aggs] == [a.visits for a in fold_flushes(flushes).values()]
+    (name, params), = sb.rpcs
+    assert name == "rebuild_symbol_aggregates"
+    assert (params["p_profile_id"], params["p_assignment_id"]) == ("s1", "a1")
+    assert sum(d["visits"] for d in params["deltas"]) == len(flushes)
+    assert params["p_flush_ids"] == [f["client_flush_id"] for f in flushes]
+
+    # Marked now: later reads go straight to the aggregates
+    sb.reads.clear()
+    get_student_aggregates(sb, "s1", "a1")
+    assert sb.reads == ["symbol_aggregates"] and len(sb.rpcs) == 1
+
+
+def test_marked_pair_reads_aggregates(flushes):
+    sb = FakeSupabase(flushes, _agg_rows(flushes), marked=True)
+    aggs = get_student_aggregates(sb, "s1", "a1")
+    assert sum(a.visits for a in aggs) == len(flushes)
+    assert sb.rpcs == [] and "flushes" not in sb.reads
+
+
+def test_refused_rebuild_rereads_flushes(flushes):
+    # Ingest counted a flush the first read missed: the RPC refuses, read again
+    sb = FakeSupabase(flushes, rebuilt=(False, True))
+    get_student_aggregates(sb, "s1", "a1")
+    assert [name for name, _ in sb.rpcs] == ["rebuild_symbol_aggregates"] * 2
+    assert sb.reads.count("flushes") == 2
+    assert aggregates.is_backfilled(sb, "s1", "a1")
+
+
+def test_rebuild_leaves_pair_unmarked_after_repeated_refusals(flushes):
+    sb = FakeSupabase(flushes, rebuilt=(False,) * aggregates.REBUILD_ATTEMPTS)
+    aggs = get_student_aggregates(sb, "s1", "a1")
+    assert sum(a.visits for a in aggs) == len(flushes)
+    assert len(sb.rpcs) == aggregates.REBUILD_ATTEMPTS
+    assert ("s1", "a1") not in aggregates._backfilled
@@ -0,0 +1,165 @@
+"""
+Unit tests for the pure analysis layer, run against the seed_data corpus.
+
+No Supabase needed — flush rows are built from supabase/seed_data/*.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+# Add parent so we can import the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.analysis import (
+    HunkStat,
+    iter_hunk_stats,
+    parse_diff_stats,
+    flushes_to_edit_regions,
+    compute_linger_scores,
+    compute_current_focus,
+)
+from app.services import columnar
+from app.services.aggregates import (
+    fold_flushes,
+    merge_aggregate,
+    linger_from_aggregates,
+    focus_from_aggregates,
+)
+from app.services.flush_stats import diff_stat_columns, has_changes
+from app.services.scoring import score_student
+from bench.seed_corpus import load_seed_students, all_seed_diffs
+from bench.diff_parse import parse_diff_stats_reference, mock_unified_diffs
+
+
+@pytest.fixture(scope="module")
+def seed_students():
+    students = load_seed_students()
+    if not students:
+        pytest.skip("seed_data corpus not found")
+    return students
+
+
+def _by_key(items):
+    return {(i.file_path, i.symbol): i for i in items}
+
+
+class TestSymbolAggregates:
+    def test_linger_matches_full_recompute(self, seed_students):
+        for flushes in seed_students.values():
+            expected = compute_linger_scores(flushes_to_edit_regions(flushes))
+            got = linger_from_aggregates(list(fold_flushes(flushes).values()))
+            assert _by_key(got) == _by_key(expected)
+            assert [s.linger_score for s in got] == [s.linger_score for s in expected]
+
+    def test_focus_matches_full_recompute(self, seed_students):
+        for flushes in seed_students.values():
+            expected = compute_current_focus(flushes_to_edit_regions(flushes))
+            got = focus_from_aggregates(list(fold_flushes(flushes).values()))
+            exp_map = _by_key(expected)
+            for key, f in _by_key(got).items():
+                assert f.weighted_time == pytest.approx(exp_map[key].weighted_time, abs=0.011)
+
+    def test_incremental_batches_match_single_fold(self, seed_students):
+        flushes = next(iter(seed_students.values()))
+        whole = fold_flushes(flushes)
+
+        running = {}
+        for i in range(0, len(flushes), 7):
+            for key, delta in fold_flushes(flushes[i:i + 7]).items():
+                if key in running:
+                    merge_aggregate(running[key], delta)
+                else:
+                    running[key] = delta
+
+        assert running.keys() == whole.keys()
+        for key, agg in whole.items():
+            assert running[key].visits == agg.visits
+            assert running[key].chars_inserted == agg.chars_inserted
+            assert running[key].dwell_time == pytest.approx(agg.dwell_time)
+            assert running[key].focus_weight == pytest.approx(agg.focus_weight)
+
+    def test_missing_window_duration_is_derived(self):
+        row = {
+            "file_path": "a.c",
+            "active_symbol": "main",
+            "diffs": "+x",
+            "start_timestamp": "2026-02-01T12:00:00Z",
+            "end_timestamp": "2026-02-01T12:00:12Z",
+        }
+        agg = fold_flushes([row])[("a.c", "main")]
+        assert agg.dwell_time == 12.0
+        assert agg.active_time == 12.0
+
+
+class TestParseDiffStats:
+    def test_matches_reference_on_seed_corpus(self):
+        for d in all_seed_diffs():
+            assert parse_diff_stats(d) == parse_diff_stats_reference(d)
+
+    def test_matches_reference_on_unified_diffs(self):
+        diffs = mock_unified_diffs()
+        assert diffs
+        for d in diffs:
+            assert parse_diff_stats(d) == parse_diff_stats_reference(d)
+
+    def test_matches_reference_on_random_lines(self):
+        rng = random.Random(40)
+        pieces = ["+", "-", " ", "", "@@ -1,2 +3,4 @@", "@@ -7 +9 @@ fn", "@@ bogus", "--- a/x", "+++ b/x", "\\ No newline", "\r"]
+        for _ in range(2000):
+            lines = [rng.choice(pieces) + "x" * rng.randint(0, 5) for _ in range(rng.randint(0, 12))]
+            d = "\n".join(lines) + rng.choice(["", "\n"])
+            assert parse_diff_stats(d) == parse_diff_stats_reference(d), repr(d)
+
+    def test_tuples_and_hunkstats_agree(self):
+        d = "--- a/f.c\n+++ b/f.c\n@@ -1,2 +1,3 @@\n a\n-b\n+bb\n+c\n@@ -10 +11,2 @@\n+z\n"
+        assert iter_hunk_stats(d) == [(1, 4, 3, 1), (11, 12, 1, 0)]
+        assert parse_diff_stats(d) == [HunkStat(1, 4, 3, 1), HunkStat(11, 12, 1, 0)]
+
+
+class TestStoredDiffStats:
+    def test_regions_from_stored_stats_match_parsed(self, seed_students):
+        for flushes in seed_students.values():
+            stored = []
+            for f in flushes:
+                row = {k: v for k, v in f.items() if k != "diffs"}
+                row.update(diff_stat_columns(f["diffs"]))
+                stored.append(row)
+            assert flushes_to_edit_regions(stored) == flushes_to_edit_regions(flushes)
+
+    def test_has_changes_without_diff_text(self):
+        assert has_changes({"diff_inserted": 0, "diff_deleted": 3})
+        assert not has_changes({"diff_inserted": 0, "diff_deleted": 0})
+        assert not has_changes({"diffs": "  \n"})
+
+    def test_has_changes_same_at_ingest_and_rebuild(self, seed_students):
+        diffs = [f["diffs"] for rows in seed_students.values() for f in rows]
+        # Header only, and a blank line added: text but no changed characters
+        diffs += ["@@ -1,0 +1,1 @@\n", "@@ -1,0 +1,1 @@\n+\n", "+   \n"]
+        for d in diffs:
+            ingest = {"diffs": d, **diff_stat_columns(d)}
+            stored = diff_stat_columns(d)
+            assert has_changes(ingest) == has_changes(stored) == has_changes({"diffs": d})
+
+
+class TestColumnarBackend:
+    @pytest.fixture(autouse=True)
+    def _need_numpy(self):
+        pytest.importorskip("numpy")
+
+    def test_matches_python_backend_per_student(self, seed_students):
+        for flushes in seed_students.values():
+            regions = flushes_to_edit_regions(flushes)
+            cols = columnar.RegionColumns.from_regions(regions)
+            assert columnar.compute_linger_scores(cols) == compute_linger_scores(regions)
+            assert columnar.compute_current_focus(cols) == compute_current_focus(regions)
+
+    def test_score_student_backends_agree(self, seed_students):
+        for flushes in seed_students.values():
+            assert score_student(flushes, "numpy") == score_student(flushes, "python")
+
+    def test_empty_inputs(self):
+        assert columnar.compute_linger_scores([]) == []
+        assert columnar.compute_current_focus([]) == []
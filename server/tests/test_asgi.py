@@ -0,0 +1,218 @@
+"""
+ASGI serving mode: native async chat/report, everything else via Flask.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+pytest.importorskip("a2wsgi")
+
+from app import asgi
+from app.routes import analysis
+from app.services import report_cache
+
+AUTH = {"Authorization": "Bearer " + jwt.encode({"sub": "ta"}, "test-secret", algorithm="HS256")}
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    def fake_inputs(sb, student_id, assignment_id):
+        return ([{"file_path": "a.c"}], []) if student_id != "idle" else ([], [])
+
+    async def fake_chat(flushes, linger_scores, message, history):
+        for tok in ("he", "llo"):
+            await asyncio.sleep(0.1)
+            yield f"data: {tok}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def fake_report(flushes, linger_scores):
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    monkeypatch.setattr(analysis, "load_llm_inputs", fake_inputs)
+    monkeypatch.setattr(asgi, "achat_about_student", fake_chat)
+    monkeypatch.setattr(asgi, "agenerate_detailed_report", fake_report)
+    monkeypatch.setattr(asgi.AsgiApp, "_in_app", lambda self, fn, *a: fn(None, *a))
+    monkeypatch.setattr(report_cache, "_cache", report_cache.ReportCache(str(tmp_path)))
+    monkeypatch.setattr(
+        report_cache, "report_fingerprint",
+        lambda sb, sid, aid: None if sid == "idle" else f"{sid}-{aid}",
+    )
+    return asgi.create_asgi_app()
+
+
+def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_other_routes_go_to_flask(app):
+    async def run():
+        async with _client(app) as c:
+            return await c.get("/health")
+    assert asyncio.run(run()).json() == {"healthy": True}
+
+
+def test_chat_streams_sse(app):
+    async def run():
+        async with _client(app) as c:
+            return await c.post("/api/analysis/chat/s1", json={"assignment_id": "a", "message": "hi"}, headers=AUTH)
+    resp = asyncio.run(run())
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert resp.text == "data: he\n\ndata: llo\n\ndata: [DONE]\n\n"
+
+
+def test_chat_without_activity(app):
+    async def run():
+        async with _client(app) as c:
+            return await c.post("/api/analysis/chat/idle", json={"assignment_id": "a", "message": "hi"}, headers=AUTH)
+    assert asyncio.run(run()).text == analysis.NO_ACTIVITY_SSE + "data: [DONE]\n\n"
+
+
+def test_auth_and_validation(app):
+    async def run():
+        async with _client(app) as c:
+            return (
+                await c.post("/api/analysis/chat/s1", json={"assignment_id": "a", "message": "hi"}),
+                await c.post("/api/analysis/chat/s1", json={"message": "hi"}, headers=AUTH),
+                await c.get("/api/analysis/report/s1", headers=AUTH),
+            )
+    no_auth, no_assignment, no_report_assignment = asyncio.run(run())
+    assert no_auth.status_code == 401
+    assert no_assignment.status_code == 400
+    assert no_report_assignment.status_code == 400
+
+
+def test_many_concurrent_chats_share_the_loop(app):
+    async def run():
+        async with _client(app) as c:
+            return await asyncio.gather(*[
+                c.post("/api/analysis/chat/s1", json={"assignment_id": "a", "message": "hi"}, headers=AUTH)
+                for _ in range(200)
+            ] + [c.get("/api/analysis/report/s1?assignment_id=a", headers=AUTH) for _ in range(50)])
+    start = time.perf_counter()
+    responses = asyncio.run(run())
+    # 200 streams of ~0.2 s each: serial would take 40 s
+    assert time.perf_counter() - start < 5
+    assert all(r.status_code == 200 for r in responses)
+    assert responses[-1].json() == {"data": {"report": "ok"}}
+
+
+def test_report_is_cached(app, monkeypatch):
+    calls = []
+
+    async def counting_report(flushes, linger_scores):
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    monkeypatch.setattr(asgi, "agenerate_detailed_report", counting_report)
+
+    async def run():
+        async with _client(app) as c:
+            first = await asyncio.gather(*[
+                c.get("/api/analysis/report/s1?assignment_id=a", headers=AUTH) for _ in range(10)
+            ])
+            again = await c.get("/api/analysis/report/s1?assignment_id=a", headers=AUTH)
+            idle = await c.get("/api/analysis/report/idle?assignment_id=a", headers=AUTH)
+            return first, again, idle
+    first, again, idle = asyncio.run(run())
+    assert all(r.json() == {"data": {"report": "ok"}} for r in first + [again])
+    assert calls == [1]
+    assert idle.json() == {"data": {"report": "No activity recorded for this student."}}
+
+
+def _scope(method, path, headers=AUTH, query=b""):
+    return {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "raw_path": path.encode(),
+        "query_string": query, "root_path": "", "scheme": "http", "server": ("test", 80), "client": ("c", 1),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+
+
+def _disconnecting_receive(body=b"", after=0.15):
+    """Deliver the request body, then report a disconnect after `after` seconds."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+    return receive
+
+
+def test_chat_stops_the_llm_stream_when_the_client_disconnects(app, monkeypatch):
+    produced, closed = [], []
+
+    async def endless_chat(flushes, linger_scores, message, history):
+        try:
+            while True:
+                await asyncio.sleep(0.02)
+                produced.append(1)
+                yield "data: tok\n\n"
+        finally:
+            closed.append(1)
+
+    monkeypatch.setattr(asgi, "achat_about_student", endless_chat)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    body = b'{"assignment_id": "a", "message": "hi"}'
+    start = time.perf_counter()
+    asyncio.run(asyncio.wait_for(
+        app(_scope("POST", "/api/analysis/chat/s1"), _disconnecting_receive(body), send), timeout=2,
+    ))
+    assert time.perf_counter() - start < 1
+    assert closed == [1]
+    assert 0 < len(produced) < 20
+    # No final empty body: the response was abandoned, not completed
+    assert sent[-1].get("more_body") is True
+
+
+def test_events_are_pushed_and_unsubscribed_on_disconnect(app, monkeypatch):
+    from app.services import events
+
+    broker = events.Broker()
+    monkeypatch.setattr(events, "_broker", broker)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        # Ingest publishes from its writer thread while the client is connected
+        loop.call_later(0.05, lambda: threading.Thread(
+            target=broker.publish, args=({"type": "flushes", "course_id": "c1"},),
+        ).start())
+        await app(_scope("GET", "/api/analysis/events", query=b"course_id=c1"), _disconnecting_receive(after=0.3), send)
+
+    asyncio.run(asyncio.wait_for(run(), timeout=2))
+    assert sent[0]["status"] == 200
+    body = b"".join(m.get("body", b"") for m in sent[1:]).decode()
+    assert body.startswith("retry: 3000\n\n")
+    assert 'data: {"type": "flushes", "course_id": "c1"}' in body
+    assert len(broker) == 0
+
+
+def test_events_requires_auth_and_a_filter(app):
+    async def run():
+        async with _client(app) as c:
+            return (
+                await c.get("/api/analysis/events?course_id=c1"),
+                await c.get("/api/analysis/events", headers=AUTH),
+            )
+    no_auth, no_filter = asyncio.run(run())
+    assert no_auth.status_code == 401
+    assert no_filter.status_code == 400
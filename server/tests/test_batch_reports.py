@@ -0,0 +1,165 @@
+"""
+Batch class reports: local prompt preparation, bounded LLM concurrency,
+rate-limit retry and the streamed NDJSON endpoint.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import batch_reports, report_cache
+from app.services.batch_reports import RateGate, StudentInput, generate_with_retry, prepare_inputs, run_batch
+from app.services.report_cache import ReportCache
+from app.services.timeline import StudentTimeline
+
+
+def _row(sid, i):
+    return {
+        "id": f"{sid}-{i:03d}", "profile_id": sid, "assignment_id": "a1",
+        "file_path": "main.c", "active_symbol": "solve", "diffs": "@@ -1,0 +1,1 @@\n+x",
+        "start_timestamp": f"2026-02-01T12:{i:02d}:00+00:00", "end_timestamp": f"2026-02-01T12:{i:02d}:30+00:00",
+        "window_duration": 30.0, "diff_inserted": 1, "diff_deleted": 0, "diff_line_start": 1, "diff_line_end": 1,
+    }
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows, self.keys, self.n = rows, [], None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def order(self, column):
+        self.keys.append(column)
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        class R:
+            data = sorted(self.rows, key=lambda r: tuple(r[k] for k in self.keys))[:self.n]
+        return R()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeQuery(self.rows)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    class response:
+        headers = {"retry-after": "0.05"}
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    c = ReportCache(str(tmp_path))
+    monkeypatch.setattr(report_cache, "_cache", c)
+    with create_app().app_context():
+        yield c
+
+
+def _inputs(n):
+    return [
+        StudentInput(f"s{i}", StudentTimeline.build([_row(f"s{i}", 0)]), [], f"pair{i}", f"fp{i}")
+        for i in range(n)
+    ]
+
+
+def test_prepare_inputs_builds_every_student(cache):
+    rows = [_row("s1", i) for i in range(5)] + [_row("s2", i) for i in range(3)]
+    inputs = prepare_inputs(FakeSupabase(rows), "a1", page_size=100)
+    assert [i.student_id for i in inputs] == ["s1", "s2"]
+    assert [len(i.timeline) for i in inputs] == [5, 3]
+    latest = rows[4]
+    assert inputs[0].fingerprint == report_cache.fingerprint("s1", "a1", 5, latest)
+    assert inputs[0].linger_scores[0].symbol == "solve"
+
+
+def test_concurrency_is_bounded_and_results_cached(cache, monkeypatch):
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0}
+
+    def fake_report(timeline, linger_scores, raise_errors=False):
+        with lock:
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(0.05)
+        with lock:
+            state["in_flight"] -= 1
+        return "report"
+
+    monkeypatch.setattr(batch_reports, "generate_detailed_report", fake_report)
+    inputs = _inputs(12)
+    cache.put("pair0", "fp0", "cached report")
+
+    start = time.perf_counter()
+    events = list(run_batch(inputs, concurrency=4))
+    assert time.perf_counter() - start < 0.5
+    assert state["peak"] == 4
+    assert events[0] == {"student_id": "s0", "report": "cached report", "cached": True}
+    assert {e["student_id"] for e in events[1:]} == {f"s{i}" for i in range(1, 12)}
+    assert cache.get("pair5", "fp5") == ("report", True)
+
+
+def test_rate_limit_retries_and_pauses_all_workers(cache, monkeypatch):
+    calls = []
+
+    def flaky(timeline, linger_scores, raise_errors=False):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RateLimited()
+        return "ok"
+
+    monkeypatch.setattr(batch_reports, "generate_detailed_report", flaky)
+    gate = RateGate()
+    assert generate_with_retry(_inputs(1)[0], gate, backoff_sec=0.01) == "ok"
+    assert len(calls) == 2 and gate.pauses == 1
+
+
+def test_failure_falls_back_to_stale_report(cache, monkeypatch):
+    def broken(timeline, linger_scores, raise_errors=False):
+        raise ValueError("bad request")
+
+    monkeypatch.setattr(batch_reports, "generate_detailed_report", broken)
+    inputs = _inputs(2)
+    cache.put("pair0", "old-fp", "old report")
+    events = {e["student_id"]: e for e in run_batch(inputs, concurrency=2)}
+    assert events["s0"] == {"student_id": "s0", "error": "bad request", "report": "old report", "stale": True}
+    assert events["s1"] == {"student_id": "s1", "error": "bad request"}
+
+
+def test_endpoint_streams_reports_then_narrative(cache, monkeypatch):
+    monkeypatch.setattr(batch_reports, "prepare_inputs", lambda sb, aid, page_size: _inputs(3))
+    monkeypatch.setattr(batch_reports, "generate_detailed_report", lambda t, l, raise_errors=False: "r")
+    monkeypatch.setattr(batch_reports, "generate_class_narrative", lambda struggle: "class is fine")
+    from app.routes import analysis
+    monkeypatch.setattr(analysis, "get_supabase", lambda: None)
+
+    client = create_app().test_client()
+    token = jwt.encode({"sub": "prof"}, "test-secret", algorithm="HS256")
+    resp = client.get("/api/analysis/class/a1/reports", headers={"Authorization": f"Bearer {token}"})
+    assert resp.mimetype == "application/x-ndjson"
+    lines = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    assert sorted(l["student_id"] for l in lines[:-1]) == ["s0", "s1", "s2"]
+    assert lines[-1]["narrative"] == "class is fine"
+    assert lines[-1]["summary"] == {"students": 3, "cached": 0, "generated": 3, "failed": 0}
@@ -0,0 +1,54 @@
+"""
+In-process cache behaviour (LRU order, TTL expiry, counters).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import cache as cache_mod
+from app.services.cache import TTLCache
+
+
+def test_lru_eviction_keeps_recently_used():
+    c = TTLCache(maxsize=2, ttl=None)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.evictions == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set("k", "v")
+    now[0] += 4
+    assert c.get("k") == "v"
+    now[0] += 2
+    assert c.get("k") is None
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+
+def test_invalidation():
+    c = TTLCache(maxsize=10)
+    c.set(("a1", "s1"), 1)
+    c.set(("a1", "s2"), 2)
+    c.set(("a2", "s1"), 3)
+    c.invalidate(("a2", "s1"))
+    assert c.invalidate_where(lambda k: k[0] == "a1") == 2
+    assert len(c) == 0
+
+
+def test_peek_skips_lru_and_counters():
+    c = TTLCache(maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.peek("a") == 1 and c.peek("x") is None
+    c.set("c", 3)  # "a" is still least recently used
+    assert c.peek("a") is None
+    assert c.stats()["hits"] == 0 and c.stats()["misses"] == 0
@@ -0,0 +1,52 @@
+"""
+Ingest-time dedup of client_flush_id in the recently-seen filter.
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.dedup import SeenFilter
+
+
+def test_first_occurrence_in_order():
+    seen = SeenFilter()
+    assert seen.claim(["b", "a", "b", "c", "a"]) == ["b", "a", "c"]
+    assert seen.duplicates == 2
+
+
+def test_retry_is_caught_in_memory():
+    seen = SeenFilter()
+    seen.claim(["a", "b"])
+    assert seen.claim(["a", "b", "c"]) == ["c"]
+    assert seen.duplicates == 2
+
+
+def test_forget_allows_resubmit():
+    seen = SeenFilter()
+    seen.claim(["a"])
+    seen.forget(["a"])
+    assert seen.claim(["a"]) == ["a"]
+
+
+def test_evicted_ids_are_claimed_again():
+    # Past the LRU an old id looks new; the unique index skips it at insert
+    seen = SeenFilter(maxsize=1)
+    seen.claim(["a"])
+    seen.claim(["b"])
+    assert seen.claim(["a"]) == ["a"]
+
+
+def test_concurrent_claims_count_every_duplicate():
+    seen = SeenFilter()
+    ids = [str(i) for i in range(200)]
+    claimed = []
+    threads = [threading.Thread(target=lambda: claimed.extend(seen.claim(ids))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(ids)
+    assert seen.duplicates == 7 * len(ids)
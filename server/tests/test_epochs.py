@@ -0,0 +1,93 @@
+"""
+Epoch columns: analysis and timeline outputs are unchanged whether a row's
+epochs come from the database, are parsed once on first use, or (as before)
+are parsed from the ISO strings every time.
+"""
+
+import copy
+import math
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import columnar
+from app.services.aggregates import fold_flushes
+from app.services.analysis import (
+    compute_current_focus,
+    compute_linger_scores,
+    flushes_to_edit_regions,
+    _normalize_symbol,
+)
+from app.services.epochs import parse_epoch
+from app.services.timeline import StudentTimeline
+from bench.seed_corpus import load_seed_students
+
+
+def _iso_epoch(s):
+    return datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp()
+
+
+def _reference_focus(regions, window_minutes=30):
+    """compute_current_focus as it was, parsing end_time strings per region."""
+    latest = max(_iso_epoch(r.end_time) for r in regions)
+    focus = {}
+    for r in regions:
+        decay = math.exp(-((latest - _iso_epoch(r.end_time)) / 60.0) / window_minutes)
+        key = (r.file_path, _normalize_symbol(r.symbol))
+        focus[key] = focus.get(key, 0) + r.duration_sec * decay
+    return sorted(((k, round(v, 2)) for k, v in focus.items()), key=lambda kv: -kv[1])
+
+
+@pytest.fixture(scope="module")
+def seed_students():
+    students = load_seed_students()
+    if not students:
+        pytest.skip("seed_data corpus not found")
+    return students
+
+
+def _with_db_epochs(rows):
+    # What PostgREST returns with the 011 generated columns selected
+    return [dict(r, start_epoch=_iso_epoch(r["start_timestamp"]), end_epoch=_iso_epoch(r["end_timestamp"])) for r in rows]
+
+
+def test_parse_epoch():
+    assert parse_epoch("2026-02-01T12:00:00Z") == 1769947200.0
+    assert parse_epoch("2026-02-01T12:00:00.500+00:00") == 1769947200.5
+    assert parse_epoch("not a time") == 0.0
+    assert parse_epoch(None) == 0.0
+
+
+def test_rows_are_parsed_once():
+    row = {"file_path": "a.c", "start_timestamp": "2026-02-01T12:00:00Z", "end_timestamp": "2026-02-01T12:00:10Z"}
+    region, = flushes_to_edit_regions([row])
+    assert row["end_epoch"] == region.end_epoch == 1769947210.0
+    row["end_timestamp"] = "garbage"  # the cached epoch wins from now on
+    assert flushes_to_edit_regions([row])[0].end_epoch == 1769947210.0
+
+
+def test_focus_matches_string_parsing(seed_students):
+    for rows in seed_students.values():
+        for variant in (copy.deepcopy(rows), _with_db_epochs(rows)):
+            regions = flushes_to_edit_regions(variant)
+            focus = [((f.file_path, f.symbol), f.weighted_time) for f in compute_current_focus(regions)]
+            assert focus == _reference_focus(regions)
+            if columnar.available():
+                assert columnar.compute_current_focus(regions) == compute_current_focus(regions)
+
+
+def test_linger_and_aggregates_unchanged(seed_students):
+    for rows in seed_students.values():
+        parsed, from_db = copy.deepcopy(rows), _with_db_epochs(rows)
+        assert compute_linger_scores(flushes_to_edit_regions(parsed)) == \
+            compute_linger_scores(flushes_to_edit_regions(from_db))
+        assert fold_flushes(parsed) == fold_flushes(from_db)
+
+
+def test_timeline_unchanged(seed_students):
+    for rows in seed_students.values():
+        assert StudentTimeline.build(copy.deepcopy(rows)).text == StudentTimeline.build(_with_db_epochs(rows)).text
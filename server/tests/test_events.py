@@ -0,0 +1,148 @@
+"""
+SSE ingest deltas: batch delta contents, filtered fan-out, resync on
+overflow, the file relay between workers, the streamed endpoint and the
+async stream used under ASGI.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import events
+from app.services.aggregates import fold_flushes
+from app.services.events import Broker, FileRelay, batch_delta
+from app.services.ingest import IngestBatch
+from bench.seed_corpus import load_seed_students
+
+
+def _batch(assignment_id="a1", course_id="c1", profile_id="s1", n=5):
+    rows = [dict(f) for f in next(iter(load_seed_students().values()))[:n]]
+    return IngestBatch(profile_id, assignment_id, course_id, rows)
+
+
+def _drain(sub):
+    return [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+
+
+def test_delta_sums_match_the_aggregate_fold():
+    batch = _batch(n=20)
+    delta = batch_delta(batch)
+    assert (delta["profile_id"], delta["assignment_id"], delta["course_id"]) == ("s1", "a1", "c1")
+    assert delta["flushes"] == len(batch.rows)
+    assert sum(s["visits"] for s in delta["symbols"]) == len(batch.rows)
+    aggs = fold_flushes(batch.rows)
+    assert [(s["file_path"], s["symbol"], s["inserted"], s["deleted"]) for s in delta["symbols"]] == [
+        (a.file_path, a.symbol, a.chars_inserted, a.chars_deleted) for a in aggs.values()
+    ]
+    json.dumps(delta)
+
+
+def test_fan_out_is_filtered_by_course_and_assignment():
+    broker = Broker()
+    by_assignment = broker.subscribe(assignment_id="a1")
+    by_course = broker.subscribe(course_id="c1")
+    other = broker.subscribe(assignment_id="a2")
+    broker.publish({"type": "flushes", "assignment_id": "a1", "course_id": "c1"})
+    broker.publish({"type": "flushes", "assignment_id": "a3", "course_id": "c1"})
+    assert by_assignment.queue.qsize() == 1
+    assert by_course.queue.qsize() == 2
+    assert other.queue.empty()
+
+
+def test_slow_subscriber_gets_a_resync_instead_of_blocking():
+    broker = Broker(queue_size=3)
+    sub = broker.subscribe(assignment_id="a1")
+    for i in range(5):
+        broker.publish({"type": "flushes", "assignment_id": "a1", "n": i})
+    assert _drain(sub) == [{"type": "resync"}, {"type": "flushes", "assignment_id": "a1", "n": 4}]
+    assert broker.resyncs == 1
+
+
+def test_stream_unsubscribes_when_closed():
+    broker = Broker()
+    sub = broker.subscribe(assignment_id="a1")
+    stream = broker.stream(sub, heartbeat_sec=0.01)
+    assert next(stream).startswith("retry:")
+    assert next(stream) == ": keepalive\n\n"
+    broker.publish({"type": "flushes", "assignment_id": "a1"})
+    assert json.loads(next(stream)[len("data: "):]) == {"type": "flushes", "assignment_id": "a1"}
+    stream.close()
+    assert len(broker) == 0
+
+
+def test_file_relay_fans_out_across_workers(tmp_path):
+    path = str(tmp_path / "relay.jsonl")
+    workers = [Broker() for _ in range(2)]
+    for b in workers:
+        b.relay = FileRelay(path, b.deliver, poll_sec=3600, max_bytes=400)
+    try:
+        subs = [b.subscribe(assignment_id="a1") for b in workers]
+        for i in range(6):
+            workers[0].publish({"type": "flushes", "assignment_id": "a1", "n": i})
+            workers[1].relay.poll()
+        workers[0].relay.poll()
+        # Each worker delivers its own events once, and the other's via the file
+        assert [e["n"] for e in _drain(subs[0])] == list(range(6))
+        assert [e["n"] for e in _drain(subs[1])] == list(range(6))
+        assert os.path.exists(path + ".1")
+        assert workers[0].relay.received == 0 and workers[1].relay.received == 6
+    finally:
+        for b in workers:
+            b.relay.close()
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    b = Broker()
+    monkeypatch.setattr(events, "_broker", b)
+    return b
+
+
+def test_endpoint_streams_published_batches(broker):
+    from app.routes import extensions
+
+    app = create_app()
+    client = app.test_client()
+    token = jwt.encode({"sub": "prof"}, "test-secret", algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/analysis/events", headers=headers).status_code == 400
+
+    resp = client.get("/api/analysis/events?course_id=c1", headers=headers, buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    body = iter(resp.response)
+    assert next(body).startswith(b"retry:")
+    assert len(broker) == 1
+
+    with app.app_context():
+        extensions._publish_delta(_batch(course_id="c2"))
+        extensions._publish_delta(_batch(course_id="c1"))
+    line = next(body).decode()
+    assert json.loads(line[len("data: "):])["course_id"] == "c1"
+    resp.close()
+    assert len(broker) == 0
+
+
+def test_async_stream_wakes_on_delivery_and_sends_keepalives():
+    broker = Broker()
+    sub = broker.subscribe(assignment_id="a1")
+
+    async def run():
+        stream = broker.astream(sub, heartbeat_sec=0.05)
+        out = [await stream.__anext__(), await stream.__anext__()]
+        threading.Thread(target=broker.publish, args=({"type": "flushes", "assignment_id": "a1"},)).start()
+        out.append(await asyncio.wait_for(stream.__anext__(), 1))
+        await stream.aclose()
+        return out
+
+    retry, keepalive, data = asyncio.run(run())
+    assert retry.startswith("retry:") and keepalive == ": keepalive\n\n"
+    assert json.loads(data[len("data: "):]) == {"type": "flushes", "assignment_id": "a1"}
+    assert len(broker) == 0 and sub.wakeup is None
@@ -0,0 +1,54 @@
+"""
+Concurrent query fan-out and latency histograms.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services.fanout import gather
+from app.services.latency import Histogram
+
+
+@pytest.fixture
+def app_ctx():
+    with create_app().app_context():
+        yield
+
+
+def test_gather_runs_concurrently_in_order(app_ctx):
+    def slow(v):
+        return lambda: (time.sleep(0.1), v)[1]
+
+    start = time.perf_counter()
+    assert gather(slow(1), slow(2), slow(3)) == [1, 2, 3]
+    assert time.perf_counter() - start < 0.25
+
+
+def test_gather_reraises_first_error_after_all_finish(app_ctx):
+    done = []
+
+    def boom(msg):
+        def f():
+            raise ValueError(msg)
+        return f
+
+    with pytest.raises(ValueError, match="a"):
+        gather(boom("a"), lambda: (time.sleep(0.05), done.append(1)), boom("c"))
+    assert done == [1]
+
+
+def test_histogram_percentiles():
+    h = Histogram(buckets=(10, 100))
+    for ms in [1, 2, 3, 50, 500]:
+        h.observe(ms)
+    s = h.stats()
+    assert s["count"] == 5
+    assert s["buckets"] == {"<=10": 3, "<=100": 1, ">100": 1}
+    assert s["p50_ms"] == 10
+    assert s["p95_ms"] == 500
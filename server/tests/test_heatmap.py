@@ -0,0 +1,171 @@
+"""
+Class struggle heatmap: matrix layout and scaling, per-assignment caching
+and coalesced invalidation by the ingest listener.
+"""
+
+import os
+import sys
+import threading
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import heatmap
+from app.services.analysis import ClassSymbolScore, SymbolScore, compute_class_struggle
+from app.services.cache import TTLCache
+from app.services.heatmap import build_heatmap
+from app.services.ingest import IngestBatch
+
+
+def _score(symbol, linger, file_path="main.c"):
+    return SymbolScore(file_path, symbol, linger, 10.0, 1.0, 1)
+
+
+def _struggle(*symbols):
+    return [ClassSymbolScore(s, 1.0, 1, 1.0, 1.0) for s in symbols]
+
+
+def test_matrix_is_dense_scaled_and_row_major():
+    scores = {
+        "s1": [_score("solve", 50.0), _score("parse", 10.0)],
+        "s2": [_score("parse", 25.0), _score("other", 99.0)],
+        "s3": [],
+    }
+    h = build_heatmap(scores, _struggle("solve", "parse"))
+    assert h.students == ["s1", "s2", "s3"]
+    assert h.symbols == ["solve", "parse"]
+    assert h.max_linger == 50.0
+    assert list(h.cells) == [100, 20, 0, 50, 0, 0]
+    assert h.to_json()["shape"] == [3, 2]
+
+
+def test_best_linger_per_symbol_across_files():
+    scores = {"s1": [_score("solve", 4.0, "a.c"), _score("Solve", 8.0, "b.c")]}
+    assert list(build_heatmap(scores, _struggle("solve")).cells) == [100]
+
+
+def test_top_six_struggle_symbols():
+    symbols = [f"f{i}" for i in range(10)]
+    scores = {f"s{i}": [_score(sym, float(j + i)) for j, sym in enumerate(symbols)] for i in range(3)}
+    struggle = compute_class_struggle(list(scores.values()))
+    h = build_heatmap(scores, struggle)
+    assert h.symbols == [s.symbol for s in struggle[:6]]
+    assert len(h.cells) == 3 * 6
+
+
+def test_empty_class():
+    h = build_heatmap({}, [])
+    assert h.to_json() == {"students": [], "symbols": [], "shape": [0, 0], "cells": [], "max_linger": 0.0}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(heatmap, "_cache", TTLCache(ttl=None))
+    monkeypatch.setattr(heatmap, "_inflight", {})
+    from app.routes import analysis
+    calls = []
+
+    def fake_score_class(sb, assignment_id):
+        calls.append(assignment_id)
+        return iter([("s1", [_score("solve", 5.0 * len(calls))]), ("s2", [_score("solve", 2.5)])])
+
+    monkeypatch.setattr(analysis, "_score_class", fake_score_class)
+    monkeypatch.setattr(analysis, "get_supabase", lambda: None)
+    c = create_app().test_client()
+    token = jwt.encode({"sub": "prof"}, "test-secret", algorithm="HS256")
+    c.get_heatmap = lambda aid: c.get(f"/api/analysis/class/{aid}/heatmap", headers={"Authorization": f"Bearer {token}"})
+    c.calls = calls
+    return c
+
+
+def test_endpoint_is_cached_until_ingest(client, monkeypatch):
+    from app.routes import analysis, extensions
+
+    monkeypatch.setattr(analysis, "get_setting", lambda section, key, default=None: 0 if key == "max_stale_sec" else default)
+
+    first = client.get_heatmap("a1").get_json()["data"]
+    assert first["cells"] == [100, 50] and first["symbols"] == ["solve"]
+    assert client.get_heatmap("a1").get_json()["data"] == first
+    assert client.calls == ["a1"]
+
+    extensions._invalidate_heatmap(IngestBatch("s9", "other", "c1", []))
+    client.get_heatmap("a1")
+    assert client.calls == ["a1"]
+
+    extensions._invalidate_heatmap(IngestBatch("s1", "a1", "c1", []))
+    second = client.get_heatmap("a1").get_json()["data"]
+    assert client.calls == ["a1", "a1"]
+    assert second["max_linger"] == 10.0 and second["cells"] == [100, 25]
+
+
+def test_stale_matrix_is_served_until_max_stale(client):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return build_heatmap({"s1": [_score("solve", float(len(calls)))]}, _struggle("solve"))
+
+    assert heatmap.get_heatmap("a1", compute, max_stale=60).max_linger == 1.0
+    # A burst of ingests within max_stale: still the cached matrix, no rescoring
+    for _ in range(5):
+        heatmap.invalidate("a1")
+        assert heatmap.get_heatmap("a1", compute, max_stale=60).max_linger == 1.0
+    assert calls == [1]
+    # Past max_stale (0 here) the stale matrix is recomputed once, then fresh
+    assert heatmap.get_heatmap("a1", compute, max_stale=0).max_linger == 2.0
+    assert heatmap.get_heatmap("a1", compute, max_stale=0).max_linger == 2.0
+    assert calls == [1, 1]
+
+
+def test_ingest_during_compute_is_cached_stale(client):
+    def compute():
+        heatmap.invalidate("a1")
+        return build_heatmap({}, [])
+
+    heatmap.get_heatmap("a1", compute)
+    assert heatmap.get_cache().peek("a1").stale
+    assert heatmap._inflight == {}
+
+
+def test_overlapping_computes_track_their_own_invalidation(client):
+    started = {name: threading.Event() for name in "ab"}
+    release = {name: threading.Event() for name in "ab"}
+    errors = []
+
+    def run(name):
+        def compute():
+            started[name].set()
+            release[name].wait(2)
+            return build_heatmap({name: [_score("solve", 1.0)]}, _struggle("solve"))
+        try:
+            heatmap.get_heatmap("a1", compute)
+        except Exception as e:
+            errors.append(e)
+
+    a = threading.Thread(target=run, args=("a",))
+    a.start()
+    started["a"].wait(2)
+    b = threading.Thread(target=run, args=("b",))
+    b.start()
+    started["b"].wait(2)
+
+    # b finishes first; the ingest that follows only affects a, still running
+    release["b"].set()
+    b.join()
+    heatmap.invalidate("a1")
+    release["a"].set()
+    a.join()
+
+    assert errors == []
+    entry = heatmap.get_cache().peek("a1")
+    assert entry.heatmap.students == ["a"] and entry.stale
+    assert heatmap._inflight == {}
+
+
+def test_invalidating_uncached_assignments_keeps_no_state(client):
+    for i in range(100):
+        heatmap.invalidate(f"a{i}")
+    assert heatmap._inflight == {} and len(heatmap.get_cache()) == 0
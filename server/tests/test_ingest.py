@@ -0,0 +1,144 @@
+"""
+Write-behind ingest queue against a fake PostgREST writer.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import ingest
+from app.services.ingest import BatchTooLarge, FlushWriter, IngestBatch, IngestQueue, InsertError, QueueFull
+
+
+class FakeWriter:
+    def __init__(self, fail_times=0, reject_marker=None):
+        self.calls = []
+        self.fail_times = fail_times
+        self.reject_marker = reject_marker
+        self.stored = set()
+        self.lock = threading.Lock()
+
+    def insert(self, rows):
+        """Like PostgREST with ignore-duplicates: returns the ids written."""
+        with self.lock:
+            if self.reject_marker and any(r.get("bad") for r in rows):
+                raise InsertError(400, "bad row")
+            new = {r["client_flush_id"] for r in rows} - self.stored
+            self.stored |= new
+            if self.fail_times:
+                # The rows committed, but the response never arrived
+                self.fail_times -= 1
+                raise InsertError(503, "unavailable")
+            self.calls.append(list(rows))
+            return new
+
+
+def _batch(n, pid="p1", **extra):
+    return IngestBatch(pid, "a1", "c1", [dict(i=i, client_flush_id=f"{pid}-{i}", **extra) for i in range(n)])
+
+
+def _wait_for(pred, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def listener_log(monkeypatch):
+    seen = []
+    monkeypatch.setattr(ingest, "_listeners", [seen.append])
+    return seen
+
+
+def test_coalesces_batches_into_one_insert(listener_log):
+    writer = FakeWriter()
+    q = IngestQueue(writer, batch_rows=100, linger_sec=0.2)
+    for pid in ("p1", "p2", "p3"):
+        q.submit(_batch(10, pid))
+    assert _wait_for(lambda: len(listener_log) == 3)
+    assert len(writer.calls) == 1 and len(writer.calls[0]) == 30
+    assert q.stats()["written_rows"] == 30
+
+
+def test_rejects_when_full():
+    q = IngestQueue(FakeWriter(), max_rows=15, linger_sec=5, retry_after=7)
+    q.submit(_batch(10))
+    with pytest.raises(QueueFull) as exc:
+        q.submit(_batch(10))
+    assert exc.value.retry_after == 7
+    assert q.stats()["rejected_batches"] == 1
+
+
+def test_retries_transient_failures(listener_log):
+    writer = FakeWriter(fail_times=2)
+    q = IngestQueue(writer, linger_sec=0, backoff_sec=0.01)
+    q.submit(_batch(5))
+    assert _wait_for(lambda: len(listener_log) == 1)
+    assert q.stats()["retries"] == 2 and q.stats()["written_rows"] == 5
+    # The first attempt committed: listeners still get the whole batch once
+    assert len(writer.stored) == 5 and len(listener_log[0].rows) == 5
+
+
+def test_rows_already_stored_skip_the_listeners(listener_log):
+    writer = FakeWriter()
+    writer.stored = {"p1-0", "p1-1", "p2-0", "p2-1", "p2-2"}
+    q = IngestQueue(writer, batch_rows=100, linger_sec=0.1)
+    q.submit(_batch(3, "p1"))
+    q.submit(_batch(3, "p2"))
+    assert _wait_for(lambda: q.stats()["inserts"] == 1)
+    assert _wait_for(lambda: len(listener_log) == 1)
+    assert [r["client_flush_id"] for r in listener_log[0].rows] == ["p1-2"]
+    assert q.stats()["written_rows"] == 1 and q.stats()["duplicate_rows"] == 5
+
+
+def test_bad_batch_does_not_sink_the_others(listener_log):
+    writer = FakeWriter(reject_marker=True)
+    q = IngestQueue(writer, batch_rows=100, linger_sec=0.2)
+    q.submit(_batch(3, "good1"))
+    q.submit(_batch(3, "bad", bad=True))
+    q.submit(_batch(3, "good2"))
+    assert _wait_for(lambda: q.stats()["dropped_rows"] == 3 and len(listener_log) == 2)
+    assert sorted(b.profile_id for b in listener_log) == ["good1", "good2"]
+
+
+def test_batch_larger_than_capacity_is_rejected_outright():
+    q = IngestQueue(FakeWriter(), max_rows=15, linger_sec=5)
+    with pytest.raises(BatchTooLarge) as exc:
+        q.submit(_batch(16))
+    assert exc.value.max_rows == 15
+    assert q.stats()["pending_rows"] == 0
+
+
+def test_drain_writes_queued_batches(listener_log):
+    writer = FakeWriter(fail_times=1)
+    q = IngestQueue(writer, batch_rows=1000, linger_sec=60, backoff_sec=0.01)
+    q.submit(_batch(5, "p1"))
+    q.submit(_batch(5, "p2"))
+    # Without the drain the writer would linger for a minute
+    assert q.drain(timeout=3)
+    assert [b.profile_id for b in listener_log] == ["p1", "p2"]
+    assert q.stats()["pending_rows"] == 0 and q.stats()["written_rows"] == 10
+    assert q.drain(timeout=0)
+
+
+def test_writer_skips_rows_already_stored():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(201, json=[])
+
+    client = httpx.Client(base_url="http://db/rest/v1", transport=httpx.MockTransport(handler))
+    assert FlushWriter(client).insert([{"client_flush_id": "a"}]) == set()
+    (req,) = seen
+    assert req.url.params["on_conflict"] == "client_flush_id"
+    assert "resolution=ignore-duplicates" in req.headers["Prefer"]
@@ -0,0 +1,219 @@
+"""
+Live class struggle: the sliding window agrees with the batch computation
+over the same flushes, slides as time passes and is fed by ingest.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import live_struggle
+from app.services.analysis import compute_class_struggle
+from app.services.cache import TTLCache
+from app.services.epochs import end_epoch
+from app.services.ingest import IngestBatch
+from app.services.live_struggle import LiveStruggle
+from app.services.scoring import score_student
+from bench.seed_corpus import load_seed_students
+
+
+@pytest.fixture(scope="module")
+def class_rows():
+    """Seed students with ids, stamped onto one shared timeline."""
+    out = {}
+    for sid, rows in load_seed_students().items():
+        out[sid] = [dict(f, id=f"{sid}-{i}", profile_id=sid) for i, f in enumerate(rows)]
+    return out
+
+
+def _batch_struggle(class_rows, now, minutes):
+    cutoff = now - minutes * 60
+    scores = []
+    for rows in class_rows.values():
+        live = [f for f in rows if cutoff < end_epoch(f) <= now]
+        if live:
+            scores.append(score_student(live))
+    return compute_class_struggle(scores)
+
+
+def _live(class_rows, now, minutes=(30, 60)):
+    live = LiveStruggle(minutes)
+    for sid, rows in class_rows.items():
+        live.add(sid, [f for f in rows if end_epoch(f) <= now], now)
+    return live
+
+
+def test_matches_batch_over_the_window(class_rows):
+    latest = max(end_epoch(f) for rows in class_rows.values() for f in rows)
+    for now in (latest, latest - 3600, latest - 7200):
+        live = _live(class_rows, now)
+        for minutes in (30, 60):
+            snap = live.snapshot(minutes, now)
+            assert snap["struggle_topics"] == _batch_struggle(class_rows, now, minutes)
+
+
+def test_window_slides_and_empties(class_rows):
+    latest = max(end_epoch(f) for rows in class_rows.values() for f in rows)
+    start = latest - 90 * 60
+    live = _live(class_rows, start)
+    for step in range(1, 5):
+        now = start + step * 15 * 60
+        for sid, rows in class_rows.items():
+            live.add(sid, [f for f in rows if now - 15 * 60 < end_epoch(f) <= now], now)
+        got = live.snapshot(30, now)["struggle_topics"]
+        want = _batch_struggle(class_rows, now, 30)
+        assert [(s.symbol, s.student_count) for s in got] == [(s.symbol, s.student_count) for s in want]
+        for g, w in zip(got, want):
+            assert g.struggle_index == pytest.approx(w.struggle_index, abs=0.02)
+
+    snap = live.snapshot(60, latest + 3601)
+    assert snap["struggle_topics"] == [] and snap["flush_count"] == 0 and snap["student_count"] == 0
+    assert live.windows[60].students == {}
+
+
+def test_duplicate_flushes_count_once(class_rows):
+    sid, rows = next(iter(class_rows.items()))
+    now = end_epoch(rows[-1])
+    live = LiveStruggle((60,))
+    live.add(sid, rows, now)
+    once = live.snapshot(60, now)
+    live.add(sid, rows, now)
+    assert live.snapshot(60, now) == once
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows, self.keys = rows, []
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def gt(self, column, value):
+        self.rows = [r for r in self.rows if r[column] > value]
+        return self
+
+    def order(self, column):
+        self.keys.append(column)
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        class R:
+            data = sorted(self.rows, key=lambda r: tuple(r[k] for k in self.keys))[:self.n]
+        return R()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeQuery(self.rows)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(live_struggle, "_cache", TTLCache(ttl=None))
+    return create_app()
+
+
+def test_endpoint_loads_window_then_follows_ingest(app, monkeypatch, class_rows):
+    from app.routes import analysis, extensions
+
+    now = time.time()
+    # Re-date two students' last flushes into the last few minutes
+    rows = []
+    for sid in list(class_rows)[:2]:
+        for i, f in enumerate(class_rows[sid][-3:]):
+            end = now - 60 * (3 - i)
+            rows.append(dict(f, assignment_id="a1", end_epoch=end, start_epoch=end - 30, client_flush_id=f["id"]))
+    old = dict(rows[0], id="old", client_flush_id="old", end_epoch=now - 7200)
+    monkeypatch.setattr(analysis, "get_supabase", lambda: FakeSupabase(rows + [old]))
+
+    client = app.test_client()
+    token = jwt.encode({"sub": "prof"}, "test-secret", algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    data = client.get("/api/analysis/class/a1/live?window=30", headers=headers).get_json()["data"]
+    assert data["window_minutes"] == 30
+    assert data["flush_count"] == len(rows) and data["student_count"] == 2
+
+    third = list(class_rows)[2]
+    new = [dict(class_rows[third][-1], client_flush_id="new", end_epoch=now - 1, start_epoch=now - 11)]
+    with app.app_context():
+        extensions._update_live_struggle(IngestBatch(third, "a1", "c1", new))
+        extensions._update_live_struggle(IngestBatch(third, "a1", "c1", new))
+    data = client.get("/api/analysis/class/a1/live", headers=headers).get_json()["data"]
+    assert data["flush_count"] == len(rows) + 1 and data["student_count"] == 3
+
+    assert client.get("/api/analysis/class/a1/live?window=7", headers=headers).status_code == 400
+
+
+def _recent_rows(class_rows, now, students=2):
+    rows = []
+    for sid in list(class_rows)[:students]:
+        for i, f in enumerate(class_rows[sid][-3:]):
+            end = now - 60 * (3 - i)
+            rows.append(dict(f, assignment_id="a1", end_epoch=end, start_epoch=end - 30, client_flush_id=f["id"]))
+    return rows
+
+
+def test_batch_ingested_during_load_is_kept(app, class_rows):
+    now = time.time()
+    rows = _recent_rows(class_rows, now)
+    third = list(class_rows)[2]
+    new = dict(class_rows[third][-1], client_flush_id="new", end_epoch=now - 1, start_epoch=now - 11)
+
+    class IngestMidScan(FakeSupabase):
+        def table(self, name):
+            # The batch lands after the scan's snapshot, before the state is ready
+            live_struggle.apply(third, "a1", [new])
+            return super().table(name)
+
+    with app.app_context():
+        live = live_struggle.get_live(IngestMidScan(rows), "a1")
+    snap = live.snapshot(30)
+    assert snap["flush_count"] == len(rows) + 1 and snap["student_count"] == 3
+
+
+def test_concurrent_first_reads_load_once(app, class_rows):
+    rows = _recent_rows(class_rows, time.time())
+    scans = []
+
+    class SlowSupabase(FakeSupabase):
+        def table(self, name):
+            scans.append(name)
+            time.sleep(0.05)
+            return super().table(name)
+
+    sb = SlowSupabase(rows)
+    got = []
+
+    def read():
+        with app.app_context():
+            got.append(live_struggle.get_live(sb, "a1"))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(live) for live in got}) == 1 and len(got) == 8
+    assert got[0].snapshot(30)["flush_count"] == len(rows)
+    # One keyset scan: a full page, then the empty page that ends it
+    assert len(scans) <= 2
+    assert len(live_struggle._loading) == 0
@@ -0,0 +1,115 @@
+"""
+Per-user membership cache behind /api/courses/my and connect-info.
+"""
+
+import copy
+import os
+import sys
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import membership
+
+
+def _course(cid, name, aids):
+    return {"id": cid, "name": name, "code": name.lower(),
+            "assignments": [{"id": a, "course_id": cid} for a in aids]}
+
+
+TABLES = {
+    "profiles": [{"utln": "jdoe01"}],
+    "courses": [dict(_course("c1", "CS15", ["a1"]), created_at="2026-01-01")],
+    "enrollments": [{"enrolled_at": "2026-01-02", "courses": _course("c2", "CS40", ["a2", "a3"])}],
+    "teaching_assistants": [{"assigned_at": "2026-01-03", "courses": _course("c1", "CS15", ["a1"])}],
+}
+
+
+class FakeQuery:
+    def __init__(self, sb, name):
+        self.sb, self.name = sb, name
+
+    def __getattr__(self, attr):
+        return lambda *a, **k: self
+
+    def execute(self):
+        self.sb.queries += 1
+        self.data = copy.deepcopy(TABLES[self.name])
+        return self
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.queries = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app.routes import courses, extensions
+
+    sb = FakeSupabase()
+    monkeypatch.setattr(courses, "get_supabase", lambda: sb)
+    monkeypatch.setattr(extensions, "get_supabase", lambda: sb)
+    app = create_app()
+    with app.app_context():
+        membership.get_cache().clear()
+    client = app.test_client()
+    token = jwt.encode({"sub": "u1"}, "test-secret", algorithm="HS256")
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    client.sb = sb
+    return client
+
+
+def test_courses_my_roles(client):
+    data = client.get("/api/courses/my").get_json()["data"]
+    assert [(d["role"], d["course"]["id"]) for d in data] == [
+        ("student", "c2"), ("assistant", "c1"), ("professor", "c1"),
+    ]
+    assert data[0]["enrolled_at"] == "2026-01-02"
+    assert data[1]["assigned_at"] == "2026-01-03"
+    assert data[2]["course"] == {"id": "c1", "name": "CS15", "code": "cs15", "created_at": "2026-01-01"}
+
+
+def test_connect_info_dedups_courses(client):
+    body = client.get("/api/extensions/connect-info").get_json()
+    assert body["utln"] == "jdoe01"
+    assert [c["id"] for c in body["courses"]] == ["c1", "c2"]
+    assert [a["id"] for a in body["assignments"]] == ["a1", "a2", "a3"]
+
+
+def test_second_call_costs_no_queries(client):
+    client.get("/api/courses/my")
+    first = client.sb.queries
+    assert first == 4
+    client.get("/api/extensions/connect-info")
+    client.get("/api/courses/my")
+    assert client.sb.queries == first
+    client.get("/api/courses/my?refresh=1")
+    assert client.sb.queries == 2 * first
+
+
+def test_invalidation_hooks(client):
+    client.get("/api/courses/my")
+    with client.application.app_context():
+        assert membership.invalidate_course("c9") == 0
+        assert membership.invalidate_course("c2") == 1
+        client.get("/api/courses/my")
+        membership.invalidate_user("u1")
+        assert membership.get_cache().get("u1") is None
+
+
+def test_has_role():
+    m = membership.Membership("u1", "jdoe01", [
+        membership.CourseRole(membership.STUDENT, {"id": "c2"}),
+        membership.CourseRole(membership.ASSISTANT, {"id": "c1"}),
+    ])
+    assert m.has_role("c1")
+    assert m.has_role("c1", membership.ASSISTANT, membership.PROFESSOR)
+    assert not m.has_role("c2", membership.PROFESSOR)
+    assert m.course_ids(membership.STUDENT) == {"c2"}
@@ -0,0 +1,165 @@
+"""
+Keyset pagination against an in-memory stand-in for the PostgREST builder.
+"""
+
+import json
+import os
+import sys
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.paging import decode_cursor, encode_cursor, iter_keyset, iter_groups, keyset_filter
+
+
+class FakeQuery:
+    """Implements just the builder calls iter_keyset makes."""
+
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+        self.after = None
+        self.keys = []
+        self.n = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def or_(self, filters):
+        self.after = filters
+        return self
+
+    def order(self, column):
+        self.keys.append(column)
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        self.log.append(self.after)
+        rows = sorted(self.rows, key=lambda r: tuple(r[k] for k in self.keys))
+        if self.after:
+            # Parse back the cursor we generated: k1.gt."v1",and(...k2.gt."v2")
+            v1 = self.after.split('"')[1]
+            v2 = self.after.split('"')[-2]
+            rows = [r for r in rows if (r[self.keys[0]], r[self.keys[1]]) > (v1, v2)]
+
+        class R:
+            data = rows[:self.n]
+        return R()
+
+
+def test_keyset_filter_quotes_values():
+    f = keyset_filter(("start_timestamp", "id"), ("2026-02-01T12:00:00+00:00", "abc"))
+    assert f == 'start_timestamp.gt."2026-02-01T12:00:00+00:00",and(start_timestamp.eq."2026-02-01T12:00:00+00:00",id.gt."abc")'
+
+
+def test_iter_keyset_visits_every_row_once_in_order():
+    rows = [{"profile_id": f"p{i % 7}", "id": f"{i:04d}"} for i in range(53)]
+    log = []
+    got = list(iter_keyset(lambda: FakeQuery(rows, log), ("profile_id", "id"), page_size=10))
+    assert len(got) == 53
+    assert got == sorted(rows, key=lambda r: (r["profile_id"], r["id"]))
+    assert len(log) == 6  # 5 full pages + 1 short page
+
+    groups = list(iter_groups(iter(got), "profile_id"))
+    assert [g for g, _ in groups] == [f"p{i}" for i in range(7)]
+    assert sum(len(rs) for _, rs in groups) == 53
+
+
+def test_keyset_filter_escapes_backslashes_before_quotes():
+    f = keyset_filter(("start_timestamp", "id"), ('x\\"', "abc"))
+    assert f.startswith('start_timestamp.gt."x\\\\\\"",')
+
+
+def test_cursor_round_trip():
+    row = {"start_timestamp": "2026-02-01T12:00:00+00:00", "id": "6f1c0e9a-8a4b-4c61-9a57-3d5b2f0e4c11"}
+    keys = ("start_timestamp", "id")
+    token = encode_cursor(row, keys)
+    assert "=" not in token and "/" not in token
+    assert decode_cursor(token, keys) == (row["start_timestamp"], row["id"])
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", keys)
+
+
+@pytest.mark.parametrize("values", [
+    ['2026-02-01T12:00:00+00:00\\",id.gt.', "6f1c0e9a-8a4b-4c61-9a57-3d5b2f0e4c11"],
+    ["2026-02-01T12:00:00+00:00", 'x",id.neq."'],
+    ["2026-02-01T12:00:00+00:00", 7],
+    [1, 2, 3],
+])
+def test_cursor_values_must_match_key_types(values):
+    token = encode_cursor(dict(zip(("start_timestamp", "id"), values)), ("start_timestamp", "id"))
+    with pytest.raises(ValueError):
+        decode_cursor(token, ("start_timestamp", "id"))
+
+
+def test_iter_keyset_resumes_after_cursor():
+    rows = [{"profile_id": "p", "id": f"{i:04d}"} for i in range(25)]
+    got = list(iter_keyset(lambda: FakeQuery(rows, []), ("profile_id", "id"), page_size=10, cursor=("p", "0009")))
+    assert [r["id"] for r in got] == [f"{i:04d}" for i in range(10, 25)]
+
+
+def _id(i):
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+
+class TestStudentFlushesEndpoint:
+    ROWS = [
+        {"profile_id": "s1", "assignment_id": "a1", "id": _id(i),
+         "start_timestamp": f"2026-02-01T12:{i // 2:02d}:00+00:00"}
+        for i in range(23)
+    ] + [{"profile_id": "s2", "assignment_id": "a1", "id": _id(9999), "start_timestamp": "2026-02-01T12:00:00+00:00"}]
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        from app import create_app
+        from app.routes import flushes
+
+        class FakeSupabase:
+            def table(_, name):
+                return FakeQuery(self.ROWS, [])
+
+        monkeypatch.setattr(flushes, "get_supabase", lambda: FakeSupabase())
+        app = create_app()
+        app.config["flushes"] = {"page_size": 10}
+        token = jwt.encode({"sub": "prof"}, "test-secret", algorithm="HS256")
+        client = app.test_client()
+        client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return client
+
+    def test_full_listing_is_streamed_as_one_array(self, client):
+        resp = client.get("/api/flushes/student/s1")
+        assert resp.is_streamed
+        data = resp.get_json()["data"]
+        assert [r["id"] for r in data] == [_id(i) for i in range(23)]
+
+    def test_limit_and_after_walk_all_pages(self, client):
+        seen, after = [], None
+        while True:
+            url = "/api/flushes/student/s1?assignment_id=a1&limit=7" + (f"&after={after}" if after else "")
+            body = client.get(url).get_json()
+            seen.extend(r["id"] for r in body["data"])
+            after = body["next"]
+            if after is None:
+                break
+        assert seen == [_id(i) for i in range(23)]
+
+    def test_ndjson_stream(self, client):
+        resp = client.get("/api/flushes/student/s1", headers={"Accept": "application/x-ndjson"})
+        assert resp.mimetype == "application/x-ndjson"
+        lines = resp.get_data(as_text=True).splitlines()
+        assert [json.loads(l)["id"] for l in lines] == [_id(i) for i in range(23)]
+
+    def test_bad_limit_and_cursor(self, client):
+        assert client.get("/api/flushes/student/s1?limit=0").status_code == 400
+        assert client.get("/api/flushes/student/s1?limit=11").status_code == 400
+        assert client.get("/api/flushes/student/s1?after=zzz").status_code == 400
@@ -0,0 +1,60 @@
+"""
+Flush projections only name columns that exist and cover what the
+computations read.
+"""
+
+import glob
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import queries
+from app.services.analysis import flushes_to_edit_regions
+from app.services.llm import _preprocess_flushes_for_llm
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), "..", "..", "supabase", "migrations")
+
+ROW = {
+    "id": "1", "profile_id": "p", "assignment_id": "a", "file_path": "f.c",
+    "client_flush_id": "c", "sequence_number": 0, "content_hash": "0" * 64, "trigger": "timeout",
+    "start_timestamp": "2026-02-01T12:00:00Z", "end_timestamp": "2026-02-01T12:00:10Z",
+    "diffs": "@@ -1,0 +1,1 @@\n+x", "snapshot": "x\n", "active_symbol": "main", "metrics": {},
+    "created_at": "2026-02-01T12:00:10Z", "window_duration": 10.0,
+    "start_epoch": 1769947200.0, "end_epoch": 1769947210.0,
+    "diff_inserted": 1, "diff_deleted": 0, "diff_line_start": 1, "diff_line_end": 1,
+}
+
+
+def _flush_columns() -> set[str]:
+    sql = ""
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS, "*.sql"))):
+        with open(path) as f:
+            sql += f.read()
+    table = re.search(r"create table public\.flushes \((.*?)\n\);", sql, re.S).group(1)
+    cols = set(re.findall(r'^\s+"?([a-z_]+)"?\s+[a-z]', table, re.M))
+    cols.update(re.findall(r"add column (?:if not exists )?([a-z_]+)", sql))
+    return cols
+
+
+def test_projection_columns_exist():
+    known = _flush_columns()
+    assert set(ROW) <= known
+    for name, spec in queries.SPECS.items():
+        if spec.table == "flushes":
+            assert set(spec.columns) <= known, name
+
+
+def _project(name):
+    return [{c: ROW[c] for c in queries.spec(name).columns}]
+
+
+def test_scoring_projection_is_sufficient():
+    for name in ("analysis.class", "aggregates.rebuild"):
+        assert flushes_to_edit_regions(_project(name)) == flushes_to_edit_regions([ROW])
+
+
+def test_timeline_projection_is_sufficient():
+    assert _preprocess_flushes_for_llm(_project("analysis.timeline")) == _preprocess_flushes_for_llm([ROW])
+    assert "snapshot" not in queries.spec("analysis.timeline").columns
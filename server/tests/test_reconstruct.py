@@ -0,0 +1,223 @@
+"""
+Snapshot-anchored file reconstruction against a fake flushes table.
+
+Patches below are verbatim createTwoFilesPatch output from the extension's
+diff library.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.cache import TTLCache
+from app.services.reconstruct import PatchError, apply_patch, content_hash, reconstruct
+
+HEADER = "Index: f.c\n===================================================================\n--- f.c\n+++ f.c\n"
+
+
+class TestApplyPatch:
+    def test_insert_middle(self):
+        old = "int main() {\n    return 0;\n}\n"
+        patch = HEADER + "@@ -1,3 +1,4 @@\n int main() {\n+    int x = 1;\n     return 0;\n }\n"
+        assert apply_patch(old, patch) == "int main() {\n    int x = 1;\n    return 0;\n}\n"
+
+    def test_from_empty(self):
+        patch = HEADER + "@@ -0,0 +1,2 @@\n+a\n+b\n"
+        assert apply_patch("", patch) == "a\nb\n"
+
+    def test_no_newline_on_old_side(self):
+        old = "b\n\nreturn 0;\na\n}\n{\n}\nreturn 0;"
+        patch = HEADER + (
+            "@@ -1,8 +1,1 @@\n-b\n \n-return 0;\n-a\n-}\n-{\n-}\n-return 0;\n"
+            "\\ No newline at end of file\n"
+        )
+        assert apply_patch(old, patch) == "\n"
+
+    def test_no_newline_on_new_side(self):
+        patch = HEADER + "@@ -1,1 +1,2 @@\n \n+}\n\\ No newline at end of file\n"
+        assert apply_patch("\n", patch) == "\n}"
+
+    def test_no_hunks_is_identity(self):
+        assert apply_patch("x\n", HEADER) == "x\n"
+
+    def test_context_mismatch_raises(self):
+        patch = HEADER + "@@ -1,1 +1,1 @@\n-nope\n+yes\n"
+        with pytest.raises(PatchError):
+            apply_patch("other\n", patch)
+
+    def test_headerless_diff_raises(self):
+        with pytest.raises(PatchError):
+            apply_patch("", "+assert add(2, 3) == 5")
+
+
+class FakeQuery:
+    def __init__(self, sb):
+        self.sb = sb
+        self.preds = []
+        self.desc = False
+        self.n = None
+        self.negate = False
+
+    def select(self, cols):
+        return self
+
+    def _add(self, pred):
+        if self.negate:
+            self.negate = False
+            self.preds.append(lambda r: not pred(r))
+        else:
+            self.preds.append(pred)
+        return self
+
+    def eq(self, col, v):
+        return self._add(lambda r: r[col] == v)
+
+    def lte(self, col, v):
+        return self._add(lambda r: r[col] <= v)
+
+    def gte(self, col, v):
+        return self._add(lambda r: r[col] >= v)
+
+    def gt(self, col, v):
+        return self._add(lambda r: r[col] > v)
+
+    def is_(self, col, v):
+        assert v == "null"
+        return self._add(lambda r: r[col] is None)
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def order(self, col, desc=False):
+        self.desc = desc
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        self.sb.queries += 1
+        rows = [r for r in self.sb.rows if all(p(r) for p in self.preds)]
+        rows.sort(key=lambda r: r["sequence_number"], reverse=self.desc)
+        self.sb.fetched += len(rows) if self.n is None else min(self.n, len(rows))
+
+        class R:
+            data = rows[: self.n] if self.n is not None else rows
+        return R()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+        self.fetched = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def _chain(n, snapshot_every=5):
+    """n flushes, each appending one line; snapshots every snapshot_every."""
+    rows, content = [], ""
+    for seq in range(n):
+        line_no = content.count("\n")
+        patch = HEADER + f"@@ -{line_no},0 +{line_no + 1},1 @@\n+line {seq}\n"
+        content = content + f"line {seq}\n"
+        rows.append({
+            "profile_id": "p", "assignment_id": "a", "file_path": "f.c",
+            "sequence_number": seq,
+            "content_hash": content_hash(content),
+            "diffs": patch,
+            "snapshot": content if seq % snapshot_every == 0 else None,
+            "end_timestamp": f"2026-02-01T12:{seq:02d}:00Z",
+        })
+    return rows
+
+
+def _expected(seq):
+    return "".join(f"line {i}\n" for i in range(seq + 1))
+
+
+def test_replays_from_nearest_snapshot():
+    sb = FakeSupabase(_chain(23))
+    r = reconstruct(sb, "p", "a", "f.c", 18, cache=TTLCache(100, ttl=None))
+    assert r.content == _expected(18)
+    assert r.verified
+    assert (r.anchor, r.anchor_sequence, r.replayed) == ("snapshot", 15, 3)
+
+
+def test_scrubbing_forward_uses_cached_states():
+    sb = FakeSupabase(_chain(23))
+    cache = TTLCache(100, ttl=None)
+    reconstruct(sb, "p", "a", "f.c", 16, cache=cache)
+    r = reconstruct(sb, "p", "a", "f.c", 18, cache=cache)
+    assert r.content == _expected(18)
+    assert (r.anchor, r.anchor_sequence, r.replayed) == ("cache", 16, 2)
+
+    queries = sb.queries
+    again = reconstruct(sb, "p", "a", "f.c", 17, cache=cache)
+    assert again.content == _expected(17)
+    assert sb.queries == queries
+
+
+def test_hash_mismatch_is_reported_and_not_cached():
+    rows = _chain(4, snapshot_every=100)
+    rows[2]["content_hash"] = "0" * 64
+    cache = TTLCache(100, ttl=None)
+    r = reconstruct(FakeSupabase(rows), "p", "a", "f.c", 3, cache=cache)
+    assert r.content == _expected(3)
+    assert not r.verified
+    assert cache.get(("p", "a", "f.c", 1)) == _expected(1)
+    assert cache.get(("p", "a", "f.c", 2)) is None
+
+
+def test_unknown_sequence():
+    assert reconstruct(FakeSupabase(_chain(3)), "p", "a", "f.c", 9, cache=TTLCache(10, ttl=None)) is None
+
+
+def test_repeated_sequence_keeps_the_first_row():
+    rows = _chain(6, snapshot_every=100)
+    # A re-sent flush under a new client_flush_id, diffed against a newer state
+    rows.insert(3, dict(rows[2], diffs=HEADER + "@@ -9,0 +10,1 @@\n+stale\n"))
+    rows.insert(4, dict(rows[3]))
+    r = reconstruct(FakeSupabase(rows), "p", "a", "f.c", 5, cache=TTLCache(100, ttl=None))
+    assert r.content == _expected(5)
+    assert r.verified and r.replayed == 5
+
+
+def test_repeated_snapshot_sequence_anchors_on_the_snapshot():
+    rows = _chain(8, snapshot_every=5)
+    # The copy without a snapshot comes first at the snapshot's sequence
+    rows.insert(5, dict(rows[5], snapshot=None))
+    r = reconstruct(FakeSupabase(rows), "p", "a", "f.c", 7, cache=TTLCache(100, ttl=None))
+    assert r.content == _expected(7)
+    assert r.verified
+    assert (r.anchor, r.anchor_sequence, r.replayed) == ("snapshot", 5, 2)
+
+
+def test_cache_probe_does_not_walk_every_sequence():
+    sb = FakeSupabase(_chain(400, snapshot_every=1000))
+    cache = TTLCache(1000, ttl=None)
+    reconstruct(sb, "p", "a", "f.c", 10, cache=cache)
+    misses = cache.misses
+    r = reconstruct(sb, "p", "a", "f.c", 399, cache=cache)
+    assert (r.anchor, r.anchor_sequence, r.replayed) == ("cache", 10, 389)
+    # One miss for the target itself, none for the 388 sequences in between
+    assert cache.misses - misses == 1
+
+
+def test_evicted_states_fall_back_to_older_ones():
+    sb = FakeSupabase(_chain(30, snapshot_every=1000))
+    cache = TTLCache(5, ttl=None)
+    reconstruct(sb, "p", "a", "f.c", 20, cache=cache)   # caches 16..20
+    cache.invalidate(("p", "a", "f.c", 20))
+    cache.invalidate(("p", "a", "f.c", 19))
+    r = reconstruct(sb, "p", "a", "f.c", 25, cache=cache)
+    assert r.content == _expected(25)
+    assert (r.anchor, r.anchor_sequence) == ("cache", 18)
@@ -0,0 +1,79 @@
+"""
+Compact region store: same linger output as the EditRegion path,
+and the fused hunk fold agrees with aggregate_hunks over every seed diff.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import columnar
+from app.services.analysis import (
+    EditRegion,
+    aggregate_hunks,
+    compute_current_focus,
+    compute_linger_scores,
+    flushes_to_edit_regions,
+    fold_hunk_stats,
+    iter_hunk_stats,
+)
+from app.services.aggregates import linger_from_aggregates
+from app.services.regions import RegionStore
+from bench.seed_corpus import all_seed_diffs, load_seed_students
+
+
+@pytest.fixture(scope="module")
+def seed_students():
+    return load_seed_students()
+
+
+def _without_stats(flushes):
+    """Rows as they were before the diff_* columns, so diffs get parsed."""
+    return [{k: v for k, v in f.items() if not k.startswith("diff_") or k == "diffs"} for f in flushes]
+
+
+def test_fold_matches_aggregate_of_hunks():
+    for d in all_seed_diffs() + ["", "no hunks here", "@@ -1 +5 @@", "x\n@@ -1 +2 @@\n+a\n@@ -9 +1 @@\n-bb\n"]:
+        assert fold_hunk_stats(d) == aggregate_hunks(iter_hunk_stats(d))
+
+
+def test_store_matches_edit_regions(seed_students):
+    for flushes in seed_students.values():
+        for rows in (flushes, _without_stats(flushes)):
+            regions = flushes_to_edit_regions(rows)
+            store = RegionStore.from_flushes(rows)
+            assert len(store) == len(regions)
+            assert linger_from_aggregates(store.aggregates()) == compute_linger_scores(regions)
+
+
+def test_symbols_are_interned_after_normalizing(seed_students):
+    first = next(iter(seed_students.values()))[0]
+    rows = [dict(first, active_symbol=s) for s in ["Solve", " solve ", "solve", None, ""]]
+    store = RegionStore.from_flushes(rows)
+    assert store.symbols == ["solve", "(unknown)"]
+    assert list(store.symbol_id) == [0, 0, 0, 1, 1]
+
+
+def test_empty_store():
+    store = RegionStore()
+    assert store.aggregates() == []
+    assert linger_from_aggregates(store.aggregates()) == []
+
+
+def test_slotted_regions_have_no_dict(seed_students):
+    region = flushes_to_edit_regions(next(iter(seed_students.values())))[0]
+    assert isinstance(region, EditRegion)
+    assert not hasattr(region, "__dict__")
+
+
+def test_columnar_accepts_store(seed_students):
+    pytest.importorskip("numpy")
+    for flushes in seed_students.values():
+        store = RegionStore.from_flushes(flushes)
+        regions = flushes_to_edit_regions(flushes)
+        assert columnar.compute_linger_scores(store) == compute_linger_scores(regions)
+        assert columnar.compute_current_focus(store) == compute_current_focus(regions)
+    assert columnar.compute_linger_scores(RegionStore()) == []
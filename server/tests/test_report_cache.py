@@ -0,0 +1,139 @@
+"""
+Report cache: fingerprint hits, stale-while-revalidate, LRU on disk.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import report_cache
+from app.services.report_cache import ReportCache, cached_report
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    c = ReportCache(str(tmp_path), max_entries=3)
+    monkeypatch.setattr(report_cache, "_cache", c)
+    with create_app().app_context():
+        yield c
+
+
+@pytest.fixture
+def fingerprint(monkeypatch):
+    """Mutable fingerprint per student; None means no flushes."""
+    current = {}
+    monkeypatch.setattr(report_cache, "report_fingerprint", lambda sb, sid, aid: current.get(sid))
+    return current
+
+
+def _generator(reports):
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return reports[len(calls) - 1]
+    return generate, calls
+
+
+def _wait_for(pred, timeout=2.0):
+    deadline = time.time() + timeout
+    while not pred():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_hit_skips_generation(cache, fingerprint):
+    fingerprint["s1"] = "fp1"
+    generate, calls = _generator(["r1"])
+    assert cached_report(None, "s1", "a", generate) == "r1"
+    assert cached_report(None, "s1", "a", generate) == "r1"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_no_flushes_returns_none(cache, fingerprint):
+    generate, calls = _generator([])
+    assert cached_report(None, "idle", "a", generate) is None
+    assert calls == []
+
+
+def test_new_flushes_serve_stale_then_refresh(cache, fingerprint):
+    fingerprint["s1"] = "fp1"
+    generate, calls = _generator(["r1", "r2"])
+    cached_report(None, "s1", "a", generate)
+
+    fingerprint["s1"] = "fp2"
+    assert cached_report(None, "s1", "a", generate) == "r1"
+    _wait_for(lambda: cache.get(report_cache.pair_key("s1", "a"), "fp2") == ("r2", True))
+    assert cached_report(None, "s1", "a", generate) == "r2"
+    assert len(calls) == 2
+
+
+def test_miss_generates_on_the_calling_thread(cache, fingerprint):
+    fingerprint["s1"] = "fp1"
+    threads = []
+
+    def generate():
+        threads.append(threading.current_thread())
+        return "r1"
+
+    assert cached_report(None, "s1", "a", generate) == "r1"
+    assert threads == [threading.current_thread()]
+    assert report_cache._inflight == {}
+
+
+def test_max_age_marks_entries_stale(cache, fingerprint):
+    cache.max_age = 0
+    cache.put("p", "fp", "old")
+    assert cache.get("p", "fp") == ("old", False)
+
+
+def test_lru_eviction(cache):
+    for i in range(3):
+        cache.put(f"p{i}", f"fp{i}", f"r{i}")
+        os.utime(cache._entry_path(f"fp{i}"), (i, i))
+    cache.get("p0", "fp0")  # bump fp0 above fp1
+    cache.put("p3", "fp3", "r3")
+    assert len(cache) == 3
+    assert cache._read("fp1") is None
+    assert cache._read("fp0")["report"] == "r0"
+    assert cache.evictions == 1
+
+
+def test_placeholders_are_not_cached(cache, fingerprint):
+    fingerprint["s1"] = "fp1"
+    generate, calls = _generator(["(LLM unavailable)", "r1"])
+    assert cached_report(None, "s1", "a", generate) == "(LLM unavailable)"
+    assert cached_report(None, "s1", "a", generate) == "r1"
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_generate_once(cache, fingerprint):
+    fingerprint["s1"] = "fp1"
+    calls = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return "r1"
+
+    app = create_app()
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(cached_report(None, "s1", "a", generate))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["r1"] * 8
+    assert calls == [1]
@@ -0,0 +1,185 @@
+"""
+LLM session timeline: incremental extension matches a full rebuild and only
+re-renders the open session.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import create_app
+from app.services import timeline as tl
+from app.services.analysis import SymbolScore
+from app.services.timeline import StudentTimeline
+
+T0 = datetime(2026, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _flush(minute, file="a.c", symbol="main", diff="@@ -1,0 +1,1 @@\n+x"):
+    start = T0 + timedelta(minutes=minute)
+    return {
+        "file_path": file, "active_symbol": symbol, "diffs": diff,
+        "start_timestamp": start.isoformat().replace("+00:00", "Z"),
+        "end_timestamp": (start + timedelta(seconds=40)).isoformat().replace("+00:00", "Z"),
+    }
+
+
+# Three sessions: minutes 0-10, 60-70, 200-203
+FLUSHES = (
+    [_flush(m, symbol="main" if m % 2 else "parse") for m in range(0, 11)]
+    + [_flush(m, file="b.c", diff="@@ -1,1 +1,1 @@\n-y\n+z") for m in range(60, 71)]
+    + [_flush(m) for m in range(200, 204)]
+)
+
+
+def test_sessions_and_totals():
+    t = StudentTimeline.build(FLUSHES)
+    assert t.session_count == 3
+    assert len(t) == len(FLUSHES)
+    assert t.total_time == 40 * len(FLUSHES)
+    assert "=== Session 3 ===" in t.text
+    assert "b.c → main:" in t.text
+
+
+def test_empty_timeline():
+    t = StudentTimeline.build([])
+    assert not t
+    assert t.text == tl.NO_ACTIVITY
+
+
+def test_incremental_matches_rebuild():
+    t = StudentTimeline()
+    for i in range(0, len(FLUSHES), 3):
+        assert t.extend(FLUSHES[i:i + 3])
+        assert t.text == StudentTimeline.build(FLUSHES[:i + 3]).text
+
+
+def test_only_open_session_is_rerendered(monkeypatch):
+    t = StudentTimeline.build(FLUSHES)
+    t.text
+    rendered = []
+    real = tl.render_session
+    monkeypatch.setattr(tl, "render_session", lambda i, s: rendered.append(i) or real(i, s))
+    for m in range(204, 208):
+        t.extend([_flush(m)])
+        t.text
+    assert rendered == [2, 2, 2, 2]
+
+
+def test_out_of_order_flush_invalidates():
+    with create_app().app_context():
+        cache = tl.get_cache()
+        cache.clear()
+        cache.set(("s", "a"), StudentTimeline.build(FLUSHES))
+        tl.extend_cached("s", "a", [_flush(205)])
+        assert len(cache.get(("s", "a"))) == len(FLUSHES) + 1
+        tl.extend_cached("s", "a", [_flush(5)])
+        assert cache.get(("s", "a")) is None
+
+
+def _ids(flushes):
+    return [dict(f, client_flush_id=f"c{i}") for i, f in enumerate(flushes)]
+
+
+class FakeSupabase:
+    """Serves the timeline read; on_read runs mid-read, like a concurrent ingest."""
+
+    def __init__(self, rows, on_read=None):
+        self.rows, self.on_read, self.reads = rows, on_read, 0
+
+    def table(self, name):
+        return self
+
+    def select(self, *a, **kw):
+        return self
+
+    def eq(self, *a):
+        return self
+
+    def order(self, *a, **kw):
+        return self
+
+    def execute(self):
+        self.reads += 1
+        rows = list(self.rows)
+        if self.on_read is not None:
+            self.on_read()
+
+        class R:
+            data = rows
+        return R()
+
+
+def test_listener_after_load_keeps_rows_once():
+    rows = _ids(FLUSHES)
+    with create_app().app_context():
+        tl.get_cache().clear()
+        t = tl.get_timeline(FakeSupabase(rows), "s", "a")
+        # The read already returned the batch the listener now applies
+        tl.extend_cached("s", "a", rows[-2:])
+        assert len(t) == len(rows)
+        assert t.text == StudentTimeline.build(FLUSHES).text
+
+
+def test_batch_ingested_during_load_is_not_missed():
+    rows = _ids(FLUSHES)
+    late = dict(_flush(205), client_flush_id="late")
+    with create_app().app_context():
+        tl.get_cache().clear()
+        sb = FakeSupabase(rows[:-1], on_read=lambda: tl.extend_cached("s", "a", [rows[-1], late]))
+        t = tl.get_timeline(sb, "s", "a")
+        assert len(t) == len(rows) + 1
+        assert t.text == StudentTimeline.build(FLUSHES + [late]).text
+        assert tl.get_timeline(sb, "s", "a") is t and sb.reads == 1
+
+
+def test_seed_merges_batches_recorded_during_a_bulk_read():
+    rows = _ids(FLUSHES)
+    late = dict(_flush(205), client_flush_id="late")
+    with create_app().app_context():
+        cache = tl.get_cache()
+        cache.clear()
+        with tl.recording_ingest("a") as recorded:
+            tl.extend_cached("s", "a", [rows[-1], late])   # before its group is seeded
+            timeline = StudentTimeline.build(rows)
+            tl.seed("s", "a", timeline, rows, recorded)
+        assert len(timeline) == len(rows)
+        assert len(cache.get(("s", "a"))) == len(rows) + 1
+        assert tl._recordings == {}
+
+
+def _long_history(sessions=60):
+    flushes = []
+    for s in range(sessions):
+        base = s * 120
+        symbol = "compress" if s == 7 else f"helper{s}"
+        flushes += [_flush(base + m, file=f"f{s % 5}.c", symbol=symbol) for m in range(8)]
+    return flushes
+
+
+def test_budget_not_needed_keeps_full_text():
+    t = StudentTimeline.build(FLUSHES)
+    b = t.budgeted(100_000)
+    assert b.text == t.text
+    assert b.saved_tokens == 0 and b.summarized == 0
+
+
+def test_budget_compresses_low_signal_sessions_first():
+    t = StudentTimeline.build(_long_history())
+    linger = [SymbolScore("f2.c", "compress", 9.0, 600, 3.0, 8)]
+    b = t.budgeted(1500, linger)
+    assert b.tokens <= 1500 < b.full_tokens
+    assert b.saved_tokens == b.full_tokens - b.tokens
+    assert b.sessions == 60 and b.summarized == 58
+    # The struggle session and the latest one keep their detail
+    assert "f2.c → compress:\n    Time: 320s, Visits: 8" in b.text
+    assert "=== Session 60 ===\n" in b.text
+    assert "(summarized)" in b.text
+
+
+def test_budget_is_a_hard_limit():
+    t = StudentTimeline.build(_long_history())
+    for budget in (400, 50, 5):
+        assert tl.count_tokens(t.budgeted(budget).text) <= budget
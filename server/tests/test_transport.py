@@ -0,0 +1,111 @@
+"""
+Shared PostgREST pool against a local keep-alive HTTP server.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.ingest import FlushWriter, InsertError
+from app.services.transport import PooledSupabase, make_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.seen.append(("GET", self.path, self.headers.get("apikey")))
+        if self.path.endswith("/slow"):
+            time.sleep(0.2)
+        self._reply(200, [{"id": 1}])
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        rows = json.loads(self.rfile.read(length))
+        self.server.seen.append(("POST", self.path, self.headers.get("Prefer")))
+        if any(r.get("bad") for r in rows):
+            return self._reply(400, {})
+        self._reply(201, [{"client_flush_id": r["client_flush_id"]} for r in rows])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.seen = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}", srv
+    srv.shutdown()
+
+
+KEY = jwt.encode({"role": "service_role"}, "secret", algorithm="HS256")
+
+
+def _pool(url, **kw):
+    return make_client(url + "/rest/v1", {"apikey": KEY, "Authorization": f"Bearer {KEY}"}, **kw)
+
+
+def test_connections_are_reused(server):
+    url, srv = server
+    pool = _pool(url, http2=False)
+    for _ in range(5):
+        pool.get("/profiles")
+    s = pool.stats()
+    assert s["requests"] == 5
+    assert s["connects"] == 1
+    assert s["reuse_ratio"] == 0.8
+    assert s["in_use"] == 0
+
+
+def test_supabase_and_ingest_share_the_pool(server):
+    url, srv = server
+    pool = _pool(url, http2=False)
+    sb = PooledSupabase(url, KEY, pool)
+    assert sb.table("profiles").select("id").eq("id", "1").execute().data == [{"id": 1}]
+
+    writer = FlushWriter(pool)
+    assert writer.insert([{"client_flush_id": "a"}]) == {"a"}
+    with pytest.raises(InsertError):
+        writer.insert([{"bad": 1}])
+
+    assert [m for m, _, _ in srv.seen] == ["GET", "POST", "POST"]
+    assert srv.seen[0][1].startswith("/rest/v1/profiles?")
+    assert srv.seen[0][2] == KEY
+    assert srv.seen[1][1:] == (
+        "/rest/v1/flushes?on_conflict=client_flush_id&select=client_flush_id",
+        "return=representation,resolution=ignore-duplicates",
+    )
+    assert pool.stats()["requests"] == 3
+    assert pool.stats()["connects"] == 1
+
+
+def test_waits_counted_when_pool_is_exhausted(server):
+    url, _ = server
+    pool = _pool(url, pool_size=1, http2=False)
+    threads = [threading.Thread(target=pool.get, args=("/slow",)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    s = pool.stats()
+    assert s["waits"] == 1
+    assert s["peak_in_use"] == 2
+    assert s["connects"] == 1
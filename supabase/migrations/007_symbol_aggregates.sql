@@ -0,0 +1,79 @@
+-- Symbol aggregates: running per-student linger totals, maintained at ingest.
+-- One row per (profile, assignment, file, normalized symbol) so the analysis
+-- endpoints read O(symbols) rows instead of replaying every flush.
+create table public.symbol_aggregates (
+    profile_id uuid not null references public.profiles(id) on delete cascade,
+    assignment_id uuid not null references public.assignments(id) on delete cascade,
+    file_path text not null,
+
+    -- Normalized symbol (lower/trimmed, '(unknown)' when missing)
+    symbol text not null,
+
+    dwell_time double precision not null default 0,
+    visits integer not null default 0,
+    chars_inserted bigint not null default 0,
+    chars_deleted bigint not null default 0,
+
+    -- Dwell from active flushes only (window < 5 min and non-empty diff)
+    active_time double precision not null default 0,
+
+    -- Recency-decayed dwell (30 min window), valid as of focus_epoch.
+    -- Current focus = focus_weight * exp(-(latest - focus_epoch) / 1800)
+    focus_weight double precision not null default 0,
+    focus_epoch double precision not null default 0,
+
+    updated_at timestamptz default now(),
+    primary key (profile_id, assignment_id, file_path, symbol)
+);
+
+create index idx_symbol_aggregates_assignment on public.symbol_aggregates(assignment_id);
+
+alter table public.symbol_aggregates enable row level security;
+
+-- Fold a batch of per-key deltas into the aggregates in one statement.
+-- Keys within a batch must be unique (the server pre-folds them).
+create or replace function public.apply_symbol_aggregates(deltas jsonb)
+returns void
+language sql
+as $$
+    insert into public.symbol_aggregates as a (
+        profile_id, assignment_id, file_path, symbol,
+        dwell_time, visits, chars_inserted, chars_deleted,
+        active_time, focus_weight, focus_epoch
+    )
+    select
+        d.profile_id, d.assignment_id, d.file_path, d.symbol,
+        d.dwell_time, d.visits, d.chars_inserted, d.chars_deleted,
+        d.active_time, d.focus_weight, d.focus_epoch
+    from jsonb_to_recordset(deltas) as d(
+        profile_id uuid,
+        assignment_id uuid,
+        file_path text,
+        symbol text,
+        dwell_time double precision,
+        visits integer,
+        chars_inserted bigint,
+        chars_deleted bigint,
+        active_time double precision,
+        focus_weight double precision,
+        focus_epoch double precision
+    )
+    on conflict (profile_id, assignment_id, file_path, symbol) do update set
+        dwell_time = a.dwell_time + excluded.dwell_time,
+        visits = a.visits + excluded.visits,
+        chars_inserted = a.chars_inserted + excluded.chars_inserted,
+        chars_deleted = a.chars_deleted + excluded.chars_deleted,
+        active_time = a.active_time + excluded.active_time,
+        -- Rebase both weights onto the later epoch before adding
+        -- (clamped so exp() never underflows)
+        focus_weight = case
+            when excluded.focus_epoch >= a.focus_epoch then
+                a.focus_weight * exp(greatest((a.focus_epoch - excluded.focus_epoch) / 1800.0, -700))
+                + excluded.focus_weight
+            else
+                a.focus_weight
+                + excluded.focus_weight * exp(greatest((excluded.focus_epoch - a.focus_epoch) / 1800.0, -700))
+        end,
+        focus_epoch = greatest(a.focus_epoch, excluded.focus_epoch),
+        updated_at = now();
+$$;
@@ -0,0 +1,4 @@
+-- Keyset pagination for class analysis: stream an assignment's flushes
+-- grouped by student (ORDER BY profile_id, id) without sorting in memory
+create index idx_flushes_assignment_profile
+    on public.flushes(assignment_id, profile_id, id);
@@ -0,0 +1,9 @@
+-- Diff stats computed once at ingest (all hunks of the flush aggregated),
+-- so analysis never has to ship or re-parse the diff text.
+-- NULL on rows ingested before this column existed; readers fall back to
+-- parsing `diffs` for those.
+alter table public.flushes
+    add column diff_inserted integer,
+    add column diff_deleted integer,
+    add column diff_line_start integer,
+    add column diff_line_end integer;
@@ -0,0 +1,10 @@
+-- Keyset pagination for /api/flushes/student: a student's timeline ordered
+-- by (start_timestamp, id), with or without an assignment filter.
+-- Supersedes idx_flushes_profile (profile_id, start_timestamp).
+drop index if exists public.idx_flushes_profile;
+
+create index idx_flushes_profile_timeline
+    on public.flushes(profile_id, start_timestamp, id);
+
+create index idx_flushes_profile_assignment_timeline
+    on public.flushes(profile_id, assignment_id, start_timestamp, id);
@@ -0,0 +1,11 @@
+-- Float epoch copies of the flush timestamps. Analysis and prompt building
+-- read these numbers instead of parsing two ISO strings per row on every
+-- request (server/app/services/epochs.py).
+-- extract(epoch from timestamptz) is only STABLE, which generated columns
+-- reject; the interval since to_timestamp(0) gives the same value and is
+-- IMMUTABLE.
+alter table public.flushes
+    add column if not exists start_epoch double precision
+        generated always as (extract(epoch from start_timestamp - to_timestamp(0))) stored,
+    add column if not exists end_epoch double precision
+        generated always as (extract(epoch from end_timestamp - to_timestamp(0))) stored;
@@ -0,0 +1,35 @@
+-- Per-(profile, assignment) marker: the symbol aggregates were rebuilt from
+-- the student's full flush history at least once. Aggregates written before
+-- the marker exists (e.g. by ingest of a student whose older flushes predate
+-- symbol_aggregates) are partial, so the server rebuilds until it is set.
+create table public.symbol_aggregate_backfills (
+    profile_id uuid not null references public.profiles(id) on delete cascade,
+    assignment_id uuid not null references public.assignments(id) on delete cascade,
+    backfilled_at timestamptz not null default now(),
+    primary key (profile_id, assignment_id)
+);
+
+alter table public.symbol_aggregate_backfills enable row level security;
+
+-- Replace one student's aggregates and set the marker in one transaction,
+-- so an apply_symbol_aggregates() call can never land between the delete
+-- and the re-insert.
+create or replace function public.rebuild_symbol_aggregates(
+    p_profile_id uuid,
+    p_assignment_id uuid,
+    deltas jsonb
+)
+returns void
+language plpgsql
+as $$
+begin
+    delete from public.symbol_aggregates
+    where profile_id = p_profile_id and assignment_id = p_assignment_id;
+
+    perform public.apply_symbol_aggregates(deltas);
+
+    insert into public.symbol_aggregate_backfills (profile_id, assignment_id)
+    values (p_profile_id, p_assignment_id)
+    on conflict (profile_id, assignment_id) do update set backfilled_at = now();
+end;
+$$;
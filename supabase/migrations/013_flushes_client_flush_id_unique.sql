@@ -0,0 +1,28 @@
+-- One row per client_flush_id. Ingest inserts with
+-- on_conflict=client_flush_id and resolution=ignore-duplicates, so a retried
+-- bulk insert (e.g. after a timeout the database had already committed)
+-- skips rows it already wrote instead of duplicating them.
+-- Supersedes idx_flushes_client_flush_id.
+
+-- Remove duplicates written before the constraint, keeping the first copy.
+-- Their students' aggregates counted the duplicates: drop the backfill
+-- marker so the server rebuilds them (012_symbol_aggregate_backfill.sql).
+with ranked as (
+    select id, profile_id, assignment_id,
+           row_number() over (partition by client_flush_id order by created_at, id) as n
+    from public.flushes
+),
+removed as (
+    delete from public.flushes f
+    using ranked r
+    where f.id = r.id and r.n > 1
+    returning f.profile_id, f.assignment_id
+)
+delete from public.symbol_aggregate_backfills b
+using (select distinct profile_id, assignment_id from removed) d
+where b.profile_id = d.profile_id and b.assignment_id = d.assignment_id;
+
+alter table public.flushes
+    add constraint flushes_client_flush_id_key unique (client_flush_id);
+
+drop index if exists public.idx_flushes_client_flush_id;
@@ -0,0 +1,91 @@
+-- Which flushes symbol_aggregates already counts, so an ingest delta and a
+-- backfill rebuild never count the same flush twice or drop it.
+--
+-- The server folds a rebuild from a read of the student's flushes (legacy
+-- rows need Python to parse their diffs), outside any transaction shared
+-- with ingest. Both sides take a per-(profile, assignment) lock and consult
+-- this flag:
+--   * ingest applies a batch's deltas only if it flips its flushes to
+--     aggregated (a rebuild that read them already did);
+--   * a rebuild changes nothing and returns false if a flush it did not
+--     read is already aggregated; the server reads again.
+-- Existing rows count as aggregated; new rows start out false.
+alter table public.flushes add column aggregated boolean not null default true;
+alter table public.flushes alter column aggregated set default false;
+
+create or replace function public.lock_symbol_aggregates(p_profile_id uuid, p_assignment_id uuid)
+returns void
+language sql
+as $$
+    select pg_advisory_xact_lock(hashtextextended(p_profile_id::text || '/' || p_assignment_id::text, 0));
+$$;
+
+-- Ingest: fold one batch's pre-folded deltas, unless a rebuild already
+-- counted its flushes. Returns whether the deltas were applied.
+create or replace function public.apply_flush_aggregates(
+    p_profile_id uuid,
+    p_assignment_id uuid,
+    p_flush_ids uuid[],
+    deltas jsonb
+)
+returns boolean
+language plpgsql
+as $$
+declare
+    flipped integer;
+begin
+    perform public.lock_symbol_aggregates(p_profile_id, p_assignment_id);
+
+    update public.flushes set aggregated = true
+    where client_flush_id = any(p_flush_ids) and not aggregated;
+    get diagnostics flipped = row_count;
+    if flipped = 0 then
+        return false;
+    end if;
+
+    perform public.apply_symbol_aggregates(deltas);
+    return true;
+end;
+$$;
+
+-- Backfill: replace one student's aggregates with deltas folded from the
+-- flushes p_flush_ids, mark those flushes and set the backfill marker.
+-- Returns false without changing anything when ingest already counted a
+-- flush missing from the read (see above).
+create or replace function public.rebuild_symbol_aggregates(
+    p_profile_id uuid,
+    p_assignment_id uuid,
+    p_flush_ids uuid[],
+    deltas jsonb
+)
+returns boolean
+language plpgsql
+as $$
+begin
+    perform public.lock_symbol_aggregates(p_profile_id, p_assignment_id);
+
+    if exists (
+        select 1 from public.flushes
+        where profile_id = p_profile_id and assignment_id = p_assignment_id
+          and aggregated and not (client_flush_id = any(p_flush_ids))
+    ) then
+        return false;
+    end if;
+
+    delete from public.symbol_aggregates
+    where profile_id = p_profile_id and assignment_id = p_assignment_id;
+
+    perform public.apply_symbol_aggregates(deltas);
+
+    update public.flushes set aggregated = true
+    where client_flush_id = any(p_flush_ids) and not aggregated;
+
+    insert into public.symbol_aggregate_backfills (profile_id, assignment_id)
+    values (p_profile_id, p_assignment_id)
+    on conflict (profile_id, assignment_id) do update set backfilled_at = now();
+    return true;
+end;
+$$;
+
+-- Superseded by the four-argument version above
+drop function if exists public.rebuild_symbol_aggregates(uuid, uuid, jsonb);